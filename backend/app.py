@@ -1,18 +1,36 @@
-from flask import Flask, jsonify, send_from_directory, session, redirect, url_for, request, render_template, abort, after_this_request
+from flask import Flask, Response, jsonify, send_from_directory, session, redirect, url_for, request, render_template, abort, after_this_request
 from backend.config.config import Config
 import dotenv
 import os
+import hmac
+import logging
+import time
+import random
 import psycopg2
+import psycopg2.errors
 import argparse
+import backend.assets as assets
 import backend.auth as auth
+import backend.db as db
+import backend.schema as schema
+import backend.serializer as serializer
+import backend.compression as compression
+import backend.conditional as conditional
+import backend.events as events
+import backend.export as export
+import backend.feed_cache as feed_cache
+import backend.lender_ratings as lender_ratings
+import backend.listing_import as listing_import
+import backend.logs as logs
+import backend.metrics as metrics
+import backend.slow_queries as slow_queries
+import backend.uploads as uploads
+from backend.listing_query import ListingQuery, ListingQueryError, encode_cursor, decode_cursor
 import json
 from werkzeug.utils import secure_filename
 from decimal import Decimal
 from psycopg2.extras import RealDictCursor
 from datetime import datetime, date
-import cloudinary
-import cloudinary.uploader
-import cloudinary.api
 from flask_cas import CAS, login_required
 from flask_wtf.csrf import CSRFProtect, CSRFError, generate_csrf
 
@@ -45,6 +63,9 @@ app.config['SESSION_COOKIE_HTTPONLY'] = True
 
 # Load environment variables and set secret key
 dotenv.load_dotenv()
+# JSON logs through a non-blocking queue (see logs.py)
+logs.configure()
+logger = logging.getLogger(__name__)
 app.secret_key = os.environ.get("APP_SECRET_KEY", "default-dev-key-replace-in-production")
 
 # Determine if this is production based on environment variables
@@ -55,18 +76,33 @@ app.config['PERMANENT_SESSION_LIFETIME'] = 3600 * 24 * 7  # 7 days in seconds
 
 # Configure upload folder
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
 # Create uploads directory if it doesn't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
 # Initialize configuration
 Config(app)
 
+# Image uploads are resized and stored in the background (see uploads.py); after
+# Config, which configures Cloudinary
+upload_pipeline = uploads.UploadPipeline(uploads.storage_from_env(UPLOAD_FOLDER), db.connection)
+
+# Per-request timing, SQL statement counts and Server-Timing (see metrics.py)
+@app.before_request
+def start_request_metrics():
+    metrics.start_request()
+
+@app.after_request
+def finish_request_metrics(response):
+    return metrics.finish_request(request, response)
+
+# Negotiated gzip/brotli for API responses (see compression.py). Registered after
+# the metrics hook so it runs first and the metrics see the compressed size.
+@app.after_request
+def compress_response(response):
+    return compression.compress_response(request, response)
+
 # Register blueprints
 # app.register_blueprint(listings_bp)
 # app.register_blueprint(reservations_bp)
@@ -75,13 +111,14 @@ Config(app)
 app.add_url_rule(
     "/build/<path:filename>",
     endpoint="build",
-    view_func=lambda filename: send_from_directory("build", filename),
+    view_func=lambda filename: compression.send_asset(
+        "build", filename, immutable=asset_registry.immutable(filename)),
 )
 
-# Serve static files from the build directory
+# Serve static files from the build directory (precompressed siblings when available)
 @app.route('/build/<path:filename>')
 def serve_static(filename):
-    return send_from_directory('build', filename)
+    return compression.send_asset('build', filename, immutable=asset_registry.immutable(filename))
 
 # Catch-all route for React Router and CAS authentication
 @app.route('/', defaults={'path': ''})
@@ -110,7 +147,7 @@ def catch_all(path=''):
                     return redirect('/lender-dashboard')
     
     # Serve the React app for all other routes
-    return send_from_directory('build', 'index.html')
+    return asset_registry.shell_response()
 
 @app.route('/api/debug-session')
 def debug_session():
@@ -136,17 +173,15 @@ def debug_session():
 
 
 
+# Vite manifest and index.html, loaded once per worker (reloaded on change outside production)
+asset_registry = assets.AssetRegistry(os.path.join(app.root_path, 'build'), reload=not is_production)
+
 def get_asset_path(entry: str) -> str:
-    try:
-        with open("build/.vite/manifest.json", "r") as f:
-            manifest = json.load(f)
-            return manifest[f"src/{entry}/main.jsx"]["file"]
-    except:
-        return f"assets/{entry}.js"
+    return asset_registry.asset_path(f"src/{entry}/main.jsx", default=f"assets/{entry}.js")
 
 @app.route('/')
 def index():
-    return send_from_directory('build', 'index.html')
+    return asset_registry.shell_response()
 
 @app.route('/map')
 @login_required
@@ -157,52 +192,65 @@ def map():
             session['user_type'] = 'admin'
         else:
             session['user_type'] = 'lender'
-    return send_from_directory('build', 'index.html')
+    return asset_registry.shell_response()
 
 
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
+    """Queue an image upload; answers 202 with a job id to poll at /api/upload/<job_id>."""
     if 'file' not in request.files:
         return jsonify({'error': 'No file part'}), 400
     file = request.files['file']
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
-    if file and allowed_file(file.filename):
-        # Upload to Cloudinary
-        upload_result = cloudinary.uploader.upload(file)
-        # The URL of the uploaded image
-        image_url = upload_result.get('secure_url')
-        return jsonify({'url': image_url}), 200
-    return jsonify({'error': 'Invalid file type'}), 400
+    try:
+        # One byte past the limit is enough to reject an oversized file
+        data = file.read(uploads.MAX_BYTES + 1)
+        owner_id = session.get('user_info', {}).get('user', '').lower() or None
+        job_id = upload_pipeline.submit(data, secure_filename(file.filename), owner_id=owner_id)
+    except uploads.UploadValidationError as e:
+        return jsonify({'error': str(e)}), e.status
+    except uploads.UploadQueueFull:
+        response = jsonify({'error': 'Too many uploads in progress, please try again shortly'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    except Exception as e:
+        logger.exception("Error queueing upload")
+        return jsonify({'error': str(e)}), 500
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': url_for('get_upload_job', job_id=job_id),
+    }), 202
+
+@app.route('/api/upload/<job_id>', methods=['GET'])
+def get_upload_job(job_id):
+    """Progress of an upload: status is queued, processing, done (with url and variants) or failed."""
+    try:
+        with db.connection() as conn:
+            job, owner_id = uploads.get_job(conn, job_id)
+        user = session.get('user_info', {}).get('user', '').lower() or None
+        if job is None or (owner_id is not None and owner_id != user):
+            return jsonify({'error': 'Upload not found'}), 404
+        response = jsonify(job)
+        response.headers['Cache-Control'] = 'no-store'
+        return response, 200
+    except Exception as e:
+        logger.exception("Error in get_upload_job")
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
     import os
     file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    print(f"[uploads] Requested filename: {filename}")
-    print(f"[uploads] Resolved file path: {file_path}")
+    logger.debug("[uploads] Requested filename: %s", filename, extra={'sample': 'uploads'})
+    logger.debug("[uploads] Resolved file path: %s", file_path, extra={'sample': 'uploads'})
     if not os.path.exists(file_path):
-        print(f"[uploads] File does not exist: {file_path}")
+        logger.warning("[uploads] File does not exist: %s", file_path)
         return {'error': f'File not found: {filename}'}, 404
-    print(f"[uploads] File exists, serving: {file_path}")
+    logger.debug("[uploads] File exists, serving: %s", file_path, extra={'sample': 'uploads'})
     return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
 
-# Database connection function to handle reconnection
-def get_db_connection():
-    """Get a fresh database connection"""
-    try:
-        # Print the database URL (with password masked) for debugging
-        db_url = os.environ.get("DATABASE_URL", "")
-        masked_url = db_url.replace(db_url.split('@')[0].split(':', 2)[2], '****') if '@' in db_url and ':' in db_url else "No DATABASE_URL found"
-        print(f"Connecting to database: {masked_url}")
-        
-        conn = psycopg2.connect(db_url)
-        print("Database connection successful")
-        return conn
-    except Exception as e:
-        print(f"Database connection error: {e}")
-        return None
-
 # Custom JSON encoder to handle Decimal values
 class CustomJSONEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -212,92 +260,37 @@ class CustomJSONEncoder(json.JSONEncoder):
 
 app.json_encoder = CustomJSONEncoder
 
+# Columns selected for listing responses, in order; missing ones are skipped
+LISTING_OPTIONAL_COLUMNS = ['latitude', 'longitude', 'start_date', 'end_date', 'image_url', 'address', 'hall_name']
+FEED_LISTING_COLUMNS = ['listing_id', 'title', 'cost', 'sq_ft', 'description',
+                        'created_at', 'owner_id', 'remaining_space', 'is_available'] + LISTING_OPTIONAL_COLUMNS
+MY_LISTING_COLUMNS = ['listing_id', 'title', 'cost', 'sq_ft', 'description',
+                      'created_at', 'owner_id', 'remaining_space'] + LISTING_OPTIONAL_COLUMNS
+
+# Tables whose generation counters make up the public feed's ETag (ratings come from lender_reviews)
+FEED_VERSION_TABLES = ('storage_listings', 'lender_reviews')
+# Personalized responses differ per user, so shared caches must key on identity
+PER_USER_VARY = ('X-Username', 'Cookie')
+
 # API to create a new listing
 @app.route('/api/listings', methods=['POST'])
 def create_listing():
     try:
         data = request.get_json()
         
-        # Validate required fields
-        required_fields = ['title', 'cost', 'description', 'latitude', 'longitude', 'start_date', 'end_date']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({"error": f"Missing required field: {field}"}), 400
-                
-        # Special check for square feet (handle both squareFeet and sq_ft)
-        if 'squareFeet' not in data and 'sq_ft' not in data:
-            return jsonify({"error": "Missing required field: square feet"}), 400
-
-        # Get a fresh connection
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"error": "We're experiencing temporary database issues. Please try again later."}), 500
-            
+        # Same validation as bulk imports (see listing_import.py)
         try:
-            # Convert data to correct types
-            cost = float(data['cost']) if data['cost'] else 0
-            # Validation: cost must not be negative
-            if cost < 0:
-                return jsonify({"error": "Storage cost cannot be negative."}), 400
-            # Handle both squareFeet and sq_ft field names
-            if 'squareFeet' in data:
-                total_sq_ft = int(data['squareFeet']) if data['squareFeet'] else 0
-            elif 'sq_ft' in data:
-                total_sq_ft = int(data['sq_ft']) if data['sq_ft'] else 0
-            else:
-                total_sq_ft = 0
-            # Validation: square feet must be greater than zero
-            if total_sq_ft <= 0:
-                return jsonify({"error": "Storage space (square feet) must be greater than zero."}), 400
-                
-            latitude = float(data['latitude'])
-            longitude = float(data['longitude'])
-            start_date = data['start_date']  # Already in ISO format from frontend
-            end_date = data['end_date']      # Already in ISO format from frontend
-            image_url = data.get('image_url', '')  # Get image URL if provided
+            column_values = listing_import.validate_listing(data)
+        except listing_import.ListingValidationError as e:
+            return jsonify({"error": str(e)}), 400
 
-            # Date validation
-            try:
-                today = date.today()
-                start_dt = date.fromisoformat(start_date)
-                end_dt = date.fromisoformat(end_date)
-                if start_dt < today:
-                    return jsonify({"error": "Start date cannot be in the past."}), 400
-                if end_dt < today:
-                    return jsonify({"error": "End date cannot be in the past."}), 400
-                if start_dt >= end_dt:
-                    return jsonify({"error": "End date must be after start date."}), 400
-            except Exception:
-                return jsonify({"error": "Invalid date format for start or end date."}), 400
-            
+        with db.connection() as conn:
             with conn.cursor() as cur:
-                # Prepare column values
-                column_values = {
-                    'title': data.get('title', data.get('location', '')),  # Support both title and location fields
-                    'sq_ft': total_sq_ft,
-                    'cost': cost,
-                    'start_date': start_date,
-                    'end_date': end_date,
-                    'latitude': latitude,
-                    'longitude': longitude,
-                    'description': data['description'],
-                    'image_url': image_url,
-                    'remaining_space': total_sq_ft  # Set remaining_space to sq_ft on creation
-                }
-                
-                # Add address if provided
-                if 'address' in data:
-                    column_values['address'] = data['address']
-                
-                # Add hall_name if provided
-                if 'hall_name' in data:
-                    column_values['hall_name'] = data['hall_name']
-                
                 # Associate the listing with the current user (lender)
                 if auth.is_authenticated():
                     user_info = session['user_info']
                     column_values['owner_id'] = user_info.get('user', 'unknown').lower()
-                    print(f"Setting owner_id to {user_info.get('user', 'unknown').lower()}")
+                    logger.debug("Setting owner_id to %s", column_values['owner_id'])
                 
                 # Build the SQL query dynamically
                 columns_str = ', '.join(column_values.keys())
@@ -310,23 +303,20 @@ def create_listing():
                     cur.execute(query, list(column_values.values()))
                     listing_id = cur.fetchone()[0]
                     conn.commit()
-                    print(f"Successfully created listing with ID: {listing_id}")
+                    invalidate_listing_feed()
+                    logger.info("Successfully created listing with ID: %s", listing_id)
                 except Exception as e:
                     conn.rollback()  # Roll back on error
-                    print(f"Error executing insert query: {e}")
+                    logger.error("Error executing insert query: %s", e)
                     raise  # Re-raise the exception to be caught by the outer try/except
                 
                 return jsonify({
                     "success": True,
                     "listing_id": listing_id
                 }), 201
-        finally:
-            conn.close()
 
     except Exception as e:
-        print("Error creating listing:", str(e))
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error creating listing")
         
         # Check for specific PostgreSQL errors
         if "current transaction is aborted" in str(e):
@@ -336,243 +326,431 @@ def create_listing():
             
         return jsonify({"error": error_message}), 500
 
+MAX_IMPORT_ROWS = int(os.environ.get('MAX_IMPORT_ROWS', 100000))
+
+def import_listing_rows(rows, owner_id, atomic=False):
+    """Validate and insert a batch of listings; returns (response body, status)"""
+    if not isinstance(rows, list) or not rows:
+        return {"error": "Expected a non-empty list of listings"}, 400
+    if len(rows) > MAX_IMPORT_ROWS:
+        return {"error": f"At most {MAX_IMPORT_ROWS} listings per import"}, 400
+    # Admins (and development) may import on behalf of other lenders via an owner_id column
+    valid, row_numbers, errors = listing_import.validate_rows(rows, owner_id=owner_id,
+                                                              allow_owner_override=is_admin_or_dev())
+    if errors and atomic:
+        return {"success": False, "imported": 0, "errors": errors}, 400
+    listing_ids = []
+    if valid:
+        with db.connection() as conn:
+            listing_ids = listing_import.insert_values(conn, valid)
+            conn.commit()
+        invalidate_listing_feed()
+    logger.info("[IMPORT] %s listings imported, %s rejected", len(listing_ids), len(errors))
+    return {
+        "success": True,
+        "imported": len(listing_ids),
+        "listings": [{"row": row, "listing_id": listing_id} for row, listing_id in zip(row_numbers, listing_ids)],
+        "errors": errors
+    }, 201 if listing_ids else 400
+
+# API to create many listings at once (JSON list or CSV)
+@app.route('/api/listings/import', methods=['POST'])
+def import_listings():
+    """Bulk create listings for the current lender.
+
+    Accepts a JSON list (or {"listings": [...]}), a text/csv body, or a CSV/JSON file
+    upload in the `file` field. Each row is validated like POST /api/listings; valid
+    rows are inserted in one transaction and invalid ones are reported by row number.
+    With ?atomic=1 nothing is inserted if any row is invalid.
+    """
+    try:
+        if auth.is_authenticated():
+            owner_id = session.get('user_info', {}).get('user', '').lower()
+        elif is_admin_or_dev():
+            owner_id = request.headers.get('X-Username', '').lower() or None
+        else:
+            return jsonify({"error": "Not authenticated"}), 401
+        atomic = request.args.get('atomic', '').lower() in ('1', 'true', 'yes')
+        
+        upload = request.files.get('file')
+        if upload is not None:
+            text = upload.read().decode('utf-8-sig')
+            is_csv = upload.filename.lower().endswith('.csv') or upload.mimetype == 'text/csv'
+        else:
+            text = request.get_data(as_text=True)
+            is_csv = request.mimetype == 'text/csv'
+        if is_csv:
+            rows = listing_import.parse_csv(text)
+        else:
+            try:
+                rows = json.loads(text)
+            except ValueError:
+                return jsonify({"error": "Body must be JSON or CSV"}), 400
+            if isinstance(rows, dict):
+                rows = rows.get('listings')
+        
+        body, status = import_listing_rows(rows, owner_id, atomic)
+        return jsonify(body), status
+    except Exception as e:
+        logger.exception("Error importing listings")
+        return jsonify({"error": "We couldn't import these listings. Please check the file and try again."}), 500
+
+def format_feed_listings(cur, listings, column_names):
+    """Format storage_listings rows for the public feed, adding each lender's average rating
+
+    Queries built with lender_ratings.rating_join() already carry lender_avg_rating;
+    otherwise the ratings are aggregated from lender_reviews here.
+    """
+    lender_avg_ratings = None
+    if 'lender_avg_rating' not in column_names and 'owner_id' in column_names:
+        # --- Fetch average ratings for all lenders in one query ---
+        idx = column_names.index('owner_id')
+        owner_ids = list({listing[idx].lower() for listing in listings if listing[idx]})
+        if owner_ids:
+            cur.execute("""
+                SELECT LOWER(lender_username), AVG(rating)::float AS avg_rating
+                FROM lender_reviews
+                WHERE LOWER(lender_username) = ANY(%s)
+                GROUP BY LOWER(lender_username)
+            """, (owner_ids,))
+            lender_avg_ratings = {row[0]: row[1] for row in cur.fetchall()}
+
+    # One compiled function per column list turns each row into its JSON object (see serializer.py)
+    return serializer.listing_serializer('feed', column_names).rows(listings, lender_avg_ratings)
+
+def json_response(data):
+    """Like jsonify, but encoded by serializer.dumps (orjson when installed)"""
+    return app.response_class(serializer.dumps(data), mimetype=app.json.mimetype)
+
+# Who builds the JSON for the listing feed and my-reservation-requests:
+#   python    rows are fetched and serialized here (serializer.py)
+#   postgres  the query returns the finished array (json_agg(json_build_object(...)))
+#             and its text is sent as the body without being parsed
+# Both produce the same document; compare them with the benchmark suite's --feed-json-mode.
+FEED_JSON_MODES = ('python', 'postgres')
+FEED_JSON_MODE = os.environ.get('FEED_JSON_MODE', 'python').lower()
+if FEED_JSON_MODE not in FEED_JSON_MODES:
+    logger.warning("Unknown FEED_JSON_MODE %r, using 'python'", FEED_JSON_MODE)
+    FEED_JSON_MODE = 'python'
+
+def build_listing_feed_json(conn, cur, listing_query, etag):
+    """build_listing_feed for FEED_JSON_MODE=postgres: one row holding the serialized page"""
+    table = schema.table(conn, 'storage_listings')
+    rating_column, rating_join = lender_ratings.rating_join(conn)
+    rating_expr = 'lender_rating_stats.avg_rating' if rating_column else None
+    distance_expr = listing_query.distance_expr if listing_query is not None else None
+    listing_json = serializer.listing_json_sql('feed', table, rating_expr, distance_expr)
+
+    if listing_query is None:
+        where_clause, params = "TRUE", []
+        sort_key, order_by, limit_clause = "created_at", "created_at DESC", ""
+    else:
+        where_clause, params = listing_query.where(table, rating_stats=bool(rating_column))
+        sort_key, order_by, limit_clause = listing_query.sort_key, listing_query.order_by(), listing_query.limit_clause()
+    page_size = listing_query.limit if listing_query is not None and listing_query.limit is not None else None
+
+    # feed_row numbers the rows in feed order: the array is aggregated in that order, and
+    # the row past the page size (fetched by limit_clause) only says there is a next page
+    page_filter = f"FILTER (WHERE page.feed_row <= {page_size})" if page_size is not None else ""
+    last_row = f"page.feed_row = {page_size}" if page_size is not None else "FALSE"
+    query = f"""
+        SELECT COALESCE(json_agg(page.listing ORDER BY page.feed_row) {page_filter}, '[]')::text,
+               COUNT(*),
+               MAX(page.sort_key) FILTER (WHERE {last_row}),
+               MAX(page.listing_id) FILTER (WHERE {last_row})
+        FROM (
+            SELECT {listing_json} AS listing, {sort_key} AS sort_key, listing_id,
+                   row_number() OVER (ORDER BY {order_by}) AS feed_row
+            FROM storage_listings
+            {rating_join}
+            WHERE {where_clause}
+            ORDER BY {order_by}
+            {limit_clause}
+        ) page;
+    """
+    logger.debug("Executing query: %s", query, extra={'sample': 'query'})
+    cur.execute(query, params)
+    body, count, last_key, last_id = cur.fetchone()
+    logger.debug("Found %s listings", count)
+
+    headers = {}
+    if page_size is not None and count > page_size:
+        headers['X-Next-Cursor'] = encode_cursor(listing_query.sort, last_key, last_id)
+    return feed_cache.FeedEntry(etag, body.encode(), headers)
+
+# Serialized public feed responses, reused across requests (see feed_cache.py)
+listing_feed_cache = feed_cache.from_env()
+
+def invalidate_listing_feed():
+    """Drop cached feed responses after a write that changes what the feed shows"""
+    listing_feed_cache.invalidate()
+
+def build_listing_feed(listing_query, query_string, stale=None):
+    """Run the feed query and serialize it into a FeedEntry.
+
+    If `stale` (an expired cache entry) still matches the current table versions it
+    is returned as-is, so the main query only runs when the data changed.
+    """
+    with db.connection() as conn:
+        with conn.cursor() as cur:
+            etag = conditional.etag_for(conn, FEED_VERSION_TABLES, 'listings', query_string)
+            if stale is not None and etag is not None and stale.etag == etag:
+                return stale
+            
+            # Only select the columns that exist (cached per process by the schema registry)
+            select_columns = schema.select_list(conn, 'storage_listings', FEED_LISTING_COLUMNS)
+            rating_column, rating_join = lender_ratings.rating_join(conn)
+            # Without lender_rating_stats the ratings are aggregated in Python, so stay on that path
+            if FEED_JSON_MODE == 'postgres' and rating_column:
+                return build_listing_feed_json(conn, cur, listing_query, etag)
+            
+            if listing_query is None:
+                query = f"""
+                    SELECT {select_columns}{rating_column}
+                    FROM storage_listings
+                    {rating_join}
+                    ORDER BY created_at DESC;
+                """
+                params = []
+            else:
+                where_clause, params = listing_query.where(schema.table(conn, 'storage_listings'),
+                                                           rating_stats=bool(rating_column))
+                distance_column = f", {listing_query.distance_expr} AS distance_mi" if listing_query.distance_expr else ""
+                query = f"""
+                    SELECT {select_columns}, {listing_query.sort_key} AS sort_key{distance_column}{rating_column}
+                    FROM storage_listings
+                    {rating_join}
+                    WHERE {where_clause}
+                    ORDER BY {listing_query.order_by()}
+                    {listing_query.limit_clause()};
+                """
+            
+            logger.debug("Executing query: %s", query, extra={'sample': 'query'})
+            cur.execute(query, params)
+            
+            listings = cur.fetchall()
+            logger.debug("Found %s listings", len(listings))
+            
+            # Get column names from cursor description
+            column_names = [desc[0] for desc in cur.description]
+            
+            # Keyset pagination: the extra row fetched past the limit means there is a next page
+            headers = {}
+            if listing_query is not None and listing_query.limit is not None and len(listings) > listing_query.limit:
+                listings = listings[:listing_query.limit]
+                last = listings[-1]
+                headers['X-Next-Cursor'] = encode_cursor(listing_query.sort, last[column_names.index('sort_key')],
+                                                         last[column_names.index('listing_id')])
+            
+            formatted_listings = format_feed_listings(cur, listings, column_names)
+            logger.debug("Returning %s formatted listings", len(formatted_listings))
+            return feed_cache.FeedEntry(etag, serializer.dumps(formatted_listings), headers)
+
 # API to get all listings
 @app.route('/api/listings', methods=['GET'])
 def get_listings():
     try:
-        print("Received request for /api/listings")
-        # Get a fresh connection
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"error": "We're experiencing temporary database issues. Please try again later."}), 500
+        logger.debug("Received request for /api/listings")
+        # Optional server-side filters/sorting/pagination; without them the full feed is returned
+        listing_query = None
+        if ListingQuery.requested(request.args):
+            try:
+                listing_query = ListingQuery(request.args)
+            except ListingQueryError as e:
+                return jsonify({"error": str(e)}), 400
+        
+        # The feed is the same for every user, so concurrent requests share one build
+        query_string = request.query_string.decode()
+        entry = listing_feed_cache.get_or_build(
+            query_string, lambda stale: build_listing_feed(listing_query, query_string, stale))
+        
+        cached = conditional.not_modified(entry.etag)
+        if cached is not None:
+            return cached
+        response = app.response_class(entry.body, mimetype=app.json.mimetype)
+        response.headers.update(entry.headers)
+        return conditional.tag(response, entry.etag), 200
+    except Exception as e:
+        logger.exception("Error in get_listings")
+        return jsonify({"error": str(e)}), 500
+
+# Change log rows older than this are pruned; clients with older cursors get a full reset
+LISTING_CHANGES_RETENTION_DAYS = int(os.environ.get('LISTING_CHANGES_RETENTION_DAYS', 7))
+LISTING_CHANGES_PRUNE_INTERVAL = 3600  # seconds, per worker
+_last_listing_changes_prune = 0.0
+
+def prune_listing_changes(conn):
+    """Drop old change log rows, at most once per interval (always keeps the newest row)"""
+    global _last_listing_changes_prune
+    now = time.monotonic()
+    if now - _last_listing_changes_prune < LISTING_CHANGES_PRUNE_INTERVAL:
+        return
+    _last_listing_changes_prune = now
+    with conn.cursor() as cur:
+        cur.execute("""
+            DELETE FROM listing_changes
+            WHERE changed_at < NOW() - make_interval(days => %s)
+              AND change_id < (SELECT MAX(change_id) FROM listing_changes)
+        """, (LISTING_CHANGES_RETENTION_DAYS,))
+        logger.info("Pruned %s listing_changes rows", cur.rowcount)
+    conn.commit()
+
+# API to get listings changed since the client's last poll
+@app.route('/api/listings/changes', methods=['GET'])
+def get_listing_changes():
+    """Incremental feed for map polling.
+
+    Without `since` (or when the cursor predates the retained change log) the whole
+    feed is returned with reset=true. Otherwise only listings created or updated since
+    the cursor are returned, plus the ids of deleted ones. Pass the returned cursor as
+    `since` on the next poll.
+    """
+    since = request.args.get('since')
+    if since:
         try:
+            since = int(since)
+            if since < 0:
+                raise ValueError(since)
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
+    else:
+        since = None
+    try:
+        with db.connection() as conn:
+            select_columns = schema.select_list(conn, 'storage_listings', FEED_LISTING_COLUMNS)
+            rating_column, rating_join = lender_ratings.rating_join(conn)
             with conn.cursor() as cur:
-                # First check if the storage_listings table exists
-                cur.execute("""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.tables 
-                        WHERE table_name = 'storage_listings'
-                    );
-                """)
-                table_exists = cur.fetchone()[0]
-                
-                if not table_exists:
-                    # Create the table if it doesn't exist
-                    print("Creating storage_listings table")
-                    cur.execute("""
-                        CREATE TABLE storage_listings (
-                            listing_id SERIAL PRIMARY KEY,
-                            title VARCHAR(255) NOT NULL,
-                            address VARCHAR(255),
-                            cost NUMERIC,
-                            sq_ft INTEGER,
-                            description TEXT,
-                            latitude FLOAT,
-                            longitude FLOAT,
-                            start_date DATE,
-                            end_date DATE,
-                            image_url VARCHAR(255),
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            owner_id VARCHAR(255)
-                        );
+                cursor = None
+                reset = since is None
+                if schema.table(conn, 'listing_changes').exists:
+                    prune_listing_changes(conn)
+                    # Any transaction still in flight now has txid >= xmin, so it is picked up next poll
+                    cur.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+                    cursor = cur.fetchone()[0]
+                    if not reset:
+                        cur.execute("SELECT MIN(txid) FROM listing_changes")
+                        oldest = cur.fetchone()[0]
+                        reset = oldest is not None and since < oldest
+                else:
+                    # No change log in this database: every poll is a full reload
+                    reset = True
+
+                if reset:
+                    cur.execute(f"""
+                        SELECT {select_columns}{rating_column}
+                        FROM storage_listings
+                        {rating_join}
+                        ORDER BY created_at DESC;
                     """)
-                    conn.commit()
-                
-                # First, make sure any previous failed transaction is rolled back
-                conn.rollback()
-                
-                # Get the actual column names from the table to ensure we query correctly
-                cur.execute("""
-                    SELECT column_name
-                    FROM information_schema.columns 
-                    WHERE table_name = 'storage_listings' 
-                    ORDER BY ordinal_position;
-                """)
-                columns = [column[0] for column in cur.fetchall()]
-                
-                # Build the query dynamically based on available columns
-                select_parts = []
-                essential_columns = ['listing_id', 'title', 'cost', 'sq_ft', 'description', 
-                                     'created_at', 'owner_id', 'remaining_space', 'is_available']
-                
-                # Add all essential columns that exist
-                for col in essential_columns:
-                    if col in columns:
-                        select_parts.append(col)
-                
-                # Add optional columns if they exist
-                optional_columns = ['latitude', 'longitude', 'start_date', 'end_date', 'image_url', 'address', 'hall_name']
-                for col in optional_columns:
-                    if col in columns:
-                        select_parts.append(col)
-                
-                # Create the SELECT statement
-                select_columns = ", ".join(select_parts)
-                
-                query = f"""
-                    SELECT {select_columns}
-                    FROM storage_listings
-                    ORDER BY created_at DESC;
-                """
-                
-                print(f"Executing query: {query}")
-                cur.execute(query)
-                
-                listings = cur.fetchall()
-                print(f"Found {len(listings)} listings")
-                
-                # Get column names from cursor description
-                column_names = [desc[0] for desc in cur.description]
-                
-                # --- Fetch average ratings for all lenders in one query ---
-                owner_ids = set()
-                for listing in listings:
-                    idx = column_names.index('owner_id') if 'owner_id' in column_names else None
-                    if idx is not None and listing[idx]:
-                        owner_ids.add(listing[idx].lower())
-                lender_avg_ratings = {}
-                if owner_ids:
-                    cur.execute("""
-                        SELECT LOWER(lender_username), AVG(rating)::float AS avg_rating
-                        FROM lender_reviews
-                        WHERE LOWER(lender_username) = ANY(%s)
-                        GROUP BY LOWER(lender_username)
-                    """, (list(owner_ids),))
-                    for row in cur.fetchall():
-                        lender_avg_ratings[row[0]] = float(row[1]) if row[1] is not None else None
-                
-                # Convert to list of dictionaries
+                    listings = cur.fetchall()
+                    column_names = [desc[0] for desc in cur.description]
+                    return json_response({
+                        "cursor": str(cursor) if cursor is not None else None,
+                        "reset": True,
+                        "listings": format_feed_listings(cur, listings, column_names),
+                        "deleted": []
+                    }), 200
+
+                cur.execute("SELECT DISTINCT listing_id FROM listing_changes WHERE txid >= %s", (since,))
+                changed_ids = [row[0] for row in cur.fetchall()]
                 formatted_listings = []
-                for listing in listings:
-                    try:
-                        listing_dict = {}
-                        for i, col_name in enumerate(column_names):
-                            listing_dict[col_name] = listing[i]
-                        print('DEBUG: listing_dict:', listing_dict)
-                        
-                        # If no latitude/longitude, set default values for Princeton with random offsets
-                        if not listing_dict.get('latitude') or not listing_dict.get('longitude'):
-                            print(f"Setting default location for listing {listing_dict.get('listing_id')}")
-                            # Princeton coordinates plus small random offset
-                            import random
-                            princeton_lat = 40.3437
-                            princeton_lng = -74.6517
-                            lat_offset = random.uniform(-0.005, 0.005)
-                            lng_offset = random.uniform(-0.005, 0.005)
-                            listing_dict['latitude'] = princeton_lat + lat_offset
-                            listing_dict['longitude'] = princeton_lng + lng_offset
-                        
-                        formatted_listing = {
-                            "id": listing_dict.get('listing_id'),
-                            "title": listing_dict.get('title', ''),
-                            "address": listing_dict.get('address', ''),
-                            "cost": float(listing_dict.get('cost', 0)) if listing_dict.get('cost') is not None else 0,
-                            "sq_ft": listing_dict.get('sq_ft', 0),
-                            "description": listing_dict.get('description', ''),
-                            "latitude": float(listing_dict.get('latitude', 0)) if listing_dict.get('latitude') is not None else None,
-                            "longitude": float(listing_dict.get('longitude', 0)) if listing_dict.get('longitude') is not None else None,
-                            "start_date": listing_dict.get('start_date').isoformat() if hasattr(listing_dict.get('start_date'), 'isoformat') else (listing_dict.get('start_date') if listing_dict.get('start_date') else None),
-                            "end_date": listing_dict.get('end_date').isoformat() if hasattr(listing_dict.get('end_date'), 'isoformat') else (listing_dict.get('end_date') if listing_dict.get('end_date') else None),
-                            "image_url": listing_dict.get('image_url', '/assets/placeholder.jpg'),
-                            "created_at": listing_dict.get('created_at').isoformat() if hasattr(listing_dict.get('created_at'), 'isoformat') else (listing_dict.get('created_at') if listing_dict.get('created_at') else None),
-                            "owner_id": listing_dict.get('owner_id', ''),
-                            "remaining_space": listing_dict.get('remaining_space', 0),
-                            "is_available": bool(listing_dict.get('is_available', True)) if float(listing_dict.get('remaining_space', 0)) > 0 else False,
-                            "hall_name": listing_dict.get('hall_name', ''),
-                            # --- Add average lender rating ---
-                            "lender_avg_rating": lender_avg_ratings.get(listing_dict.get('owner_id'))
-                        }
-
-                        # Ensure latitude and longitude have values for map display
-                        if formatted_listing["latitude"] is None or formatted_listing["longitude"] is None:
-                            # Princeton coordinates plus small random offset
-                            import random
-                            princeton_lat = 40.3437
-                            princeton_lng = -74.6517
-                            lat_offset = random.uniform(-0.005, 0.005)
-                            lng_offset = random.uniform(-0.005, 0.005)
-                            formatted_listing["latitude"] = princeton_lat + lat_offset
-                            formatted_listing["longitude"] = princeton_lng + lng_offset
-                            print(f"Set default lat/lng for listing {formatted_listing['id']}: {formatted_listing['latitude']}, {formatted_listing['longitude']}")
-                        
-                        formatted_listings.append(formatted_listing)
-                    except Exception as e:
-                        print(f"DEBUG: Error formatting listing: {e}")
-                        print(f"DEBUG: Listing data: {listing}")
-                        continue
-                
-                print(f"Returning {len(formatted_listings)} formatted listings")
-                return jsonify(formatted_listings), 200
-        finally:
-            conn.close()
+                deleted_ids = []
+                if changed_ids:
+                    cur.execute(f"""
+                        SELECT {select_columns}{rating_column}
+                        FROM storage_listings
+                        {rating_join}
+                        WHERE listing_id = ANY(%s)
+                        ORDER BY created_at DESC;
+                    """, (changed_ids,))
+                    listings = cur.fetchall()
+                    column_names = [desc[0] for desc in cur.description]
+                    formatted_listings = format_feed_listings(cur, listings, column_names)
+                    present = {listing["id"] for listing in formatted_listings}
+                    deleted_ids = sorted(set(changed_ids) - present)
+                logger.debug("[CHANGES] since=%s: %s changed, %s deleted", since, len(formatted_listings), len(deleted_ids))
+                return json_response({
+                    "cursor": str(cursor),
+                    "reset": False,
+                    "listings": formatted_listings,
+                    "deleted": deleted_ids
+                }), 200
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
+        logger.exception("Error in get_listing_changes")
+        return jsonify({"error": "We couldn't retrieve listing updates. Please try again later."}), 500
+
+# Each open stream holds a worker thread, so cap them per worker and bound their lifetime
+# (capacity math in gunicorn.conf.py). Refused clients retry after SSE_BUSY_RETRY_SECONDS,
+# jittered so they do not come back together, and poll /api/listings/changes meanwhile.
+SSE_MAX_STREAMS_PER_WORKER = int(os.environ.get('SSE_MAX_STREAMS_PER_WORKER', 4))
+SSE_MAX_STREAM_SECONDS = float(os.environ.get('SSE_MAX_STREAM_SECONDS', 300))
+SSE_BUSY_RETRY_SECONDS = float(os.environ.get('SSE_BUSY_RETRY_SECONDS', 30))
+
+# Server-Sent Events stream of listing availability changes
+@app.route('/api/listings/stream', methods=['GET'])
+def listings_stream():
+    """Push listing/reservation change events as they are committed.
+
+    Clients should refresh via /api/listings/changes when an event arrives. When this
+    worker already has SSE_MAX_STREAMS_PER_WORKER open streams the response is a single
+    `busy` event and the stream ends; the browser reconnects after the `retry` delay and
+    polls until then. Clients also poll whenever the stream drops.
+    """
+    hub = events.get_hub()
+    if hub.subscriber_count >= SSE_MAX_STREAMS_PER_WORKER:
+        retry_ms = int(SSE_BUSY_RETRY_SECONDS * 1000 * random.uniform(0.5, 1.5))
+        response = Response(events.busy(retry_ms), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    subscription = hub.subscribe()
+
+    def generate():
+        try:
+            yield from events.stream(subscription, max_duration=SSE_MAX_STREAM_SECONDS)
+        finally:
+            hub.unsubscribe(subscription)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Keep reverse proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/api/rentals/current', methods=['GET'])
 def get_current_rentals():
     try:
-        # Get a fresh connection
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"error": "We're experiencing temporary database issues. Please try again later."}), 500
         # Implement real DB logic here or return 404 if not implemented
         return jsonify({"error": "Not implemented"}), 404
     except Exception as e:
-        print("Error:", str(e))
+        logger.error("Error in get_current_rentals: %s", e)
         return jsonify({"error": "We couldn't retrieve your current rentals. Please try again later."}), 500
 
 @app.route('/api/rentals/history', methods=['GET'])
 def get_rental_history():
     try:
-        # Get a fresh connection
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"error": "We're experiencing temporary database issues. Please try again later."}), 500
         # Implement real DB logic here or return 404 if not implemented
         return jsonify({"error": "Not implemented"}), 404
     except Exception as e:
-        print("Error:", str(e))
+        logger.error("Error in get_rental_history: %s", e)
         return jsonify({"error": "We couldn't retrieve your rental history. Please try again later."}), 500
 
 # API to get a specific listing by ID
 @app.route('/api/listings/<int:listing_id>', methods=['GET'])
 def get_listing_by_id(listing_id):
     try:
-        # Get a fresh connection
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"error": "We're experiencing temporary database issues. Please try again later."}), 500
-        try:
+        with db.connection() as conn:
             with conn.cursor() as cur:
                 # Check if the table exists
-                cur.execute("""SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_name = 'storage_listings'
-                )""")
-                table_exists = cur.fetchone()[0]
-                
-                if not table_exists:
+                if not schema.table(conn, 'storage_listings').exists:
                     # Return mock data instead
                     return get_mock_listing(listing_id)
                 
-                # Try to find the listing in the database
-                # First get the available columns
-                cur.execute("""
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_name = 'storage_listings' 
-                    ORDER BY ordinal_position;
-                """)
-                columns = [col[0] for col in cur.fetchall()]
-                print(f"Available columns: {columns}")
-                
                 # Build a dynamic SELECT statement
-                select_clause = "*"  # Use * since we're fetching a single row
+                rating_column, rating_join = lender_ratings.rating_join(conn)
+                select_clause = "storage_listings.*" + rating_column  # Use * since we're fetching a single row
                 
                 # Only use listing_id as that's the column name in the database
-                cur.execute(f"SELECT {select_clause} FROM storage_listings WHERE listing_id = %s;", (listing_id,))
+                cur.execute(f"SELECT {select_clause} FROM storage_listings {rating_join} WHERE storage_listings.listing_id = %s;", (listing_id,))
                 listing = cur.fetchone()
                 
                 if not listing:
@@ -615,25 +793,24 @@ def get_listing_by_id(listing_id):
                     "hall_name": listing_dict.get('hall_name', '')
                 }
                 
-                # In get_listing_by_id, after fetching listing_dict and before returning formatted_listing:
-                # Fetch lender_avg_rating for this owner_id (lowercased)
-                lender_avg_rating = None
-                try:
-                    with get_db_connection().cursor() as cur2:
-                        cur2.execute("""
+                # Lender rating: joined from lender_rating_stats, else aggregated from the reviews
+                lender_avg_rating = listing_dict.get('lender_avg_rating')
+                if not rating_column:
+                    try:
+                        cur.execute("""
                             SELECT AVG(rating)::float FROM lender_reviews WHERE LOWER(lender_username) = %s
                         """, (str(listing_dict.get('owner_id', '')).lower(),))
-                        row = cur2.fetchone()
+                        row = cur.fetchone()
                         if row and row[0] is not None:
                             lender_avg_rating = float(row[0])
-                except Exception as e:
-                    print(f"Error fetching lender_avg_rating for owner_id {listing_dict.get('owner_id')}: {e}")
+                    except Exception as e:
+                        conn.rollback()
+                        logger.error("Error fetching lender_avg_rating for owner_id %s: %s", listing_dict.get('owner_id'), e)
+                formatted_listing["lender_avg_rating"] = lender_avg_rating
                 
                 return jsonify(formatted_listing), 200
-        finally:
-            conn.close()
     except Exception as e:
-        print("Error fetching listing:", str(e))
+        logger.error("Error fetching listing: %s", e)
         return jsonify({"error": "We couldn't retrieve this storage listing. Please try again later."}), 500
 
 # API to get listings by owner (for lender dashboard)
@@ -648,26 +825,26 @@ def get_my_listings():
         
         if authenticated:
             # Get from session if authenticated
-            print("User authenticated via session")
+            logger.debug("User authenticated via session")
             user_info = session.get('user_info', {})
             owner_id = user_info.get('user', '').lower()
-            print(f"Authenticated username from session: {owner_id}")
+            logger.debug("Authenticated username from session: %s", owner_id)
         else:
             # If not authenticated via session, check headers
-            print("User not authenticated via session, checking headers")
+            logger.debug("User not authenticated via session, checking headers")
             username_header = request.headers.get('X-Username')
             user_type_header = request.headers.get('X-User-Type')
             
             if username_header:
                 owner_id = username_header.lower()
-                print(f"Using username from X-Username header: {owner_id}")
+                logger.debug("Using username from X-Username header: %s", owner_id)
             elif user_type_header == 'lender':
                 # If user type header indicates lender, use it as fallback
                 owner_id = 'lender'
-                print(f"Using default owner_id 'lender' from X-User-Type header")
+                logger.debug("Using default owner_id 'lender' from X-User-Type header")
             else:
                 # No authentication found
-                print("No authentication found in session or headers")
+                logger.debug("No authentication found in session or headers")
                 # Add CORS headers to error response
                 response = jsonify({"error": "Not authenticated"})
                 response.headers['Access-Control-Allow-Origin'] = request.headers.get('Origin', '*')
@@ -675,89 +852,27 @@ def get_my_listings():
                 return response, 401
         
         if not owner_id:
-            print("Owner ID not found in session or headers")
+            logger.info("Owner ID not found in session or headers")
             return jsonify({"error": "User ID not found"}), 400
         
-        # Get a fresh connection
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"error": "We're experiencing temporary database issues. Please try again later."}), 500
-            
-        try:
+        with db.connection() as conn:
             with conn.cursor() as cur:
-                # First check if the storage_listings table exists
-                cur.execute("""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.tables 
-                        WHERE table_name = 'storage_listings'
-                    );
-                """)
-                table_exists = cur.fetchone()[0]
-                print("storage_listings table exists:", table_exists)
-                
-                if not table_exists:
-                    # Create the table if it doesn't exist
-                    print("Creating storage_listings table")
-                    cur.execute("""
-                        CREATE TABLE storage_listings (
-                            listing_id SERIAL PRIMARY KEY,
-                            title VARCHAR(255) NOT NULL,
-                            address VARCHAR(255),
-                            cost NUMERIC,
-                            sq_ft INTEGER,
-                            description TEXT,
-                            latitude FLOAT,
-                            longitude FLOAT,
-                            start_date DATE,
-                            end_date DATE,
-                            image_url VARCHAR(255),
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                            owner_id VARCHAR(255)
-                        );
-                    """)
-                    conn.commit()
+                etag = conditional.etag_for(conn, ('storage_listings',), 'my-listings', owner_id)
+                cached = conditional.not_modified(etag, vary=PER_USER_VARY)
+                if cached is not None:
+                    return cached
                 
                 # Get listings by owner_id
-                print("Executing query to get listings for owner_id:", owner_id)
-                
-                # First, make sure any previous failed transaction is rolled back
-                conn.rollback()
-                
-                # Get the actual column names from the table to ensure we query correctly
-                cur.execute("""
-                    SELECT column_name, data_type
-                    FROM information_schema.columns 
-                    WHERE table_name = 'storage_listings' 
-                    ORDER BY ordinal_position;
-                """)
-                column_info = cur.fetchall()
-                columns = [col[0] for col in column_info]
-                data_types = {col[0]: col[1] for col in column_info}
+                logger.debug("Executing query to get listings for owner_id: %s", owner_id, extra={'sample': 'query'})
                 
-                print(f"Available columns with data types: {data_types}")
+                # Column names and types come from the per-process schema registry
+                listings_table = schema.table(conn, 'storage_listings')
                 
                 # Check owner_id data type to handle possible type mismatch
-                owner_id_type = data_types.get('owner_id', 'varchar').lower()
-                print(f"Owner ID data type: {owner_id_type}")
-                
-                # Build the query dynamically based on available columns
-                select_parts = []
-                essential_columns = ['listing_id', 'title', 'cost', 'sq_ft', 'description', 
-                                    'created_at', 'owner_id', 'remaining_space']
+                owner_id_type = listings_table.data_types.get('owner_id', 'varchar').lower()
+                logger.debug("Owner ID data type: %s", owner_id_type)
                 
-                # Add all essential columns that exist
-                for col in essential_columns:
-                    if col in columns:
-                        select_parts.append(col)
-                
-                # Add optional columns if they exist
-                optional_columns = ['latitude', 'longitude', 'start_date', 'end_date', 'image_url', 'address', 'hall_name']
-                for col in optional_columns:
-                    if col in columns:
-                        select_parts.append(col)
-                
-                # Create the SELECT statement
-                select_columns = ", ".join(select_parts)
+                select_columns = schema.select_list(conn, 'storage_listings', MY_LISTING_COLUMNS)
                 
                 try:
                     # Handle owner_id type conversion based on database type
@@ -773,11 +888,11 @@ def get_my_listings():
                                 WHERE owner_id = %s
                                 ORDER BY created_at DESC;
                             """
-                            print(f"Using integer owner_id for query: {owner_id_int}")
+                            logger.debug("Using integer owner_id for query: %s", owner_id_int)
                             cur.execute(query, (owner_id_int,))
                         except ValueError:
                             # If conversion fails, return mock data for development or an empty list
-                            print(f"Cannot convert owner_id '{owner_id}' to integer, returning mock/empty data")
+                            logger.warning("Cannot convert owner_id '%s' to integer, returning mock/empty data", owner_id)
                             if os.environ.get('FLASK_ENV') == 'development' or os.environ.get('DEBUG') == 'true':
                                 mock_listings = [
                                     {
@@ -803,77 +918,31 @@ def get_my_listings():
                             WHERE LOWER(owner_id) = %s
                             ORDER BY created_at DESC;
                         """
-                        print(f"Using string owner_id for query: {owner_id}")
+                        logger.debug("Using string owner_id for query: %s", owner_id)
                         cur.execute(query, (str(owner_id).lower(),))
                     
                     listings = cur.fetchall()
-                    print(f"Found {len(listings)} listings for owner_id: {owner_id}")
+                    logger.debug("Found %s listings for owner_id: %s", len(listings), owner_id)
                     
                     # Get column names from cursor description
                     column_names = [desc[0] for desc in cur.description]
-                    print(f"Query returned columns: {column_names}")
+                    logger.debug("Query returned columns: %s", column_names)
                     
-                    # Convert to list of dictionaries
-                    formatted_listings = []
-                    for listing in listings:
-                        try:
-                            listing_dict = {}
-                            for i, col_name in enumerate(column_names):
-                                listing_dict[col_name] = listing[i]
-                            print('DEBUG: listing_dict:', listing_dict)
-                            
-                            # If no latitude/longitude, set default values for Princeton
-                            if not listing_dict.get('latitude') or not listing_dict.get('longitude'):
-                                print(f"Setting default location for listing {listing_dict.get('listing_id')}")
-                                # Princeton coordinates plus small random offset
-                                import random
-                                princeton_lat = 40.3437
-                                princeton_lng = -74.6517
-                                lat_offset = random.uniform(-0.005, 0.005)
-                                lng_offset = random.uniform(-0.005, 0.005)
-                                listing_dict['latitude'] = princeton_lat + lat_offset
-                                listing_dict['longitude'] = princeton_lng + lng_offset
-                            
-                            formatted_listing = {
-                                "id": listing_dict.get('listing_id'),
-                                "title": listing_dict.get('title', ''),
-                                "address": listing_dict.get('address', ''),
-                                "cost": float(listing_dict.get('cost', 0)) if listing_dict.get('cost') is not None else 0,
-                                "sq_ft": listing_dict.get('sq_ft', 0),
-                                "description": listing_dict.get('description', ''),
-                                "latitude": float(listing_dict.get('latitude', 0)) if listing_dict.get('latitude') is not None else None,
-                                "longitude": float(listing_dict.get('longitude', 0)) if listing_dict.get('longitude') is not None else None, 
-                                "start_date": listing_dict.get('start_date').isoformat() if listing_dict.get('start_date') else None,
-                                "end_date": listing_dict.get('end_date').isoformat() if listing_dict.get('end_date') else None,
-                                "image_url": listing_dict.get('image_url', '/assets/placeholder.jpg'),
-                                "created_at": listing_dict.get('created_at').isoformat() if listing_dict.get('created_at') else None,
-                                "owner_id": listing_dict.get('owner_id', ''),
-                                "remaining_space": listing_dict.get('remaining_space', 0),
-                                "is_available": bool(listing_dict.get('is_available', True)) if float(listing_dict.get('remaining_space', 0)) > 0 else False,
-                                "hall_name": listing_dict.get('hall_name', '')
-                            }
-                            formatted_listings.append(formatted_listing)
-                        except Exception as e:
-                            print(f"DEBUG: Error formatting listing: {e}")
-                            print(f"DEBUG: Listing data: {listing}")
-                            continue
+                    formatted_listings = serializer.listing_serializer('my_listings', column_names).rows(listings)
                     
                     # Add CORS headers to the response
-                    response = jsonify(formatted_listings)
+                    response = json_response(formatted_listings)
                     response.headers['Access-Control-Allow-Origin'] = request.headers.get('Origin', '*')
                     response.headers['Access-Control-Allow-Credentials'] = 'true'
                     
-                    print(f"Returning {len(formatted_listings)} formatted listings")
-                    return response, 200
+                    logger.debug("Returning %s formatted listings", len(formatted_listings))
+                    return conditional.tag(response, etag, vary=PER_USER_VARY), 200
                 except Exception as e:
-                    print(f"Error executing query: {e}")
+                    logger.error("Error executing query: %s", e)
                     conn.rollback()
                     raise
-        finally:
-            conn.close()
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in get_my_listings")
         return jsonify({"error": "We couldn't retrieve your listings at this time. Please try again later."}), 500
 
 # API to update a listing
@@ -887,27 +956,27 @@ def update_listing(listing_id):
         
         if authenticated:
             # Get from session if authenticated
-            print("User authenticated via session for update")
+            logger.debug("User authenticated via session for update")
             user_info = session.get('user_info', {})
             owner_id = user_info.get('user', '').lower()
             user_type_header = user_info.get('user_type', None)  # Try to get user_type from session
-            print(f"Authenticated username from session: {owner_id}")
+            logger.debug("Authenticated username from session: %s", owner_id)
         else:
             # If not authenticated via session, check headers
-            print("User not authenticated via session, checking headers for update")
+            logger.debug("User not authenticated via session, checking headers for update")
             username_header = request.headers.get('X-Username')
             user_type_header = request.headers.get('X-User-Type')
             
             if username_header:
                 owner_id = username_header.lower()
-                print(f"Using username from X-Username header for listing update: {owner_id}")
+                logger.debug("Using username from X-Username header for listing update: %s", owner_id)
             else:
                 # No authentication found
-                print("No authentication found in session or headers")
+                logger.debug("No authentication found in session or headers")
                 return jsonify({"error": "Not authenticated"}), 401
         
         if not owner_id:
-            print("Owner ID not found in session or headers")
+            logger.info("Owner ID not found in session or headers")
             return jsonify({"error": "User ID not found"}), 400
         
         # Get the updated data
@@ -936,29 +1005,24 @@ def update_listing(listing_id):
             except Exception:
                 return jsonify({"error": "Invalid value for square feet."}), 400
 
-        # Get a fresh connection
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"error": "We're experiencing temporary database issues. Please try again later."}), 500
-
-        try:
+        with db.connection() as conn:
             with conn.cursor() as cur:
                 # First verify that the listing exists
-                print(f"Checking if listing {listing_id} exists for update")
+                logger.debug("Checking if listing %s exists for update", listing_id)
                 cur.execute("SELECT owner_id FROM storage_listings WHERE listing_id = %s", (listing_id,))
                 listing = cur.fetchone()
 
                 if not listing:
-                    print(f"Listing {listing_id} not found for update")
+                    logger.info("Listing %s not found for update", listing_id)
                     return jsonify({"error": "We couldn't find this storage listing. It may have been removed."}), 404
 
                 db_owner_id = listing[0]
-                print(f"Listing owner is: {db_owner_id}, update request from: {owner_id}, user_type: {user_type_header}")
+                logger.debug("Listing owner is: %s, update request from: %s, user_type: %s", db_owner_id, owner_id, user_type_header)
 
                 # Admin can update any listing
                 is_admin = user_type_header == 'admin'
                 if not is_admin and db_owner_id != owner_id:
-                    print(f"Permission denied: {owner_id} is not owner of listing {listing_id} and not admin")
+                    logger.warning("Permission denied: %s is not owner of listing %s and not admin", owner_id, listing_id)
                     return jsonify({"error": "You don't have permission to update this listing. Please contact support if you believe this is an error."}), 403
 
                 # Prepare update data
@@ -1008,7 +1072,8 @@ def update_listing(listing_id):
                 # Execute the update
                 cur.execute(query, list(update_values.values()) + [listing_id])
                 conn.commit()
-                print(f"Listing {listing_id} updated successfully")
+                invalidate_listing_feed()
+                logger.info("Listing %s updated successfully", listing_id)
 
                 # If admin, update reported_listings status as well (now by report_id, not listing_id)
                 if is_admin and data.get('admin_action') in ['accept', 'reject']:
@@ -1037,15 +1102,12 @@ def update_listing(listing_id):
                         UPDATE storage_listings SET remaining_space = %s WHERE listing_id = %s
                     """, (new_remaining, listing_id))
                     conn.commit()
-                    print(f"Updated remaining_space for listing {listing_id} to {new_remaining}")
+                    invalidate_listing_feed()
+                    logger.info("Updated remaining_space for listing %s to %s", listing_id, new_remaining)
                 
                 return jsonify({"success": True, "message": "Listing updated successfully"}), 200
-        finally:
-            conn.close()
     except Exception as e:
-        print("Error updating listing:", str(e))
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error updating listing")
         return jsonify({"error": "We couldn't update your listing. Please check your information and try again."}), 500
 
 # API to delete a listing
@@ -1058,68 +1120,61 @@ def delete_listing(listing_id):
         
         if authenticated:
             # Get from session if authenticated
-            print("User authenticated via session")
+            logger.debug("User authenticated via session")
             user_info = session.get('user_info', {})
             owner_id = user_info.get('user', '').lower()
-            print(f"Authenticated username from session: {owner_id}")
+            logger.debug("Authenticated username from session: %s", owner_id)
         else:
             # If not authenticated via session, check headers
-            print("User not authenticated via session, checking headers")
+            logger.debug("User not authenticated via session, checking headers")
             username_header = request.headers.get('X-Username')
             user_type_header = request.headers.get('X-User-Type')
             
             if username_header:
                 owner_id = username_header.lower()
-                print(f"Using username from X-Username header for listing deletion: {owner_id}")
+                logger.debug("Using username from X-Username header for listing deletion: %s", owner_id)
             else:
                 # No authentication found
-                print("No authentication found in session or headers")
+                logger.debug("No authentication found in session or headers")
                 return jsonify({"error": "Not authenticated"}), 401
         
         if not owner_id:
-            print("Owner ID not found in session or headers")
+            logger.info("Owner ID not found in session or headers")
             return jsonify({"error": "User ID not found"}), 400
         
-        # Get a fresh connection
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"error": "We're experiencing temporary database issues. Please try again later."}), 500
-            
-        try:
-            with conn.cursor() as cur:
-                # First verify that the listing belongs to the current user
-                print(f"Checking if listing {listing_id} belongs to {owner_id}")
-                cur.execute("SELECT owner_id FROM storage_listings WHERE listing_id = %s", (listing_id,))
-                listing = cur.fetchone()
-                
-                if not listing:
-                    print(f"Listing {listing_id} not found")
-                    return jsonify({"error": "We couldn't find this storage listing. It may have been removed."}), 404
+        with db.connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    # First verify that the listing belongs to the current user
+                    logger.debug("Checking if listing %s belongs to %s", listing_id, owner_id)
+                    cur.execute("SELECT owner_id FROM storage_listings WHERE listing_id = %s", (listing_id,))
+                    listing = cur.fetchone()
+                
+                    if not listing:
+                        logger.info("Listing %s not found", listing_id)
+                        return jsonify({"error": "We couldn't find this storage listing. It may have been removed."}), 404
                     
-                # Check if the current user is the owner
-                db_owner_id = listing[0]
-                print(f"Listing owner is: {db_owner_id}, request from: {owner_id}")
-                if db_owner_id != owner_id:
-                    print(f"Permission denied: {owner_id} is not owner of listing {listing_id}")
-                    return jsonify({"error": "You don't have permission to delete this listing. Please contact support if you believe this is an error."}), 403
-                
-                # Delete the listing
-                print(f"Deleting listing {listing_id}")
-                cur.execute("DELETE FROM storage_listings WHERE listing_id = %s", (listing_id,))
-                conn.commit()
-                print(f"Listing {listing_id} deleted successfully")
+                    # Check if the current user is the owner
+                    db_owner_id = listing[0]
+                    logger.debug("Listing owner is: %s, request from: %s", db_owner_id, owner_id)
+                    if db_owner_id != owner_id:
+                        logger.warning("Permission denied: %s is not owner of listing %s", owner_id, listing_id)
+                        return jsonify({"error": "You don't have permission to delete this listing. Please contact support if you believe this is an error."}), 403
+                
+                    # Delete the listing
+                    logger.debug("Deleting listing %s", listing_id)
+                    cur.execute("DELETE FROM storage_listings WHERE listing_id = %s", (listing_id,))
+                    conn.commit()
+                    invalidate_listing_feed()
+                    logger.info("Listing %s deleted successfully", listing_id)
                 
-                return jsonify({"success": True, "message": "Listing deleted successfully"}), 200
-        except Exception as e:
-            conn.rollback()
-            print("Database error while deleting listing:", str(e))
-            return jsonify({"error": f"Database error: {str(e)}"}), 500
-        finally:
-            conn.close()
+                    return jsonify({"success": True, "message": "Listing deleted successfully"}), 200
+            except Exception as e:
+                conn.rollback()
+                logger.error("Database error while deleting listing: %s", e)
+                return jsonify({"error": f"Database error: {str(e)}"}), 500
     except Exception as e:
-        print("Error deleting listing:", str(e))
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error deleting listing")
         return jsonify({"error": str(e)}), 500
 
 # Initialize CSRF protection
@@ -1142,11 +1197,7 @@ def get_interested_renters(listing_id):
         user_info = session['user_info']
         owner_id = user_info.get('user', '').lower()
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"error": "Database connection failed"}), 500
-            
-        try:
+        with db.connection() as conn:
             with conn.cursor() as cur:
                 # Verify that the listing belongs to the current user
                 cur.execute("""
@@ -1185,12 +1236,8 @@ def get_interested_renters(listing_id):
                     })
                 
                 return jsonify(interested_renters), 200
-        finally:
-            conn.close()
     except Exception as e:
-        print("Error getting interested renters:", str(e))
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error getting interested renters")
         return jsonify({"error": str(e)}), 500
 
 # --- RESERVATION REQUEST ENDPOINTS ---
@@ -1199,7 +1246,7 @@ def get_interested_renters(listing_id):
 @app.route('/api/listings/<int:listing_id>/reserve', methods=['POST'])
 def reserve_space(listing_id):
     try:
-        print(f"[RESERVE] Incoming reservation request for listing_id={listing_id}")
+        logger.debug("[RESERVE] Incoming reservation request for listing_id=%s", listing_id, extra={'sample': 'reserve'})
         authenticated = auth.is_authenticated()
         renter_username = None
         if authenticated:
@@ -1207,73 +1254,55 @@ def reserve_space(listing_id):
             renter_username = user_info.get('user', '').lower()
         else:
             renter_username = request.headers.get('X-Username', '').lower()
-        print(f"[RESERVE] Authenticated: {authenticated}, Renter Username: {renter_username}")
+        logger.debug("[RESERVE] Authenticated: %s, Renter Username: %s", authenticated, renter_username, extra={'sample': 'reserve'})
         if not renter_username:
-            print("[RESERVE] No renter_username provided")
+            logger.info("[RESERVE] No renter_username provided")
             return jsonify({'error': 'Not authenticated'}), 401
         data = request.get_json()
-        print(f"[RESERVE] Payload: {data}")
+        logger.debug("[RESERVE] Payload: %s", data, extra={'sample': 'reserve'})
         requested_space = float(data.get('requested_space', 0))
         if requested_space <= 0:
-            print(f"[RESERVE] Invalid requested_space: {requested_space}")
+            logger.info("[RESERVE] Invalid requested_space: %s", requested_space)
             return jsonify({'error': 'Requested space must be positive'}), 400
         if not requested_space.is_integer():
-            print(f"[RESERVE] Non-integer requested_space: {requested_space}")
+            logger.info("[RESERVE] Non-integer requested_space: %s", requested_space)
             return jsonify({'error': 'Requested space must be a whole number (integer) of square feet.'}), 400
-        conn = get_db_connection()
-        try:
+        with db.connection() as conn:
             with conn.cursor() as cur:
-                # Duplicate check: does a pending request already exist for this renter and listing?
-                cur.execute("""
-                    SELECT 1 FROM reservation_requests
-                    WHERE listing_id = %s AND renter_username = %s AND status = 'pending'
-                    LIMIT 1
-                """, (listing_id, renter_username))
-                if cur.fetchone():
-                    print(f"[RESERVE] Duplicate pending reservation for {renter_username} on listing {listing_id}")
+                # Insert only if the listing can take the request, in one statement; the
+                # unique index uq_reservation_requests_pending rejects a second pending
+                # request from the same renter even when two arrive at once
+                lender_column = ", lender_username" if schema.table(conn, 'reservation_requests').has('lender_username') else ""
+                lender_value = ", owner_id" if lender_column else ""
+                try:
+                    cur.execute(f"""
+                        INSERT INTO reservation_requests (listing_id, renter_username{lender_column}, requested_space, status)
+                        SELECT listing_id, %s{lender_value}, %s, 'pending'
+                        FROM storage_listings
+                        WHERE listing_id = %s AND is_available AND remaining_space >= %s
+                        RETURNING request_id
+                    """, (renter_username, requested_space, listing_id, requested_space))
+                except psycopg2.errors.UniqueViolation:
+                    conn.rollback()
+                    logger.info("[RESERVE] Duplicate pending reservation for %s on listing %s", renter_username, listing_id)
                     return jsonify({'error': 'You already have a pending reservation request for this listing.'}), 400
-                # Get listing and check remaining_space
-                cur.execute("SELECT remaining_space, is_available, owner_id FROM storage_listings WHERE listing_id = %s", (listing_id,))
                 row = cur.fetchone()
-                if not row:
-                    print(f"[RESERVE] Listing {listing_id} not found")
-                    return jsonify({'error': 'Listing not found'}), 404
-                remaining_space, is_available, lender_username = row
-                print(f"[RESERVE] Listing remaining_space: {remaining_space}, is_available: {is_available}, lender: {lender_username}")
-                if not is_available or remaining_space is None or remaining_space < requested_space:
-                    print(f"[RESERVE] Not enough space: requested {requested_space}, available {remaining_space}")
+                if row is None:
+                    # Nothing inserted: work out why for the error message
+                    cur.execute("SELECT remaining_space, is_available FROM storage_listings WHERE listing_id = %s", (listing_id,))
+                    listing = cur.fetchone()
+                    if not listing:
+                        logger.info("[RESERVE] Listing %s not found", listing_id)
+                        return jsonify({'error': 'Listing not found'}), 404
+                    logger.info("[RESERVE] Not enough space: requested %s, available %s, is_available: %s", requested_space, listing[0], listing[1])
                     return jsonify({'error': 'Not enough space available'}), 400
                 
-                # Check if lender_username field exists in the reservation_requests table
-                cur.execute("""
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_name = 'reservation_requests';
-                """)
-                available_columns = [col[0] for col in cur.fetchall()]
-                
-                # Insert reservation request
-                if 'lender_username' in available_columns:
-                    print(f"[RESERVE] Adding request with lender_username field")
-                    cur.execute("""
-                        INSERT INTO reservation_requests (listing_id, renter_username, lender_username, requested_space, status)
-                        VALUES (%s, %s, %s, %s, 'pending') RETURNING request_id
-                    """, (listing_id, renter_username, lender_username, requested_space))
-                else:
-                    print(f"[RESERVE] Adding request without lender_username field")
-                    cur.execute("""
-                        INSERT INTO reservation_requests (listing_id, renter_username, requested_space, status)
-                        VALUES (%s, %s, %s, 'pending') RETURNING request_id
-                    """, (listing_id, renter_username, requested_space))
-                
-                request_id = cur.fetchone()[0]
+                request_id = row[0]
                 conn.commit()
-                print(f"[RESERVE] Reservation created: request_id={request_id}")
+                logger.info("[RESERVE] Reservation created: request_id=%s", request_id)
                 return jsonify({'success': True, 'request_id': request_id}), 201
-        finally:
-            conn.close()
     except Exception as e:
-        print('[RESERVE] Error in reserve_space:', e)
+        logger.error("[RESERVE] Error in reserve_space: %s", e)
         return jsonify({'error': 'We couldn\'t process your reservation request at this time. Please try again later.'}), 500
 
 # 2. Lender views all reservation requests for their listing
@@ -1289,8 +1318,7 @@ def get_reservation_requests(listing_id):
             owner_id = request.headers.get('X-Username', '').lower()
         if not owner_id:
             return jsonify({'error': 'Not authenticated'}), 401
-        conn = get_db_connection()
-        try:
+        with db.connection() as conn:
             with conn.cursor() as cur:
                 # Check ownership
                 cur.execute("SELECT owner_id FROM storage_listings WHERE listing_id = %s", (listing_id,))
@@ -1314,10 +1342,8 @@ def get_reservation_requests(listing_id):
                     } for r in cur.fetchall()
                 ]
                 return jsonify(requests), 200
-        finally:
-            conn.close()
     except Exception as e:
-        print('Error in get_reservation_requests:', e)
+        logger.error('Error in get_reservation_requests: %s', e)
         return jsonify({'error': 'We couldn\'t retrieve the reservation requests for this listing. Please try again later.'}), 500
 
 # 3. Lender approves/rejects/partially approves a reservation request
@@ -1338,11 +1364,10 @@ def update_reservation_request(request_id):
         approved_space = data.get('approved_space')
         if new_status not in ['approved_full', 'approved_partial', 'rejected', 'cancelled_by_renter', 'expired']:
             return jsonify({'error': 'Invalid status'}), 400
-        conn = get_db_connection()
-        try:
+        with db.connection() as conn:
             with conn.cursor() as cur:
-                # Get reservation request and listing
-                cur.execute("SELECT listing_id, requested_space, status, renter_username FROM reservation_requests WHERE request_id = %s", (request_id,))
+                # Lock the request so concurrent actions on it queue up behind this one
+                cur.execute("SELECT listing_id, requested_space, status, renter_username FROM reservation_requests WHERE request_id = %s FOR UPDATE", (request_id,))
                 req = cur.fetchone()
                 if not req:
                     return jsonify({'error': 'Request not found'}), 404
@@ -1359,44 +1384,201 @@ def update_reservation_request(request_id):
                     conn.commit()
                     return jsonify({'success': True}), 200
                 # Check ownership (lender actions)
-                cur.execute("SELECT owner_id, remaining_space FROM storage_listings WHERE listing_id = %s", (listing_id,))
+                cur.execute("SELECT owner_id FROM storage_listings WHERE listing_id = %s", (listing_id,))
                 row = cur.fetchone()
                 if not row or row[0] != owner_id:
                     return jsonify({'error': 'Not authorized'}), 403
-                remaining_space = row[1]
-                # Approve full
-                if new_status == 'approved_full':
-                    if remaining_space < requested_space:
-                        return jsonify({'error': 'Not enough space for full approval'}), 400
+                if new_status in ('approved_full', 'approved_partial'):
+                    if new_status == 'approved_full':
+                        space = requested_space
+                        no_space_error = 'Not enough space for full approval'
+                    else:
+                        # remaining_space and approved_space are INTEGER columns; a fraction would be rounded
+                        try:
+                            space = float(approved_space)
+                        except (TypeError, ValueError):
+                            return jsonify({'error': 'Invalid approved space'}), 400
+                        if not space > 0:
+                            return jsonify({'error': 'Invalid approved space'}), 400
+                        if not space.is_integer():
+                            return jsonify({'error': 'Approved space must be a whole number (integer) of square feet.'}), 400
+                        space = int(space)
+                        no_space_error = 'Invalid approved space'
+                    # Take the space in one conditional UPDATE: the row lock serializes concurrent
+                    # approvals on the listing and the WHERE is re-checked after waiting for it,
+                    # so two approvals can never both spend the same square feet
                     cur.execute("""
-                        UPDATE reservation_requests SET status = %s, approved_space = %s, updated_at = %s WHERE request_id = %s
-                    """, ('approved_full', requested_space, datetime.utcnow(), request_id))
-                    new_remaining = remaining_space - requested_space
-                    is_available = new_remaining > 0
-                    cur.execute("UPDATE storage_listings SET remaining_space = %s, is_available = %s WHERE listing_id = %s", (new_remaining, is_available, listing_id))
-                # Approve partial
-                elif new_status == 'approved_partial':
-                    if not approved_space or float(approved_space) <= 0 or float(approved_space) > remaining_space:
-                        return jsonify({'error': 'Invalid approved space'}), 400
+                        UPDATE storage_listings
+                        SET remaining_space = remaining_space - %s, is_available = remaining_space - %s > 0
+                        WHERE listing_id = %s AND remaining_space >= %s
+                        RETURNING remaining_space
+                    """, (space, space, listing_id, space))
+                    if cur.fetchone() is None:
+                        return jsonify({'error': no_space_error}), 400
                     cur.execute("""
                         UPDATE reservation_requests SET status = %s, approved_space = %s, updated_at = %s WHERE request_id = %s
-                    """, ('approved_partial', approved_space, datetime.utcnow(), request_id))
-                    new_remaining = remaining_space - float(approved_space)
-                    is_available = new_remaining > 0
-                    cur.execute("UPDATE storage_listings SET remaining_space = %s, is_available = %s WHERE listing_id = %s", (new_remaining, is_available, listing_id))
+                    """, (new_status, space, datetime.utcnow(), request_id))
                 # Reject/cancel/expire (by lender)
                 else:
                     cur.execute("""
                         UPDATE reservation_requests SET status = %s, updated_at = %s WHERE request_id = %s
                     """, (new_status, datetime.utcnow(), request_id))
                 conn.commit()
+                # Approvals change remaining_space/is_available shown in the feed
+                invalidate_listing_feed()
                 return jsonify({'success': True}), 200
-        finally:
-            conn.close()
     except Exception as e:
-        print('Error in update_reservation_request:', e)
+        logger.error('Error in update_reservation_request: %s', e)
         return jsonify({'error': 'We were unable to update this reservation request. Please try again later.'}), 500
 
+# 4. Lender approves/rejects many reservation requests in one transaction
+MAX_RESERVATION_BATCH = 100
+BATCH_LENDER_STATUSES = ('approved_full', 'approved_partial', 'rejected', 'expired')
+
+@app.route('/api/reservation-requests/batch', methods=['POST'])
+def batch_update_reservation_requests():
+    """Apply several lender actions at once.
+
+    Body: {"requests": [{"request_id": 1, "status": "approved_full"},
+                        {"request_id": 2, "status": "approved_partial", "approved_space": 10}, ...]}
+
+    Items are applied in order within one transaction; an item that cannot be applied
+    (not found, not yours, already processed, not enough space left) is reported in
+    its result and does not stop the others.
+    """
+    try:
+        authenticated = auth.is_authenticated()
+        owner_id = None
+        if authenticated:
+            user_info = session.get('user_info', {})
+            owner_id = user_info.get('user', '').lower()
+        else:
+            owner_id = request.headers.get('X-Username', '').lower()
+        if not owner_id:
+            return jsonify({'error': 'Not authenticated'}), 401
+        data = request.get_json(silent=True)
+        items = data.get('requests') if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'Expected a non-empty list of requests'}), 400
+        if len(items) > MAX_RESERVATION_BATCH:
+            return jsonify({'error': f'At most {MAX_RESERVATION_BATCH} requests per batch'}), 400
+        
+        # Validate the items themselves before touching the database
+        results = []
+        actions = []  # (result, request_id, status, approved_space)
+        seen = set()
+        for item in items:
+            request_id = item.get('request_id') if isinstance(item, dict) else None
+            result = {'request_id': request_id, 'success': False}
+            results.append(result)
+            if not isinstance(request_id, int) or isinstance(request_id, bool):
+                result['error'] = 'Invalid request_id'
+                continue
+            if request_id in seen:
+                result['error'] = 'Duplicate request_id in batch'
+                continue
+            seen.add(request_id)
+            new_status = item.get('status')
+            if new_status not in BATCH_LENDER_STATUSES:
+                result['error'] = 'Invalid status'
+                continue
+            approved_space = None
+            if new_status == 'approved_partial':
+                try:
+                    approved_space = float(item.get('approved_space') or 0)
+                except (TypeError, ValueError):
+                    approved_space = 0
+                if not approved_space > 0:
+                    result['error'] = 'Invalid approved space'
+                    continue
+                if not approved_space.is_integer():
+                    result['error'] = 'Approved space must be a whole number (integer) of square feet.'
+                    continue
+                approved_space = int(approved_space)
+            actions.append((result, request_id, new_status, approved_space))
+        
+        if actions:
+            with db.connection() as conn:
+                with conn.cursor() as cur:
+                    # Ownership and state for every request in one query. Requests are locked
+                    # before listings, the same order update_reservation_request uses.
+                    cur.execute("""
+                        SELECT r.request_id, r.listing_id, r.requested_space, r.status, l.owner_id
+                        FROM reservation_requests r
+                        JOIN storage_listings l ON l.listing_id = r.listing_id
+                        WHERE r.request_id = ANY(%s)
+                        ORDER BY r.request_id
+                        FOR UPDATE OF r
+                    """, ([request_id for _, request_id, _, _ in actions],))
+                    found = {row[0]: row[1:] for row in cur.fetchall()}
+                    
+                    listing_ids = sorted({found[request_id][0] for _, request_id, _, _ in actions
+                                          if request_id in found and found[request_id][3] == owner_id})
+                    remaining = {}
+                    if listing_ids:
+                        cur.execute("""
+                            SELECT listing_id, remaining_space FROM storage_listings
+                            WHERE listing_id = ANY(%s)
+                            ORDER BY listing_id
+                            FOR UPDATE
+                        """, (listing_ids,))
+                        remaining = {listing_id: space or 0 for listing_id, space in cur.fetchall()}
+                    
+                    # Walk the items in order against the locked remaining space
+                    taken = {}
+                    updates = []
+                    for result, request_id, new_status, approved_space in actions:
+                        if request_id not in found:
+                            result['error'] = 'Request not found'
+                            continue
+                        listing_id, requested_space, current_status, listing_owner = found[request_id]
+                        if listing_owner != owner_id:
+                            result['error'] = 'Not authorized'
+                            continue
+                        if current_status != 'pending':
+                            result['error'] = 'Request already processed'
+                            continue
+                        if new_status in ('approved_full', 'approved_partial'):
+                            space = requested_space if new_status == 'approved_full' else approved_space
+                            if space > remaining.get(listing_id, 0):
+                                result['error'] = ('Not enough space for full approval' if new_status == 'approved_full'
+                                                   else 'Invalid approved space')
+                                continue
+                            remaining[listing_id] -= space
+                            taken[listing_id] = taken.get(listing_id, 0) + space
+                            approved_space = space
+                        updates.append((request_id, new_status, approved_space))
+                        result['success'] = True
+                        result['status'] = new_status
+                    
+                    if updates:
+                        request_ids, statuses, spaces = (list(column) for column in zip(*updates))
+                        cur.execute("""
+                            UPDATE reservation_requests r
+                            SET status = d.status, approved_space = COALESCE(d.approved_space, r.approved_space), updated_at = %s
+                            FROM unnest(%s::int[], %s::text[], %s::int[]) AS d(request_id, status, approved_space)
+                            WHERE r.request_id = d.request_id
+                        """, (datetime.utcnow(), request_ids, statuses, spaces))
+                    if taken:
+                        # One remaining_space update per listing, however many approvals it got
+                        taken_ids, taken_spaces = (list(column) for column in zip(*taken.items()))
+                        cur.execute("""
+                            UPDATE storage_listings l
+                            SET remaining_space = l.remaining_space - d.taken,
+                                is_available = l.remaining_space - d.taken > 0
+                            FROM unnest(%s::int[], %s::int[]) AS d(listing_id, taken)
+                            WHERE l.listing_id = d.listing_id
+                        """, (taken_ids, taken_spaces))
+                    conn.commit()
+            if taken:
+                invalidate_listing_feed()
+        
+        succeeded = sum(1 for result in results if result['success'])
+        return jsonify({'results': results, 'succeeded': succeeded, 'failed': len(results) - succeeded}), 200
+    except Exception as e:
+        logger.error('Error in batch_update_reservation_requests: %s', e)
+        return jsonify({'error': 'We were unable to update these reservation requests. Please try again later.'}), 500
+
 # API endpoint to fetch a user's reservation requests
 @app.route('/api/my-reservation-requests', methods=['GET'])
 def get_my_reservation_requests():
@@ -1413,97 +1595,107 @@ def get_my_reservation_requests():
             elif 'CAS_USERNAME' in session:
                 username = session.get('CAS_USERNAME', '').lower()
         except Exception as e:
-            print(f"Error accessing session: {str(e)}")
+            logger.error("Error accessing session: %s", e)
     
-    print(f"[RESERVATION REQUESTS] Fetching requests for username: {username}")
+    logger.debug("[RESERVATION REQUESTS] Fetching requests for username: %s", username)
     
     # If still no username, return error
     if not username:
-        print("[RESERVATION REQUESTS] No username found in headers or session")
+        logger.info("[RESERVATION REQUESTS] No username found in headers or session")
         return jsonify({'error': 'Username is required. Please provide X-Username header or username query param.'}), 400
     
-    conn = None
     try:
-        conn = get_db_connection()
-        if not conn:
-            print("[RESERVATION REQUESTS] Database connection failed")
-            return jsonify({'error': 'Database connection failed'}), 500
-        
-        with conn.cursor() as cur:
-            # First check if the reservation_requests table exists
-            cur.execute("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_name = 'reservation_requests'
-                );
-            """)
-            reservation_table_exists = cur.fetchone()[0]
+        with db.connection() as conn:
+            with conn.cursor() as cur:
+                # If the reservation_requests table doesn't exist, return empty result
+                if not schema.table(conn, 'reservation_requests').exists:
+                    logger.warning("[RESERVATION REQUESTS] reservation_requests table does not exist")
+                    return jsonify([]), 200
             
-            # If table doesn't exist, return empty result
-            if not reservation_table_exists:
-                print("[RESERVATION REQUESTS] reservation_requests table does not exist")
-                return jsonify([]), 200
+                etag = conditional.etag_for(conn, ('reservation_requests', 'storage_listings'),
+                                            'my-reservation-requests', username)
+                cached = conditional.not_modified(etag, vary=PER_USER_VARY)
+                if cached is not None:
+                    return cached
             
-            # Simplified query that explicitly includes dates
-            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-            try:
-                # Use a simpler query that explicitly pulls the fields we need
-                query = """
-                    SELECT 
-                        r.request_id, 
-                        r.listing_id,
-                        r.renter_username, 
-                        r.requested_space, 
-                        r.approved_space, 
-                        r.status, 
-                        r.created_at, 
-                        r.updated_at,
-                        l.title, 
-                        l.address, 
-                        l.hall_name, 
-                        l.sq_ft, 
-                        l.cost, 
-                        l.owner_id,
-                        l.start_date,
-                        l.end_date,
-                        l.image_url
-                    FROM reservation_requests r
-                    JOIN storage_listings l ON r.listing_id = l.listing_id
-                    WHERE r.renter_username = %s
-                    ORDER BY r.created_at DESC
-                """
-                
-                print(f"[RESERVATION REQUESTS] Executing query: {query}")
-                cursor.execute(query, (username,))
-                requests = cursor.fetchall()
-                print(f"[RESERVATION REQUESTS] Found {len(requests)} requests")
-                
-                # Debug the first request's dates
-                if requests and len(requests) > 0:
-                    first_req = requests[0]
-                    print(f"[RESERVATION REQUESTS] First request dates: start_date={first_req.get('start_date')}, end_date={first_req.get('end_date')}")
-                
-                # Convert all date objects to ISO strings for proper JSON serialization
-                result = []
-                for req in requests:
-                    item = dict(req)
-                    # Convert date fields to ISO format
-                    for field in ['created_at', 'updated_at', 'start_date', 'end_date']:
-                        if field in item and item[field] is not None and hasattr(item[field], 'isoformat'):
-                            item[field] = item[field].isoformat()
-                    result.append(item)
-                
-                return jsonify(result)
-            finally:
-                cursor.close()
+                if FEED_JSON_MODE == 'postgres':
+                    # Same keys and values as the dicts below: ISO dates, cost as its decimal string
+                    timestamp = 'timestamp without time zone'
+                    request_json = serializer.json_object_sql([
+                        (column, f"r.{column}") for column in
+                        ('request_id', 'listing_id', 'renter_username', 'requested_space', 'approved_space', 'status')
+                    ] + [
+                        ('created_at', serializer.iso_sql('r.created_at', timestamp)),
+                        ('updated_at', serializer.iso_sql('r.updated_at', timestamp)),
+                        ('cost', 'l.cost::text'),
+                    ] + [
+                        (column, f"l.{column}") for column in
+                        ('title', 'address', 'hall_name', 'sq_ft', 'owner_id', 'start_date', 'end_date', 'image_url')
+                    ])
+                    cur.execute(f"""
+                        SELECT COALESCE(json_agg({request_json} ORDER BY r.created_at DESC), '[]')::text
+                        FROM reservation_requests r
+                        JOIN storage_listings l ON r.listing_id = l.listing_id
+                        WHERE r.renter_username = %s
+                    """, (username,))
+                    response = app.response_class(cur.fetchone()[0], mimetype=app.json.mimetype)
+                    return conditional.tag(response, etag, vary=PER_USER_VARY)
+            
+                # Simplified query that explicitly includes dates
+                cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+                try:
+                    # Use a simpler query that explicitly pulls the fields we need
+                    query = """
+                        SELECT 
+                            r.request_id, 
+                            r.listing_id,
+                            r.renter_username, 
+                            r.requested_space, 
+                            r.approved_space, 
+                            r.status, 
+                            r.created_at, 
+                            r.updated_at,
+                            l.title, 
+                            l.address, 
+                            l.hall_name, 
+                            l.sq_ft, 
+                            l.cost, 
+                            l.owner_id,
+                            l.start_date,
+                            l.end_date,
+                            l.image_url
+                        FROM reservation_requests r
+                        JOIN storage_listings l ON r.listing_id = l.listing_id
+                        WHERE r.renter_username = %s
+                        ORDER BY r.created_at DESC
+                    """
+                
+                    logger.debug("[RESERVATION REQUESTS] Executing query: %s", query, extra={'sample': 'query'})
+                    cursor.execute(query, (username,))
+                    requests = cursor.fetchall()
+                    logger.debug("[RESERVATION REQUESTS] Found %s requests", len(requests))
+                
+                    # Debug the first request's dates
+                    if requests and len(requests) > 0:
+                        first_req = requests[0]
+                        logger.debug("[RESERVATION REQUESTS] First request dates: start_date=%s, end_date=%s", first_req.get('start_date'), first_req.get('end_date'))
+                
+                    # Convert all date objects to ISO strings for proper JSON serialization
+                    result = []
+                    for req in requests:
+                        item = dict(req)
+                        # Convert date fields to ISO format
+                        for field in ['created_at', 'updated_at', 'start_date', 'end_date']:
+                            if field in item and item[field] is not None and hasattr(item[field], 'isoformat'):
+                                item[field] = item[field].isoformat()
+                        result.append(item)
+                
+                    return conditional.tag(jsonify(result), etag, vary=PER_USER_VARY)
+                finally:
+                    cursor.close()
     except Exception as e:
-        print(f"Error in get_my_reservation_requests: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in get_my_reservation_requests")
         return jsonify({'error': 'We couldn\'t retrieve your reservation requests at this time. Please try again later.'}), 500
-    finally:
-        if conn:
-            conn.close()
 
 # --- API endpoint for reporting a listing ---
 @app.route('/api/report-listing', methods=['POST'])
@@ -1522,9 +1714,8 @@ def report_listing():
     if not (listing_id and reason):
         return jsonify({'error': 'Missing required fields'}), 400
 
-    conn = get_db_connection()
     try:
-        with conn.cursor() as cur:
+        with db.connection() as conn, conn.cursor() as cur:
             # Check for existing report by this user for this listing
             cur.execute("""
                 SELECT 1 FROM reported_listings WHERE listing_id = %s AND renter_id = %s
@@ -1544,17 +1735,14 @@ def report_listing():
             'created_at': report[1].isoformat() if report[1] else None
         }), 201
     except Exception as e:
-        print('Error in report_listing:', e)
+        logger.error('Error in report_listing: %s', e)
         return jsonify({'error': 'We couldn\'t process your report at this time. Please try again later.'}), 500
-    finally:
-        conn.close()
 
 # --- API endpoint for admin to get all reported listings ---
 @app.route('/api/reported-listings', methods=['GET'])
 def get_reported_listings():
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
+        with db.connection() as conn, conn.cursor() as cur:
             cur.execute('''
                 SELECT s.*, r.report_id, r.reason, r.status AS report_status, r.created_at AS report_created_at, r.renter_id
                 FROM storage_listings s
@@ -1572,11 +1760,8 @@ def get_reported_listings():
                 reported.append(listing)
             return jsonify(reported), 200
     except Exception as e:
-        print('Error in get_reported_listings:', e)
+        logger.error('Error in get_reported_listings: %s', e)
         return jsonify({'error': 'We couldn\'t retrieve the reported listings at this time. Please try again later.'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 @app.route('/api/lender-reviews', methods=['POST'])
 def submit_lender_review():
@@ -1590,10 +1775,9 @@ def submit_lender_review():
         or session.get('user_info', {}).get('user')
         or request.headers.get('X-Username', '').lower()
     )
-    print(f"[REVIEW SUBMIT] Authenticated renter_username: {renter_username}")
+    logger.debug("[REVIEW SUBMIT] Authenticated renter_username: %s", renter_username)
 
-    conn = get_db_connection()
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+    with db.connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
         # 1. Fetch reservation and check ownership and approval
         cur.execute("""
             SELECT rr.*, sl.owner_id, sl.end_date
@@ -1604,7 +1788,7 @@ def submit_lender_review():
         reservation = cur.fetchone()
         if not reservation:
             return jsonify({'error': 'Reservation not found'}), 404
-        print(f"[REVIEW SUBMIT] Reservation renter_username: {reservation['renter_username']}")
+        logger.debug("[REVIEW SUBMIT] Reservation renter_username: %s", reservation['renter_username'])
         if reservation['renter_username'] != renter_username:
             return jsonify({'error': 'Not your reservation'}), 403
         if reservation['status'] not in ('approved_full', 'approved_partial'):
@@ -1619,29 +1803,99 @@ def submit_lender_review():
         if cur.fetchone():
             return jsonify({'error': 'You have already reviewed this reservation'}), 400
 
-        # 3. Insert review
+        # 3. Insert review (a trigger updates lender_rating_stats in the same transaction)
         cur.execute("""
             INSERT INTO lender_reviews (lender_username, renter_username, request_id, rating, review_text)
             VALUES (%s, %s, %s, %s, %s)
         """, (reservation['owner_id'], renter_username, request_id, rating, review_text))
         conn.commit()
+    # The feed includes each lender's average rating
+    invalidate_listing_feed()
+    lender_review_cache.invalidate(reservation['owner_id'].lower())
     return jsonify({'success': True})
 
+# Per-lender review summary (count/average/histogram), dropped when the lender gets a new review.
+# Other workers only see that invalidate() with the file backend, so entries carry the
+# lender_reviews ETag and are revalidated against it on every read (ttl 0) like the feed's
+lender_review_cache = feed_cache.from_env('LENDER_REVIEW_CACHE', ttl=0, dirname='tigerstorage-review-cache')
+LENDER_REVIEWS_PAGE_SIZE = 20
+LENDER_REVIEWS_MAX_PAGE_SIZE = 100
+
+def lender_review_summary(lender_username):
+    """Cached {review_count, avg_rating, histogram} for a lender"""
+    key = lender_username.lower()
+    
+    def build(stale):
+        with db.connection() as conn:
+            etag = conditional.etag_for(conn, ('lender_reviews',), 'review-summary', key)
+            if stale is not None and etag is not None and stale.etag == etag:
+                return stale
+            stats = lender_ratings.lender_stats(conn, key)
+        return feed_cache.FeedEntry(etag, json.dumps(stats).encode())
+    
+    return json.loads(lender_review_cache.get_or_build(key, build).body)
+
 @app.route('/api/lender-reviews/<lender_username>', methods=['GET'])
 def get_lender_reviews(lender_username):
-    conn = get_db_connection()
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("""
-            SELECT lr.rating, lr.review_text, lr.created_at, lr.renter_username,
+    """Reviews for a lender, newest first.
+
+    Without `limit`/`cursor` every review is returned as a plain list. With either,
+    one page is returned as {"summary": {...}, "reviews": [...], "next_cursor": ...};
+    pass next_cursor back as `cursor` to get the following page.
+    """
+    if 'limit' not in request.args and 'cursor' not in request.args:
+        with db.connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT lr.rating, lr.review_text, lr.created_at, lr.renter_username,
+                       sl.listing_id, sl.title
+                FROM lender_reviews lr
+                JOIN reservation_requests rr ON lr.request_id = rr.request_id
+                JOIN storage_listings sl ON rr.listing_id = sl.listing_id
+                WHERE LOWER(lr.lender_username) = LOWER(%s)
+                ORDER BY lr.created_at DESC
+            """, (lender_username,))
+            reviews = cur.fetchall()
+        return jsonify(reviews)
+    
+    try:
+        limit = int(request.args.get('limit', LENDER_REVIEWS_PAGE_SIZE))
+        if limit < 1 or limit > LENDER_REVIEWS_MAX_PAGE_SIZE:
+            raise ValueError(limit)
+    except ValueError:
+        return jsonify({'error': f'limit must be between 1 and {LENDER_REVIEWS_MAX_PAGE_SIZE}'}), 400
+    keyset_clause = ""
+    params = [lender_username]
+    if request.args.get('cursor'):
+        try:
+            after_created_at, after_review_id = decode_cursor(request.args['cursor'], 'reviews')
+        except ListingQueryError as e:
+            return jsonify({'error': str(e)}), 400
+        keyset_clause = "AND (lr.created_at, lr.review_id) < (%s::timestamp, %s)"
+        params += [after_created_at, after_review_id]
+    
+    with db.connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(f"""
+            SELECT lr.review_id, lr.rating, lr.review_text, lr.created_at, lr.renter_username,
                    sl.listing_id, sl.title
             FROM lender_reviews lr
             JOIN reservation_requests rr ON lr.request_id = rr.request_id
             JOIN storage_listings sl ON rr.listing_id = sl.listing_id
-            WHERE lr.lender_username = %s
-            ORDER BY lr.created_at DESC
-        """, (lender_username,))
+            WHERE LOWER(lr.lender_username) = LOWER(%s) {keyset_clause}
+            ORDER BY lr.created_at DESC, lr.review_id DESC
+            LIMIT %s
+        """, params + [limit + 1])
         reviews = cur.fetchall()
-    return jsonify(reviews)
+    
+    next_cursor = None
+    if len(reviews) > limit:
+        reviews = reviews[:limit]
+        next_cursor = encode_cursor('reviews', reviews[-1]['created_at'], reviews[-1]['review_id'])
+    return jsonify({
+        'lender_username': lender_username,
+        'summary': lender_review_summary(lender_username),
+        'reviews': reviews,
+        'next_cursor': next_cursor
+    })
 
 @app.route('/debug-list-assets')
 def debug_list_assets():
@@ -1654,7 +1908,10 @@ def debug_list_assets():
 
 @app.route('/assets/<path:filename>')
 def serve_assets(filename):
-    return send_from_directory(os.path.join('build', 'assets'), filename)
+    # Hashed bundles (listed in the manifest) are cached for a year; files copied from
+    # public/assets keep their names and are revalidated. .br/.gz siblings come from the build step
+    return compression.send_asset(os.path.join('build', 'assets'), filename,
+                                  immutable=asset_registry.immutable(f'assets/{filename}'))
 
 # Add a CSRF error handler for API endpoints
 @app.errorhandler(CSRFError)
@@ -1666,6 +1923,12 @@ def handle_csrf_error(e):
     response.headers['Access-Control-Allow-Credentials'] = 'true'
     return response
 
+# Pool exhausted or database unreachable in a route without its own handler
+@app.errorhandler(db.DatabaseUnavailable)
+def handle_database_unavailable(e):
+    logger.error("Database unavailable: %s", e)
+    return jsonify({"error": "We're experiencing temporary database issues. Please try again later."}), 503
+
 # Add CSP header to all responses for XSS protection
 @app.after_request
 def set_csp_headers(response):
@@ -1697,6 +1960,27 @@ def get_csrf_token():
     )
     return response
 
+# Local load testing only (see stress_test.py): log in as any NetID without CAS.
+# Never registered in production, even if the variable is set.
+TEST_AUTH_ENABLED = os.environ.get('TEST_AUTH_ENABLED') == '1' and not is_production
+
+if TEST_AUTH_ENABLED:
+    logger.warning("TEST_AUTH_ENABLED is set; /api/test-auth/login accepts any username")
+
+    @app.route('/api/test-auth/login', methods=['POST'])
+    @csrf.exempt
+    def test_auth_login():
+        """Start a session for {"username", "user_type"} and return a CSRF token for it"""
+        data = request.get_json(silent=True) or {}
+        username = str(data.get('username', '')).strip().lower()
+        user_type = data.get('user_type', 'lender')
+        if not username or user_type not in ('lender', 'renter', 'admin'):
+            return jsonify({'error': 'username and a user_type of lender, renter or admin are required'}), 400
+        session['user_info'] = {'user': username, 'user_type': user_type}
+        session['user_type'] = user_type
+        session.permanent = True
+        return jsonify({'success': True, 'username': username, 'user_type': user_type, 'csrf_token': generate_csrf()}), 200
+
 @app.route('/api/debug/schema/<table_name>', methods=['GET'])
 def debug_schema(table_name):
     """Debug endpoint to view the schema of a table"""
@@ -1706,11 +1990,7 @@ def debug_schema(table_name):
                 (auth.is_authenticated() and session.get('user_type') == 'admin')):
             return jsonify({'error': 'Not authorized'}), 403
             
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-            
-        with conn.cursor() as cur:
+        with db.connection() as conn, conn.cursor() as cur:
             # Check if table exists
             cur.execute("""
                 SELECT EXISTS (
@@ -1794,23 +2074,104 @@ def debug_schema(table_name):
             })
             
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in debug_schema")
         return jsonify({'error': str(e)}), 500
 
+def is_admin_or_dev():
+    """Admin-only endpoints are also open in development"""
+    return (os.environ.get('FLASK_ENV') == 'development' or
+            (auth.is_authenticated() and session.get('user_type') == 'admin'))
+
+@app.route('/api/admin/db-pool', methods=['GET'])
+def db_pool_stats():
+    """Connection pool stats for the worker that serves this request"""
+    if not is_admin_or_dev():
+        return jsonify({'error': 'Not authorized'}), 403
+    return jsonify(db.pool_stats()), 200
+
+@app.route('/api/admin/schema-cache', methods=['GET', 'POST'])
+def schema_cache():
+    """View the cached table introspection, or drop it (POST) after a schema change"""
+    if not is_admin_or_dev():
+        return jsonify({'error': 'Not authorized'}), 403
+    if request.method == 'POST':
+        schema.invalidate()
+    return jsonify(schema.registry.stats()), 200
+
+@app.route('/api/admin/feed-cache', methods=['GET', 'POST'])
+def feed_cache_stats():
+    """Listing feed and lender review summary cache stats for this worker, or clear them (POST)"""
+    if not is_admin_or_dev():
+        return jsonify({'error': 'Not authorized'}), 403
+    if request.method == 'POST':
+        invalidate_listing_feed()
+        lender_review_cache.invalidate()
+    return jsonify({'listings': listing_feed_cache.stats(), 'lender_review_summaries': lender_review_cache.stats()}), 200
+
+@app.route('/api/admin/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request and SQL metrics for every worker in the Prometheus text format.
+
+    Scrapers without an admin session authenticate with `Authorization: Bearer $METRICS_TOKEN`.
+    """
+    token = os.environ.get('METRICS_TOKEN')
+    bearer = request.headers.get('Authorization', '')
+    if not (is_admin_or_dev() or (token and hmac.compare_digest(bearer, f'Bearer {token}'))):
+        return jsonify({'error': 'Not authorized'}), 403
+    return Response(metrics.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/admin/slow-queries', methods=['GET', 'POST'])
+def slow_query_stats():
+    """Top SQL fingerprints across workers (?sort=total|mean|max|calls|slow&limit=), or reset this worker's (POST)"""
+    if not is_admin_or_dev():
+        return jsonify({'error': 'Not authorized'}), 403
+    if slow_queries.log is None:
+        return jsonify({'error': 'Slow query log is disabled (SLOW_QUERY_LOG=off)'}), 404
+    if request.method == 'POST':
+        slow_queries.log.reset()
+    sort = request.args.get('sort', 'total')
+    if sort not in slow_queries.SORT_KEYS:
+        return jsonify({'error': f"sort must be one of {', '.join(slow_queries.SORT_KEYS)}"}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 500))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    return jsonify(slow_queries.log.top(sort, limit)), 200
+
+@app.route('/api/admin/export/<name>', methods=['GET'])
+def admin_export(name):
+    """Stream a full table as CSV (default) or NDJSON without loading it into memory"""
+    if not is_admin_or_dev():
+        return jsonify({'error': 'Not authorized'}), 403
+    if name not in export.EXPORTS:
+        return jsonify({'error': f"Unknown export '{name}'", 'exports': sorted(export.EXPORTS)}), 404
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in export.FORMATS:
+        return jsonify({'error': "format must be csv or ndjson"}), 400
+
+    def generate():
+        try:
+            yield from export.stream(name, fmt)
+        except Exception:
+            # Headers are already sent: mark the file as incomplete and abort the chunked response
+            logger.exception("Error streaming %s export", name)
+            yield export.truncated_marker(fmt)
+            raise
+
+    response = Response(generate(), content_type=export.FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="tigerstorage-{name}-{date.today().isoformat()}.{fmt}"'
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/api/stress-test/create-listings', methods=['POST'])
 def create_listings():
-    data = request.get_json()
-    listings = data.get('listings', [])
-
-    created_listings = []
-    for listing_data in listings:
-        # Call the existing create_listing function
-        response = create_listing(listing_data)
-        if response[1] == 201:  # If the listing was created successfully
-            created_listings.append(response[0])  # Append the created listing info
-
-    return jsonify({"success": True, "created_listings": created_listings}), 201
+    """Seed listings for load testing; same body as /api/listings/import ({"listings": [...]})"""
+    if not is_admin_or_dev():
+        return jsonify({'error': 'Not authorized'}), 403
+    data = request.get_json(silent=True) or {}
+    body, status = import_listing_rows(data.get('listings', []), request.headers.get('X-Username', '').lower() or None)
+    return jsonify(body), status
 
 if __name__ == "__main__":
     args = parser.parse_args()
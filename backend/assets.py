@@ -0,0 +1,132 @@
+# The built frontend's manifest and SPA shell, kept in memory.
+#
+# Every client-side route (catch_all, /, /map) answers with build/index.html,
+# and get_asset_path looks entries up in build/.vite/manifest.json. Both used
+# to be read from disk (and the manifest parsed) on every call. AssetRegistry
+# loads them once per process, along with the shell's ETag and its gzip /
+# brotli bodies (see compression.py), and serves the shell from memory. It
+# also answers which built files are content-hashed, and so may be cached as
+# immutable: exactly the ones the manifest lists. build/assets also holds the
+# files copied unchanged from frontend/public/assets (placeholder.jpg, ...),
+# so the directory alone says nothing.
+#
+# In production the files only change with a deploy, which restarts the
+# workers. With reload=True (development) every access compares the files'
+# mtimes and reloads after a `vite build`.
+
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from flask import current_app, request
+from werkzeug.exceptions import NotFound
+
+import backend.compression as compression
+import backend.conditional as conditional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = os.path.join('.vite', 'manifest.json')
+SHELL = 'index.html'
+
+
+class BuildSnapshot:
+    """One load of the build directory."""
+
+    def __init__(self, manifest, shell, mtimes):
+        self.manifest = manifest
+        self.shell = shell
+        self.mtimes = mtimes
+        # Every output file the manifest names (entry chunks, their CSS, imported assets)
+        self.files = frozenset(
+            name
+            for item in manifest.values()
+            for name in [item.get('file'), *item.get('css', ()), *item.get('assets', ())]
+            if name
+        )
+        self.etag = hashlib.sha1(shell).hexdigest()[:24] if shell is not None else None
+        # Shell bodies by Content-Encoding ('' is identity); only encodings that make it smaller
+        self.bodies = {'': shell}
+        if shell is not None and len(shell) >= compression.MIN_BYTES:
+            for encoding in compression.ENCODINGS:
+                body = compression.compress(shell, encoding, level=11 if encoding == 'br' else 9)
+                if len(body) < len(shell):
+                    self.bodies[encoding] = body
+
+
+class AssetRegistry:
+    def __init__(self, build_dir, reload=False):
+        self.build_dir = build_dir
+        self.reload = reload
+        self._lock = threading.Lock()
+        self._snapshot = self._load()
+
+    def _mtimes(self):
+        mtimes = []
+        for name in (MANIFEST, SHELL):
+            try:
+                mtimes.append(os.path.getmtime(os.path.join(self.build_dir, name)))
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def _load(self):
+        mtimes = self._mtimes()
+        manifest = {}
+        try:
+            with open(os.path.join(self.build_dir, MANIFEST)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("No usable Vite manifest in %s: %s", self.build_dir, e)
+        shell = None
+        try:
+            with open(os.path.join(self.build_dir, SHELL), 'rb') as f:
+                shell = f.read()
+        except OSError as e:
+            logger.warning("No SPA shell in %s: %s", self.build_dir, e)
+        return BuildSnapshot(manifest, shell, mtimes)
+
+    def snapshot(self):
+        """The current build, reloaded first if reload is on and a file changed."""
+        snapshot = self._snapshot
+        if self.reload and self._mtimes() != snapshot.mtimes:
+            with self._lock:
+                if self._mtimes() != self._snapshot.mtimes:
+                    logger.info("Frontend build changed, reloading %s", self.build_dir)
+                    self._snapshot = self._load()
+                snapshot = self._snapshot
+        return snapshot
+
+    def asset_path(self, entry, default=None):
+        """The built file for a manifest entry (e.g. 'index.html' -> 'assets/index-BH_46Zkr.js')."""
+        item = self.snapshot().manifest.get(entry)
+        return item['file'] if item else default
+
+    def immutable(self, path):
+        """Whether a build-relative path is content-hashed output that never changes."""
+        path = path.replace(os.sep, '/').lstrip('/')
+        return path in self.snapshot().files
+
+    def shell_response(self):
+        """index.html from memory: ETag, 304 on a match, precompressed body when accepted."""
+        snapshot = self.snapshot()
+        if snapshot.shell is None:
+            raise NotFound()
+        encoding = compression.negotiate(request, tuple(e for e in snapshot.bodies if e)) or ''
+        etag = snapshot.etag + (f'-{encoding}' if encoding else '')
+        matched = conditional.matching_etag(snapshot.etag)
+        if matched is not None:
+            response = current_app.response_class(status=304)
+            etag = matched
+        else:
+            response = current_app.response_class(snapshot.bodies[encoding], mimetype='text/html')
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        # Revalidated on every navigation, so a deploy is picked up immediately
+        response.headers['Cache-Control'] = 'no-cache'
+        if len(snapshot.bodies) > 1:
+            response.vary.add('Accept-Encoding')
+        return response
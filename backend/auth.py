@@ -6,11 +6,14 @@ import urllib.request
 import urllib.parse
 import re
 import json
+import logging
 import flask
 import ssl
 import os
 from urllib.parse import urlparse
 
+logger = logging.getLogger(__name__)
+
 _CAS_URL = "https://fed.princeton.edu/cas/"
 
 def strip_ticket(url):
@@ -48,17 +51,17 @@ def validate(ticket):
         return user_info
 
     if "authenticationFailure" in service_response:
-        print("CAS authentication failure:", service_response)
+        logger.warning("CAS authentication failure: %s", service_response)
         return None
 
-    print("Unexpected CAS response:", service_response)
+    logger.warning("Unexpected CAS response: %s", service_response)
     return None
 
 def authenticate():
     # First check if user_info is already in session
     if "user_info" in flask.session:
         user_info = flask.session.get("user_info")
-        print(f"User already authenticated as: {user_info.get('user', 'unknown')}")
+        logger.debug("User already authenticated as: %s", user_info.get('user', 'unknown'))
         flask.session.permanent = True  # Make session persistent
         flask.session.modified = True   # Force the session to be saved
         return user_info["user"]
@@ -83,7 +86,7 @@ def authenticate():
         flask.abort(flask.redirect(login_url))
 
     # If we have a ticket, validate it
-    print(f"Validating CAS ticket: {ticket[:10]}...")
+    logger.debug("Validating CAS ticket: %s...", ticket[:10])
     user_info = validate(ticket)
     if user_info is None:
         backend_url = flask.request.url_root.rstrip('/')
@@ -113,7 +116,7 @@ def authenticate():
         flask.session["user_type"] = "lender"
 
     # Store authentication info in session
-    print(f"CAS authentication successful for user: {user_info.get('user', 'unknown')}")
+    logger.info("CAS authentication successful for user: %s", user_info.get('user', 'unknown'))
     flask.session["user_info"] = user_info
     flask.session.permanent = True  # Make session persistent
     flask.session.modified = True   # Force the session to be saved
@@ -121,7 +124,7 @@ def authenticate():
     # Store user type from query parameters if available
     user_type = flask.request.args.get("userType")
     if user_type:
-        print(f"Setting user_type in session: {user_type}")
+        logger.debug("Setting user_type in session: %s", user_type)
         flask.session["user_type"] = user_type
         flask.session.modified = True
     
@@ -0,0 +1,176 @@
+# Plan check for the hot per-user / per-listing queries.
+#
+# Seeds a scratch database at one scale (see fixture.seed; 100k listings by
+# default), runs EXPLAIN on each query below, which mirrors one in
+# backend/app.py, and fails if any of them reads a checked table with a
+# sequential scan. At that size a seq scan means a missing or unusable index
+# (see migrations/0002_hot_query_indexes.sql), not a planner preference.
+#
+#   python -m backend.benchmarks.explain_check --admin-url postgresql://postgres@localhost/postgres
+#   python -m backend.benchmarks.explain_check --ephemeral --scale 10k
+#   python -m backend.benchmarks.explain_check --database-url postgresql://...   # existing data, no seeding
+#
+# Exits 1 if any check fails.
+
+import argparse
+import json
+import sys
+
+import psycopg2
+
+from backend.benchmarks import fixture
+
+# name -> (handler, SQL, params from the seeded ids, tables that must not be seq scanned)
+CHECKS = [
+    ('my_listings', 'get_my_listings', """
+        SELECT listing_id, title, cost, sq_ft, description, created_at, owner_id, remaining_space
+        FROM storage_listings
+        WHERE LOWER(owner_id) = %(lender)s
+        ORDER BY created_at DESC
+    """, ('storage_listings',)),
+    ('my_reservation_requests', 'get_my_reservation_requests', """
+        SELECT r.request_id, r.listing_id, r.renter_username, r.requested_space, r.approved_space, r.status,
+               r.created_at, r.updated_at, l.title, l.address, l.hall_name, l.sq_ft, l.cost, l.owner_id,
+               l.start_date, l.end_date, l.image_url
+        FROM reservation_requests r
+        JOIN storage_listings l ON r.listing_id = l.listing_id
+        WHERE r.renter_username = %(renter)s
+        ORDER BY r.created_at DESC
+    """, ('reservation_requests', 'storage_listings')),
+    ('listing_reservation_requests', 'get_reservation_requests', """
+        SELECT request_id, renter_username, requested_space, approved_space, status, created_at, updated_at
+        FROM reservation_requests WHERE listing_id = %(listing)s ORDER BY created_at DESC
+    """, ('reservation_requests',)),
+    ('interested_renters', 'get_interested_renters', """
+        SELECT rr.request_id, rr.renter_username, rr.requested_space, rr.status, rr.created_at
+        FROM reservation_requests rr
+        WHERE rr.listing_id = %(listing)s
+        ORDER BY rr.created_at DESC
+    """, ('reservation_requests',)),
+    ('reserved_space', 'update_listing', """
+        SELECT COALESCE(SUM(requested_space), 0)
+        FROM reservation_requests
+        WHERE listing_id = %(listing)s AND status IN ('pending', 'approved_full', 'approved_partial')
+    """, ('reservation_requests',)),
+    ('review_exists', 'submit_lender_review', """
+        SELECT 1 FROM lender_reviews WHERE request_id = %(request)s
+    """, ('lender_reviews',)),
+    ('report_exists', 'report_listing', """
+        SELECT 1 FROM reported_listings WHERE listing_id = %(listing)s AND renter_id = %(renter)s
+    """, ('reported_listings',)),
+    ('lender_reviews_page', 'get_lender_reviews', """
+        SELECT lr.review_id, lr.rating, lr.review_text, lr.created_at, lr.renter_username,
+               sl.listing_id, sl.title
+        FROM lender_reviews lr
+        JOIN reservation_requests rr ON lr.request_id = rr.request_id
+        JOIN storage_listings sl ON rr.listing_id = sl.listing_id
+        WHERE LOWER(lr.lender_username) = LOWER(%(lender)s)
+        ORDER BY lr.created_at DESC, lr.review_id DESC
+        LIMIT 21
+    """, ('lender_reviews', 'reservation_requests', 'storage_listings')),
+    ('listing_changes_since', 'get_listing_changes', """
+        SELECT DISTINCT listing_id FROM listing_changes WHERE txid >= %(txid)s
+    """, ('listing_changes',)),
+]
+
+
+def seed_reports(conn):
+    """One report per 10 listings (fixture.seed leaves reported_listings empty)."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO reported_listings (listing_id, lender_id, renter_id, reason, created_at)
+            SELECT l.listing_id, l.owner_id, 'bench_renter_' || (l.listing_id % 97), 'Benchmark report',
+                   TIMESTAMP '2025-01-01' + l.listing_id * INTERVAL '1 minute'
+            FROM storage_listings l
+            WHERE l.listing_id % 10 = 0
+        """)
+        cur.execute("ANALYZE reported_listings")
+    conn.commit()
+
+
+def params_for(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT MAX(listing_id) / 2 FROM storage_listings")
+        listing = cur.fetchone()[0] or 1
+        cur.execute("SELECT MAX(request_id) / 2 FROM reservation_requests")
+        request = cur.fetchone()[0] or 1
+        cur.execute("SELECT txid_current()")
+        txid = cur.fetchone()[0]
+    conn.rollback()
+    return {'lender': fixture.HOT_LENDER, 'renter': fixture.HOT_RENTER, 'listing': listing, 'request': request,
+            'txid': txid}
+
+
+def walk(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from walk(child)
+
+
+def check(conn, params, analyze=False):
+    """[(name, handler, ok, seq scanned tables, indexes used, cost or time)] for every check."""
+    results = []
+    options = 'ANALYZE, BUFFERS, FORMAT JSON' if analyze else 'FORMAT JSON'
+    with conn.cursor() as cur:
+        for name, handler, sql, tables in CHECKS:
+            cur.execute(f"EXPLAIN ({options}) {sql}", params)
+            plan = cur.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            root = plan[0]['Plan']
+            nodes = list(walk(root))
+            seq_scans = sorted({n['Relation Name'] for n in nodes
+                                if n['Node Type'] == 'Seq Scan' and n.get('Relation Name') in tables})
+            indexes = sorted({n['Index Name'] for n in nodes if 'Index Name' in n})
+            measure = f"{plan[0]['Execution Time']:.2f} ms" if analyze else f"cost {root['Total Cost']:.0f}"
+            results.append((name, handler, not seq_scans, seq_scans, indexes, measure))
+    conn.rollback()
+    return results
+
+
+def report(results):
+    failed = 0
+    for name, handler, ok, seq_scans, indexes, measure in results:
+        status = 'ok' if ok else 'FAIL'
+        detail = ', '.join(indexes) or '-'
+        if not ok:
+            failed += 1
+            detail = f"seq scan on {', '.join(seq_scans)}; indexes: {detail}"
+        print(f"{status:4} {name:30} {handler:30} {measure:>12}  {detail}")
+    print(f"{len(results) - failed}/{len(results)} queries use indexes")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if a hot query plans a sequential scan at scale")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--admin-url', help="existing server; a scratch database is created on it and dropped afterwards")
+    target.add_argument('--ephemeral', action='store_true', help="initdb a temporary cluster (needs Postgres binaries)")
+    target.add_argument('--database-url', help="check an existing, already populated database (nothing is seeded)")
+    parser.add_argument('--scale', default='100k', choices=sorted(fixture.SCALES))
+    parser.add_argument('--analyze', action='store_true', help="EXPLAIN ANALYZE (runs the queries) to show timings")
+    parser.add_argument('--keep', action='store_true', help="keep the scratch database / cluster afterwards")
+    args = parser.parse_args()
+
+    if args.database_url:
+        conn = psycopg2.connect(args.database_url)
+        try:
+            return report(check(conn, params_for(conn), args.analyze))
+        finally:
+            conn.close()
+
+    with fixture.PostgresFixture(admin_url=args.admin_url, ephemeral=args.ephemeral, keep=args.keep) as url:
+        listings = fixture.SCALES[args.scale]
+        seed_info = fixture.seed(url, listings)
+        print(f"[{args.scale}] seeded {seed_info['listings']} listings, {seed_info['reservation_requests']} requests, "
+              f"{seed_info['lender_reviews']} reviews", file=sys.stderr)
+        conn = psycopg2.connect(url)
+        try:
+            seed_reports(conn)
+            return report(check(conn, params_for(conn), args.analyze))
+        finally:
+            conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+# Scratch Postgres for the benchmark suite, plus deterministic seed data.
+#
+# Either creates a throwaway database on an existing server (admin_url, e.g.
+# postgresql://postgres@localhost/postgres) or, with ephemeral=True, runs
+# initdb + pg_ctl on a temporary directory listening only on a Unix socket
+# (binaries from $PG_BIN or PATH; initdb refuses to run as root). In both
+# cases the migrations are applied and everything is removed on exit.
+#
+# seed() fills the database for one scale. The data is generated in SQL from
+# generate_series with fixed arithmetic (no randomness), so every run and
+# every commit benchmarks exactly the same rows.
+
+import getpass
+import os
+import shutil
+import subprocess
+import tempfile
+from urllib.parse import quote, urlparse, urlunparse
+
+import psycopg2
+
+import backend.migrate as migrate
+
+# Scale name -> listings; reservations and reviews are derived from it (see seed)
+SCALES = {'1k': 1000, '10k': 10000, '100k': 100000}
+
+LISTINGS_PER_LENDER = 20
+REQUESTS_PER_LISTING = 2
+REQUESTS_PER_RENTER = 20
+HOT_LENDER = 'bench_lender_0'
+HOT_RENTER = 'bench_renter_0'
+
+
+class FixtureError(Exception):
+    pass
+
+
+def _pg_bin(name):
+    directory = os.environ.get('PG_BIN')
+    path = os.path.join(directory, name) if directory else shutil.which(name)
+    if not path or not os.path.exists(path):
+        raise FixtureError(f"{name} not found; put the Postgres binaries on PATH or set PG_BIN")
+    return path
+
+
+def _with_dbname(url, dbname):
+    parsed = urlparse(url)
+    return urlunparse(parsed._replace(path='/' + dbname))
+
+
+class PostgresFixture:
+    """`with PostgresFixture(...) as url:` yields the URL of an empty database with the schema loaded."""
+
+    def __init__(self, admin_url=None, ephemeral=False, dbname='tigerstorage_bench', keep=False):
+        if not admin_url and not ephemeral:
+            raise FixtureError("give an admin database URL or use an ephemeral cluster")
+        self.admin_url = admin_url
+        self.ephemeral = ephemeral
+        self.dbname = dbname
+        self.keep = keep
+        self.url = None
+        self._cluster_dir = None
+
+    def __enter__(self):
+        try:
+            if self.ephemeral:
+                self._start_cluster()
+            self.url = _with_dbname(self.admin_url, self.dbname)
+            self._create_database()
+        except BaseException:
+            self._stop_cluster()
+            raise
+        return self.url
+
+    def __exit__(self, *exc):
+        try:
+            if not self.keep and not self.ephemeral:
+                self._drop_database()
+        finally:
+            self._stop_cluster()
+        return False
+
+    def _start_cluster(self):
+        if hasattr(os, 'geteuid') and os.geteuid() == 0:
+            raise FixtureError("initdb cannot run as root; use --admin-url or run as an unprivileged user")
+        self._cluster_dir = tempfile.mkdtemp(prefix='tigerstorage-pg-')
+        data = os.path.join(self._cluster_dir, 'data')
+        user = getpass.getuser()
+        subprocess.run([_pg_bin('initdb'), '-D', data, '-U', user, '--auth=trust', '-E', 'UTF8', '--no-sync'],
+                       check=True, stdout=subprocess.DEVNULL)
+        # Unix socket only; durability is irrelevant for a throwaway cluster
+        options = f"-k {self._cluster_dir} -c listen_addresses='' -c fsync=off -c synchronous_commit=off"
+        subprocess.run([_pg_bin('pg_ctl'), '-D', data, '-l', os.path.join(self._cluster_dir, 'postgres.log'),
+                        '-o', options, '-w', 'start'], check=True, stdout=subprocess.DEVNULL)
+        self.admin_url = f"postgresql://{quote(user)}@/postgres?host={quote(self._cluster_dir)}"
+
+    def _stop_cluster(self):
+        if self._cluster_dir is None:
+            return
+        subprocess.run([_pg_bin('pg_ctl'), '-D', os.path.join(self._cluster_dir, 'data'), '-m', 'immediate', '-w', 'stop'],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if not self.keep:
+            shutil.rmtree(self._cluster_dir, ignore_errors=True)
+        self._cluster_dir = None
+
+    def _admin(self, sql):
+        conn = psycopg2.connect(self.admin_url)
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute(sql)
+        finally:
+            conn.close()
+
+    def _create_database(self):
+        self._admin(f'DROP DATABASE IF EXISTS "{self.dbname}" WITH (FORCE)')
+        self._admin(f'CREATE DATABASE "{self.dbname}"')
+        migrate.migrate_url(self.url)
+
+    def _drop_database(self):
+        self._admin(f'DROP DATABASE IF EXISTS "{self.dbname}" WITH (FORCE)')
+
+
+def seed(url, listings):
+    """Replace all data with `listings` listings and the reservations and reviews that go with them.
+
+    - one lender per LISTINGS_PER_LENDER listings (bench_lender_<n>)
+    - REQUESTS_PER_LISTING reservation requests per listing, from renters holding
+      REQUESTS_PER_RENTER requests each (bench_renter_<n>); a mix of statuses
+    - one review for every approved request
+    HOT_LENDER and HOT_RENTER have the same amount of data as everyone else.
+    """
+    lenders = max(listings // LISTINGS_PER_LENDER, 1)
+    requests = listings * REQUESTS_PER_LISTING
+    renters = max(requests // REQUESTS_PER_RENTER, 1)
+    conn = psycopg2.connect(url)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                TRUNCATE storage_listings, reservation_requests, lender_reviews, reported_listings,
+                         lender_rating_stats, listing_changes RESTART IDENTITY CASCADE
+            """)
+            # Skip the per-row NOTIFYs, as bulk imports do
+            cur.execute("SET LOCAL tigerstorage.bulk_import = 'on'")
+            cur.execute("""
+                INSERT INTO storage_listings (title, address, cost, sq_ft, remaining_space, is_available, description,
+                                              latitude, longitude, start_date, end_date, owner_id, hall_name, created_at)
+                SELECT 'Benchmark storage ' || n, n || ' Prospect Ave', 20 + n %% 180, 50 + n %% 250, 50 + n %% 250,
+                       n %% 10 <> 0, 'Benchmark listing ' || n,
+                       40.3437 + ((n::bigint * 7919) %% 4000 - 2000) / 100000.0, -74.6517 + ((n::bigint * 104729) %% 4000 - 2000) / 100000.0,
+                       CURRENT_DATE + n %% 30, CURRENT_DATE + 30 + n %% 120,
+                       'bench_lender_' || (n %% %(lenders)s),
+                       (ARRAY['Butler', 'Forbes', 'Mathey', 'Rockefeller', 'Whitman', 'Wilson', 'Yeh'])[1 + n %% 7],
+                       TIMESTAMP '2025-01-01' + n * INTERVAL '1 minute'
+                FROM generate_series(1, %(listings)s) AS n
+            """, {'listings': listings, 'lenders': lenders})
+            # Statuses cycle pending, approved_full, approved_partial, rejected
+            cur.execute("""
+                INSERT INTO reservation_requests (listing_id, renter_username, requested_space, approved_space, status, created_at)
+                SELECT l.listing_id, 'bench_renter_' || (n %% %(renters)s), 5,
+                       CASE WHEN n %% 4 IN (1, 2) THEN 5 END,
+                       (ARRAY['pending', 'approved_full', 'approved_partial', 'rejected'])[1 + n %% 4],
+                       TIMESTAMP '2025-01-01' + n * INTERVAL '1 minute'
+                FROM generate_series(0, %(requests)s - 1) AS n
+                JOIN storage_listings l ON l.listing_id = 1 + (n / %(per_listing)s) %% %(listings)s
+            """, {'renters': renters, 'requests': requests, 'listings': listings, 'per_listing': REQUESTS_PER_LISTING})
+            cur.execute("""
+                INSERT INTO lender_reviews (lender_username, renter_username, request_id, rating, review_text, created_at)
+                SELECT l.owner_id, r.renter_username, r.request_id, 1 + r.request_id * 7 % 5, 'Benchmark review', r.created_at
+                FROM reservation_requests r
+                JOIN storage_listings l ON l.listing_id = r.listing_id
+                WHERE r.status IN ('approved_full', 'approved_partial')
+            """)
+        conn.commit()
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("VACUUM ANALYZE")
+            cur.execute("SELECT (SELECT COUNT(*) FROM storage_listings), (SELECT COUNT(*) FROM reservation_requests), "
+                        "(SELECT COUNT(*) FROM lender_reviews)")
+            counts = cur.fetchone()
+    finally:
+        conn.close()
+    return {'listings': counts[0], 'reservation_requests': counts[1], 'lender_reviews': counts[2],
+            'lenders': lenders, 'renters': renters}
@@ -0,0 +1,148 @@
+# Feed latency with lender ratings aggregated per request vs joined from lender_rating_stats.
+#
+# Seeds --lenders lenders with --listings listings and --reviews reviews between
+# them (10k+ by default), then times the two ways the feed gets lender_avg_rating:
+#
+#   before: SELECT listings, then AVG(rating) ... GROUP BY LOWER(lender_username)
+#           over lender_reviews for the lenders on the page
+#   after:  SELECT listings LEFT JOIN lender_rating_stats
+#
+# and, for the full picture, the real GET /api/listings handler (feed cache off).
+# It also checks both ways produce the same ratings.
+#
+# Usage (from the repo root, against a scratch database migrated with python -m backend.migrate):
+#   DATABASE_URL=postgresql://... python -m backend.benchmarks.lender_ratings --reviews 20000
+
+import argparse
+import json
+import os
+import statistics
+import time
+
+import psycopg2
+
+PREFIX = 'bench_rating_'
+LISTING_COLUMNS = "listing_id, title, cost, sq_ft, description, created_at, owner_id, remaining_space, is_available"
+
+BEFORE_LISTINGS = f"SELECT {LISTING_COLUMNS} FROM storage_listings ORDER BY created_at DESC"
+BEFORE_RATINGS = """
+    SELECT LOWER(lender_username), AVG(rating)::float AS avg_rating
+    FROM lender_reviews
+    WHERE LOWER(lender_username) = ANY(%s)
+    GROUP BY LOWER(lender_username)
+"""
+AFTER = f"""
+    SELECT {LISTING_COLUMNS}, lender_rating_stats.avg_rating AS lender_avg_rating
+    FROM storage_listings
+    LEFT JOIN lender_rating_stats ON lender_rating_stats.lender_username = LOWER(storage_listings.owner_id)
+    ORDER BY created_at DESC
+"""
+
+
+def seed(conn, lenders, listings, reviews):
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO storage_listings (title, cost, sq_ft, remaining_space, owner_id)
+            SELECT 'Rating benchmark ' || n, 50, 100, 100, %s || (n %% %s)
+            FROM generate_series(1, %s) AS n
+        """, (PREFIX, lenders, listings))
+        # Mixed-case usernames on purpose: the old query has to LOWER() every row
+        cur.execute("""
+            INSERT INTO lender_reviews (lender_username, renter_username, rating, review_text)
+            SELECT CASE WHEN n %% 2 = 0 THEN upper(%s) ELSE %s END || (n %% %s),
+                   'bench_renter_' || n, 1 + (n * 7919 %% 5), 'Benchmark review'
+            FROM generate_series(1, %s) AS n
+        """, (PREFIX, PREFIX, lenders, reviews))
+    conn.commit()
+
+
+def cleanup(conn):
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM lender_reviews WHERE renter_username LIKE 'bench_renter_%%'")
+        cur.execute("DELETE FROM storage_listings WHERE owner_id LIKE %s", (PREFIX + '%',))
+        cur.execute("DELETE FROM lender_rating_stats WHERE lender_username LIKE %s AND review_count = 0",
+                    (PREFIX + '%',))
+    conn.commit()
+
+
+def before(cur):
+    cur.execute(BEFORE_LISTINGS)
+    rows = cur.fetchall()
+    owners = list({row[6].lower() for row in rows if row[6]})
+    cur.execute(BEFORE_RATINGS, (owners,))
+    ratings = dict(cur.fetchall())
+    return {row[0]: ratings.get(row[6].lower()) for row in rows}
+
+
+def after(cur):
+    cur.execute(AFTER)
+    return {row[0]: row[-1] for row in cur.fetchall()}
+
+
+def timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'mean_ms': round(statistics.mean(samples), 2),
+        'p50_ms': round(samples[len(samples) // 2], 2),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare feed latency with and without lender_rating_stats")
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'))
+    parser.add_argument('--lenders', type=int, default=500)
+    parser.add_argument('--listings', type=int, default=2000)
+    parser.add_argument('--reviews', type=int, default=10000)
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--skip-handler', action='store_true', help="only time the SQL")
+    parser.add_argument('--keep', action='store_true', help="keep the seeded rows afterwards")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("set DATABASE_URL or pass --database-url")
+
+    conn = psycopg2.connect(args.database_url)
+    seed(conn, args.lenders, args.listings, args.reviews)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE storage_listings; ANALYZE lender_reviews; ANALYZE lender_rating_stats;")
+            conn.commit()
+            old, new = before(cur), after(cur)
+            mismatched = [listing_id for listing_id in old
+                          if (old[listing_id] is None) != (new.get(listing_id) is None)
+                          or (old[listing_id] is not None and abs(old[listing_id] - new[listing_id]) > 1e-9)]
+            result = {
+                'lenders': args.lenders,
+                'listings': args.listings,
+                'reviews': args.reviews,
+                'ratings_match': not mismatched,
+                'sql_before': timed(lambda: before(cur), args.iterations),
+                'sql_after': timed(lambda: after(cur), args.iterations),
+            }
+            conn.rollback()
+
+        if not args.skip_handler:
+            os.environ['DATABASE_URL'] = args.database_url
+            os.environ['LISTING_FEED_CACHE'] = 'none'
+            # The handler logs every row at DEBUG; keep that out of the output
+            os.environ.setdefault('LOG_LEVEL', 'WARNING')
+            from backend.app import app
+            client = app.test_client()
+            result['handler_after'] = timed(lambda: client.get('/api/listings'), max(args.iterations // 3, 3))
+    finally:
+        if not args.keep:
+            cleanup(conn)
+        conn.close()
+
+    speedup = result['sql_before']['p50_ms'] / max(result['sql_after']['p50_ms'], 0.001)
+    result['sql_speedup_p50'] = round(speedup, 2)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+# Concurrency benchmark for reservation approval.
+#
+# Creates one listing with --space square feet and --requests pending requests
+# for it (together asking for more than the listing has), then approves them all
+# at once from --threads threads through the real PATCH
+# /api/reservation-requests/<id> handler. Afterwards it checks the books:
+# approved space never exceeds the listing, remaining_space matches, and no
+# renter holds two pending requests after a burst of duplicate reserves.
+#
+# --mode naive runs the old read-modify-write approval (no locking) instead, to
+# show the overselling this guards against.
+#
+# Usage (from the repo root, against a scratch database migrated with python -m backend.migrate):
+#   DATABASE_URL=postgresql://... python -m backend.benchmarks.reservation_contention --threads 32
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+
+LENDER = 'bench_lender'
+
+
+def setup(dsn, space, requests, requested_space):
+    conn = psycopg2.connect(dsn)
+    with conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO storage_listings (title, cost, sq_ft, remaining_space, is_available, owner_id)
+            VALUES ('Contention benchmark', 0, %s, %s, TRUE, %s) RETURNING listing_id
+        """, (space, space, LENDER))
+        listing_id = cur.fetchone()[0]
+        cur.execute("""
+            INSERT INTO reservation_requests (listing_id, renter_username, requested_space, status)
+            SELECT %s, 'bench_renter_' || n, %s, 'pending' FROM generate_series(1, %s) AS n
+            RETURNING request_id
+        """, (listing_id, requested_space, requests))
+        request_ids = [row[0] for row in cur.fetchall()]
+    conn.close()
+    return listing_id, request_ids
+
+
+def approve_api(client):
+    def approve(request_id):
+        response = client.patch(f'/api/reservation-requests/{request_id}',
+                                json={'status': 'approved_full'}, headers={'X-Username': LENDER})
+        return response.status_code == 200
+    return approve
+
+
+def approve_naive(dsn):
+    """The pre-fix logic: read remaining_space, subtract in Python, write it back."""
+    local = threading.local()
+
+    def approve(request_id):
+        if not hasattr(local, 'conn'):
+            local.conn = psycopg2.connect(dsn)
+        conn = local.conn
+        with conn.cursor() as cur:
+            cur.execute("SELECT listing_id, requested_space, status FROM reservation_requests WHERE request_id = %s", (request_id,))
+            listing_id, requested_space, status = cur.fetchone()
+            if status != 'pending':
+                conn.rollback()
+                return False
+            cur.execute("SELECT remaining_space FROM storage_listings WHERE listing_id = %s", (listing_id,))
+            remaining_space = cur.fetchone()[0]
+            if remaining_space < requested_space:
+                conn.rollback()
+                return False
+            cur.execute("UPDATE reservation_requests SET status = 'approved_full', approved_space = %s WHERE request_id = %s",
+                        (requested_space, request_id))
+            # Clamped so the CHECK constraint does not hide the lost updates
+            cur.execute("UPDATE storage_listings SET remaining_space = %s WHERE listing_id = %s",
+                        (max(remaining_space - requested_space, 0), listing_id))
+        conn.commit()
+        return True
+    return approve
+
+
+def run(approve, request_ids, threads):
+    latencies = []
+    lock = threading.Lock()
+
+    def timed(request_id):
+        start = time.perf_counter()
+        try:
+            ok = approve(request_id)
+        except Exception as e:
+            print(f"approval {request_id} failed: {e}", file=sys.stderr)
+            ok = None
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+        return ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(timed, request_ids))
+    return results, latencies, time.perf_counter() - start
+
+
+def duplicate_reserves(client, listing_id, renters, attempts):
+    """Fire `attempts` concurrent reserves per renter; at most one may stay pending."""
+    def reserve(renter):
+        return client.post(f'/api/listings/{listing_id}/reserve', json={'requested_space': 1},
+                           headers={'X-Username': renter}).status_code
+    names = [f'bench_dup_{n}' for n in range(renters) for _ in range(attempts)]
+    with ThreadPoolExecutor(max_workers=min(len(names), 32)) as pool:
+        return list(pool.map(reserve, names))
+
+
+def check(dsn, listing_id, space):
+    conn = psycopg2.connect(dsn)
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT remaining_space FROM storage_listings WHERE listing_id = %s", (listing_id,))
+        remaining = cur.fetchone()[0]
+        cur.execute("""
+            SELECT COALESCE(SUM(approved_space), 0), COUNT(*)
+            FROM reservation_requests
+            WHERE listing_id = %s AND status IN ('approved_full', 'approved_partial')
+        """, (listing_id,))
+        approved_space, approved_count = cur.fetchone()
+        cur.execute("""
+            SELECT COUNT(*) FROM (
+                SELECT renter_username FROM reservation_requests
+                WHERE listing_id = %s AND status = 'pending'
+                GROUP BY renter_username HAVING COUNT(*) > 1
+            ) dup
+        """, (listing_id,))
+        duplicate_pending = cur.fetchone()[0]
+    conn.close()
+    return {
+        'remaining_space': remaining,
+        'approved_space': int(approved_space),
+        'approved_requests': approved_count,
+        'oversold_by': max(int(approved_space) - space, 0),
+        'books_balance': remaining == space - approved_space,
+        'renters_with_duplicate_pending': duplicate_pending,
+    }
+
+
+def cleanup(dsn, listing_id):
+    conn = psycopg2.connect(dsn)
+    with conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM storage_listings WHERE listing_id = %s", (listing_id,))
+    conn.close()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hammer one listing with concurrent reservation approvals")
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'))
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=400, help="pending requests to approve")
+    parser.add_argument('--space', type=int, default=1000, help="listing size in sq ft")
+    parser.add_argument('--requested-space', type=int, default=5, help="sq ft per request")
+    parser.add_argument('--mode', choices=['api', 'naive'], default='api')
+    parser.add_argument('--duplicate-renters', type=int, default=20,
+                        help="renters firing concurrent duplicate reserves (api mode)")
+    parser.add_argument('--keep', action='store_true', help="keep the benchmark listing afterwards")
+    parser.add_argument('--json', action='store_true', help="print the result as JSON")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("set DATABASE_URL or pass --database-url")
+
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('DB_POOL_MAX', str(args.threads))
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    from backend.app import app
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = app.test_client()
+
+    listing_id, request_ids = setup(args.database_url, args.space, args.requests, args.requested_space)
+    try:
+        approve = approve_api(client) if args.mode == 'api' else approve_naive(args.database_url)
+        results, latencies, elapsed = run(approve, request_ids, args.threads)
+        books = check(args.database_url, listing_id, args.space)
+        if args.mode == 'api' and args.duplicate_renters:
+            # Space back so reserves are limited only by the pending-request constraint
+            conn = psycopg2.connect(args.database_url)
+            with conn, conn.cursor() as cur:
+                cur.execute("UPDATE storage_listings SET remaining_space = %s, is_available = TRUE WHERE listing_id = %s",
+                            (args.space, listing_id))
+                cur.execute("DELETE FROM reservation_requests WHERE listing_id = %s", (listing_id,))
+            conn.close()
+            statuses = duplicate_reserves(client, listing_id, args.duplicate_renters, 4)
+            books['renters_with_duplicate_pending'] = check(
+                args.database_url, listing_id, args.space)['renters_with_duplicate_pending']
+            books['duplicate_reserves_accepted'] = statuses.count(201)
+    finally:
+        if not args.keep:
+            cleanup(args.database_url, listing_id)
+
+    result = {
+        'mode': args.mode,
+        'threads': args.threads,
+        'requests': len(request_ids),
+        'space': args.space,
+        'requested_space': args.requested_space,
+        'approved': results.count(True),
+        'refused': results.count(False),
+        'errors': results.count(None),
+        'elapsed_seconds': round(elapsed, 3),
+        'approvals_per_second': round(len(request_ids) / elapsed, 1),
+        'latency_ms': {
+            'mean': round(statistics.mean(latencies) * 1000, 2),
+            'p50': round(percentile(latencies, 50) * 1000, 2),
+            'p95': round(percentile(latencies, 95) * 1000, 2),
+            'p99': round(percentile(latencies, 99) * 1000, 2),
+        },
+        **books,
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        for key, value in result.items():
+            print(f"{key:32} {value}")
+    ok = result['oversold_by'] == 0 and result['errors'] == 0 and result['renters_with_duplicate_pending'] == 0
+    if args.mode == 'api':
+        ok = ok and result['books_balance'] and result.get('duplicate_reserves_accepted', 0) <= args.duplicate_renters
+    print("PASS: no overselling" if ok else "FAIL: books do not balance", file=sys.stderr)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# Per-row cost of turning feed rows into the JSON response body.
+#
+#   before: the per-row formatting format_feed_listings used to do (a dict by
+#           column name, then a second dict of .get() calls, hasattr checks and
+#           float() conversions) encoded with the json module, as jsonify does
+#   after:  serializer.listing_serializer (compiled per column list) encoded
+#           with serializer.dumps (orjson when installed), and with the json
+#           module for comparison
+#
+# Rows are generated in memory with the types psycopg2 returns (Decimal cost,
+# date / datetime columns), 10k by default, so only serialization is timed.
+# The script also checks every variant produces the same JSON document.
+#
+#   python -m backend.benchmarks.serialization --rows 10000
+
+import argparse
+import json
+import statistics
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from backend import serializer
+
+# The columns build_listing_feed selects (FEED_LISTING_COLUMNS plus the rating join)
+COLUMNS = ['listing_id', 'title', 'cost', 'sq_ft', 'description', 'created_at', 'owner_id', 'remaining_space',
+           'is_available', 'latitude', 'longitude', 'start_date', 'end_date', 'image_url', 'address', 'hall_name',
+           'lender_avg_rating']
+
+
+def make_rows(count):
+    rows = []
+    for n in range(1, count + 1):
+        rows.append((
+            n, f'Benchmark storage {n}', Decimal(20 + n % 180), 50 + n % 250, f'Benchmark listing {n}',
+            datetime(2025, 1, 1) + timedelta(minutes=n), f'bench_lender_{n % 500}', (50 + n % 250) * (n % 7 != 0),
+            n % 10 != 0,
+            # Some listings have no coordinates and get the default location
+            None if n % 50 == 0 else 40.3437 + (n * 7919 % 4000 - 2000) / 100000.0,
+            -74.6517 + (n * 104729 % 4000 - 2000) / 100000.0,
+            date(2026, 1, 1) + timedelta(days=n % 30), date(2026, 2, 1) + timedelta(days=n % 120),
+            None, f'{n} Prospect Ave', 'Butler', 1 + n % 5 if n % 3 else None,
+        ))
+    return rows
+
+
+def legacy_format(listings, column_names):
+    """format_feed_listings before the compiled serializer (joined ratings path)."""
+    formatted_listings = []
+    for listing in listings:
+        listing_dict = {}
+        for i, col_name in enumerate(column_names):
+            listing_dict[col_name] = listing[i]
+        if not listing_dict.get('latitude') or not listing_dict.get('longitude'):
+            # Was random.Random(listing_id); the placement itself has since changed
+            listing_dict['latitude'], listing_dict['longitude'] = serializer.default_location(listing_dict.get('listing_id'))
+        formatted_listing = {
+            "id": listing_dict.get('listing_id'),
+            "title": listing_dict.get('title', ''),
+            "address": listing_dict.get('address', ''),
+            "cost": float(listing_dict.get('cost', 0)) if listing_dict.get('cost') is not None else 0,
+            "sq_ft": listing_dict.get('sq_ft', 0),
+            "description": listing_dict.get('description', ''),
+            "latitude": float(listing_dict.get('latitude', 0)) if listing_dict.get('latitude') is not None else None,
+            "longitude": float(listing_dict.get('longitude', 0)) if listing_dict.get('longitude') is not None else None,
+            "start_date": listing_dict.get('start_date').isoformat() if hasattr(listing_dict.get('start_date'), 'isoformat') else (listing_dict.get('start_date') if listing_dict.get('start_date') else None),
+            "end_date": listing_dict.get('end_date').isoformat() if hasattr(listing_dict.get('end_date'), 'isoformat') else (listing_dict.get('end_date') if listing_dict.get('end_date') else None),
+            "image_url": listing_dict.get('image_url', '/assets/placeholder.jpg'),
+            "created_at": listing_dict.get('created_at').isoformat() if hasattr(listing_dict.get('created_at'), 'isoformat') else (listing_dict.get('created_at') if listing_dict.get('created_at') else None),
+            "owner_id": listing_dict.get('owner_id', ''),
+            "remaining_space": listing_dict.get('remaining_space', 0),
+            "is_available": bool(listing_dict.get('is_available', True)) if float(listing_dict.get('remaining_space', 0)) > 0 else False,
+            "hall_name": listing_dict.get('hall_name', ''),
+            "lender_avg_rating": listing_dict.get('lender_avg_rating'),
+        }
+        formatted_listings.append(formatted_listing)
+    return formatted_listings
+
+
+def stdlib_dumps(data):
+    return json.dumps(data, sort_keys=True, separators=(',', ':')).encode()
+
+
+def timed(fn, iterations, rows):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    p50 = statistics.median(samples)
+    return {'p50_ms': round(p50 * 1000, 2), 'per_row_us': round(p50 / rows * 1e6, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare legacy and compiled listing serialization")
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    compiled = serializer.listing_serializer('feed', COLUMNS)
+
+    variants = {
+        'before': lambda: stdlib_dumps(legacy_format(rows, COLUMNS)),
+        'after_json_module': lambda: stdlib_dumps(compiled.rows(rows)),
+        'after': lambda: serializer.dumps(compiled.rows(rows)),
+    }
+    documents = {name: json.loads(fn()) for name, fn in variants.items()}
+    identical = all(document == documents['before'] for document in documents.values())
+
+    result = {'rows': args.rows, 'orjson': serializer.orjson is not None, 'identical_output': identical}
+    result['format_only'] = {
+        'before': timed(lambda: legacy_format(rows, COLUMNS), args.iterations, args.rows),
+        'after': timed(lambda: compiled.rows(rows), args.iterations, args.rows),
+    }
+    result['format_and_encode'] = {name: timed(fn, args.iterations, args.rows) for name, fn in variants.items()}
+    total = result['format_and_encode']
+    result['speedup_p50'] = round(total['before']['p50_ms'] / max(total['after']['p50_ms'], 0.001), 2)
+    print(json.dumps(result, indent=2))
+    return 0 if identical else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
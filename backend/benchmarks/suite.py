@@ -0,0 +1,335 @@
+# Benchmark suite for the hot API paths, at several data scales.
+#
+# For each scale (1k/10k/100k listings plus their reservations and reviews, see
+# fixture.seed) it times:
+#
+#   macro  the real handlers through the Flask test client:
+#          get_listings (full feed and one page), get_my_listings,
+#          get_my_reservation_requests, reserve_space, update_reservation_request
+#   micro  the pieces of the feed: its SQL, format_feed_listings, the ETag lookup
+#
+# against a scratch database (an ephemeral initdb cluster, or a throwaway
+# database on a server you point it at). Caches are off so every request does
+# the full work. Results are written as JSON, tagged with the git commit, so two
+# runs can be compared:
+#
+#   python -m backend.benchmarks.suite run --admin-url postgresql://postgres@localhost/postgres
+#   python -m backend.benchmarks.suite run --ephemeral --scales 1k,10k
+#   python -m backend.benchmarks.suite compare results/old.json results/new.json
+#
+# --feed-json-mode picks who builds the feed and my-reservation-requests JSON
+# (FEED_JSON_MODE in app.py); run once per mode and compare the two files.
+#
+# run exits non-zero if any request returned an unexpected status; compare
+# exits non-zero if any p50 got slower than --threshold.
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import psycopg2
+
+from backend.benchmarks import fixture
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_LISTING_SPACE = 10 ** 7
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000, 3)
+
+    return {
+        'n': len(ordered),
+        'mean_ms': round(statistics.mean(ordered) * 1000, 3),
+        'min_ms': round(ordered[0] * 1000, 3),
+        'p50_ms': pct(50),
+        'p95_ms': pct(95),
+        'p99_ms': pct(99),
+    }
+
+
+def measure(fn, iterations, warmup, max_seconds):
+    """Time fn() `iterations` times after `warmup` untimed calls, stopping early (after 5) past max_seconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    deadline = time.perf_counter() + max_seconds
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+        if len(samples) >= 5 and time.perf_counter() > deadline:
+            break
+    return summarize(samples)
+
+
+class Bench:
+    """The benchmarks for one seeded scale. Each returns a zero-argument callable."""
+
+    def __init__(self, app_module, url, seed_info):
+        self.app_module = app_module
+        app_module.app.config['WTF_CSRF_ENABLED'] = False
+        self.client = app_module.app.test_client()
+        self.url = url
+        self.seed_info = seed_info
+        self.unexpected = {}
+        self._counter = 0
+        self._pending = []
+        self.listing_id = self._prepare()
+
+    def _prepare(self):
+        """A listing owned by the hot lender with room for every reserve and approval"""
+        conn = psycopg2.connect(self.url)
+        with conn, conn.cursor() as cur:
+            cur.execute("""
+                UPDATE storage_listings SET remaining_space = %s, sq_ft = %s, is_available = TRUE
+                WHERE listing_id = (SELECT MIN(listing_id) FROM storage_listings WHERE owner_id = %s)
+                RETURNING listing_id
+            """, (BENCH_LISTING_SPACE, BENCH_LISTING_SPACE, fixture.HOT_LENDER))
+            listing_id = cur.fetchone()[0]
+        conn.close()
+        return listing_id
+
+    def _check(self, name, response, expected):
+        if response.status_code != expected:
+            self.unexpected[name] = self.unexpected.get(name, 0) + 1
+
+    def _get(self, name, path, username=None):
+        headers = {'X-Username': username} if username else {}
+
+        def call():
+            self._check(name, self.client.get(path, headers=headers), 200)
+        return call
+
+    def get_listings(self):
+        return self._get('get_listings', '/api/listings')
+
+    def get_listings_page(self):
+        return self._get('get_listings_page', '/api/listings?limit=50')
+
+    def get_my_listings(self):
+        return self._get('get_my_listings', '/api/my-listings', fixture.HOT_LENDER)
+
+    def get_my_reservation_requests(self):
+        return self._get('get_my_reservation_requests', '/api/my-reservation-requests', fixture.HOT_RENTER)
+
+    def reserve_space(self):
+        def call():
+            self._counter += 1
+            response = self.client.post(f'/api/listings/{self.listing_id}/reserve', json={'requested_space': 1},
+                                        headers={'X-Username': f'bench_reserver_{self._counter}'})
+            self._check('reserve_space', response, 201)
+        return call
+
+    def update_reservation_request(self):
+        def call():
+            if not self._pending:
+                self._pending = self._create_pending(200)
+            response = self.client.patch(f'/api/reservation-requests/{self._pending.pop()}',
+                                         json={'status': 'approved_full'}, headers={'X-Username': fixture.HOT_LENDER})
+            self._check('update_reservation_request', response, 200)
+        return call
+
+    def _create_pending(self, count):
+        # Created outside the timed calls, in batches
+        conn = psycopg2.connect(self.url)
+        with conn, conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO reservation_requests (listing_id, renter_username, requested_space, status)
+                SELECT %s, 'bench_approval_' || %s || '_' || n, 1, 'pending' FROM generate_series(1, %s) AS n
+                RETURNING request_id
+            """, (self.listing_id, time.monotonic_ns(), count))
+            ids = [row[0] for row in cur.fetchall()]
+        conn.close()
+        return ids
+
+    def _feed_sql(self, conn):
+        app = self.app_module
+        select_columns = app.schema.select_list(conn, 'storage_listings', app.FEED_LISTING_COLUMNS)
+        rating_column, rating_join = app.lender_ratings.rating_join(conn)
+        return f"SELECT {select_columns}{rating_column} FROM storage_listings {rating_join} ORDER BY created_at DESC"
+
+    def sql_feed(self):
+        def call():
+            with self.app_module.db.connection() as conn, conn.cursor() as cur:
+                cur.execute(self._feed_sql(conn))
+                cur.fetchall()
+        return call
+
+    def format_feed(self):
+        with self.app_module.db.connection() as conn, conn.cursor() as cur:
+            cur.execute(self._feed_sql(conn))
+            rows = cur.fetchall()
+            columns = [desc[0] for desc in cur.description]
+
+        def call():
+            with self.app_module.db.connection() as conn, conn.cursor() as cur:
+                self.app_module.format_feed_listings(cur, rows, columns)
+        return call
+
+    def feed_etag(self):
+        def call():
+            with self.app_module.db.connection() as conn:
+                self.app_module.conditional.etag_for(conn, self.app_module.FEED_VERSION_TABLES, 'listings', '')
+        return call
+
+
+BENCHMARKS = [
+    ('get_listings', 'macro'),
+    ('get_listings_page', 'macro'),
+    ('get_my_listings', 'macro'),
+    ('get_my_reservation_requests', 'macro'),
+    ('reserve_space', 'macro'),
+    ('update_reservation_request', 'macro'),
+    ('sql_feed', 'micro'),
+    ('format_feed', 'micro'),
+    ('feed_etag', 'micro'),
+]
+
+
+def git_info():
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {'commit': git('rev-parse', 'HEAD'), 'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+
+
+def run(args):
+    scales = [scale.strip() for scale in args.scales.split(',') if scale.strip()]
+    unknown = [scale for scale in scales if scale not in fixture.SCALES]
+    if unknown:
+        raise SystemExit(f"unknown scale(s) {', '.join(unknown)}; choose from {', '.join(fixture.SCALES)}")
+    names = [name for name, _ in BENCHMARKS if not args.only or name in args.only.split(',')]
+
+    results = {
+        'meta': {
+            'git': git_info(),
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+            'feed_json_mode': args.feed_json_mode,
+        },
+        'scales': {},
+    }
+    unexpected_total = 0
+    with fixture.PostgresFixture(admin_url=args.admin_url, ephemeral=args.ephemeral, keep=args.keep) as url:
+        os.environ['DATABASE_URL'] = url
+        os.environ['LISTING_FEED_CACHE'] = 'none'
+        os.environ['LENDER_REVIEW_CACHE'] = 'none'
+        os.environ['FEED_JSON_MODE'] = args.feed_json_mode
+        # The handlers log every request at DEBUG/INFO; keep that out of the timings and the output
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        import backend.app as app_module
+        conn = psycopg2.connect(url)
+        with conn.cursor() as cur:
+            cur.execute("SHOW server_version")
+            results['meta']['postgres'] = cur.fetchone()[0]
+        conn.close()
+
+        for scale in scales:
+            start = time.perf_counter()
+            seed_info = fixture.seed(url, fixture.SCALES[scale])
+            seed_info['seed_seconds'] = round(time.perf_counter() - start, 2)
+            print(f"[{scale}] seeded {seed_info['listings']} listings, {seed_info['reservation_requests']} requests, "
+                  f"{seed_info['lender_reviews']} reviews in {seed_info['seed_seconds']}s", file=sys.stderr)
+            bench = Bench(app_module, url, seed_info)
+            scale_results = {'data': seed_info, 'benchmarks': {}}
+            for name in names:
+                kind = dict(BENCHMARKS)[name]
+                stats = measure(getattr(bench, name)(), args.iterations, args.warmup, args.max_seconds)
+                stats['kind'] = kind
+                stats['unexpected_status'] = bench.unexpected.get(name, 0)
+                unexpected_total += stats['unexpected_status']
+                scale_results['benchmarks'][name] = stats
+                print(f"[{scale}] {name:30} p50 {stats['p50_ms']:>10.2f} ms  p95 {stats['p95_ms']:>10.2f} ms  (n={stats['n']})",
+                      file=sys.stderr)
+            results['scales'][scale] = scale_results
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{(results['meta']['git']['commit'] or 'nogit')[:8]}.json")
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(output)
+    if unexpected_total:
+        print(f"{unexpected_total} requests returned an unexpected status", file=sys.stderr)
+        return 1
+    return 0
+
+
+def compare(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    def label(results):
+        meta = results['meta']
+        return f"{(meta['git']['commit'] or '?')[:8]} [{meta.get('feed_json_mode', 'python')}]"
+
+    print(f"base {label(base)}  new {label(new)}  (p50, regression threshold {args.threshold:.0%})")
+    print(f"{'scale':6} {'benchmark':30} {'base ms':>10} {'new ms':>10} {'change':>8}")
+    regressions = 0
+    for scale, scale_results in new['scales'].items():
+        base_benchmarks = base['scales'].get(scale, {}).get('benchmarks', {})
+        for name, stats in scale_results['benchmarks'].items():
+            if name not in base_benchmarks:
+                continue
+            before, after = base_benchmarks[name]['p50_ms'], stats['p50_ms']
+            change = (after - before) / before if before else 0.0
+            flag = ''
+            if base_benchmarks[name].get('unexpected_status') or stats.get('unexpected_status'):
+                # Failed requests are usually fast; the timings are not comparable
+                flag = '  (unexpected statuses, ignored)'
+            elif change > args.threshold:
+                flag = '  REGRESSION'
+                regressions += 1
+            print(f"{scale:6} {name:30} {before:>10.2f} {after:>10.2f} {change:>+8.1%}{flag}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TigerStorage API benchmark suite")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="seed each scale and run the benchmarks")
+    target = run_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--admin-url', help="existing server; a scratch database is created on it and dropped afterwards")
+    target.add_argument('--ephemeral', action='store_true', help="initdb a temporary cluster (needs Postgres binaries)")
+    run_parser.add_argument('--scales', default='1k,10k,100k', help=f"comma-separated, from {', '.join(fixture.SCALES)}")
+    run_parser.add_argument('--only', help="comma-separated benchmark names")
+    run_parser.add_argument('--iterations', type=int, default=30)
+    run_parser.add_argument('--warmup', type=int, default=3)
+    run_parser.add_argument('--max-seconds', type=float, default=20, help="per benchmark, after the first 5 samples")
+    run_parser.add_argument('--feed-json-mode', choices=['python', 'postgres'], default='python',
+                            help="serialize the feed in Python or in the query (json_agg)")
+    run_parser.add_argument('--output', help=f"results file (default: {os.path.relpath(RESULTS_DIR, REPO_ROOT)}/<time>-<commit>.json)")
+    run_parser.add_argument('--keep', action='store_true', help="keep the scratch database / cluster afterwards")
+
+    compare_parser = commands.add_parser('compare', help="compare two results files")
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.10, help="p50 slowdown counted as a regression")
+
+    args = parser.parse_args()
+    return run(args) if args.command == 'run' else compare(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
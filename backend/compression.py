@@ -0,0 +1,228 @@
+# Response compression: negotiated gzip / brotli for the API, precompressed
+# siblings for the built frontend.
+#
+# Dynamic responses (compress_response, an after_request hook in app.py) are
+# compressed when the client accepts it, the body is at least
+# COMPRESS_MIN_BYTES and the type is text-like (JSON, HTML, CSV, ...).
+# Streamed responses (SSE, exports) and files are left alone. Responses with a
+# strong ETag get the encoding appended to it ("<etag>-br"), as a compressed
+# body is a different representation, and their compressed bytes are kept in a
+# small per-process LRU keyed by that ETag, so the cached feed is compressed
+# once per change rather than once per request. conditional.not_modified
+# accepts the suffixed ETags.
+#
+# Static files (send_asset) are never compressed per request. The build step
+# writes .br / .gz next to each compressible file:
+#
+#   python -m backend.compression backend/build
+#
+# and send_asset serves the best sibling the client accepts with the right
+# Content-Encoding. Files Vite content-hashed (the ones its manifest lists)
+# never change content, so the caller passes immutable=True for them
+# (AssetRegistry.immutable decides) and they get a one-year immutable
+# Cache-Control; everything else (index.html, files copied from public/, even
+# into build/assets) is revalidated.
+#
+# brotli is optional: without it only gzip is negotiated and precompressed.
+
+import argparse
+import gzip
+import mimetypes
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, request, send_from_directory
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+# Per-request brotli stays at a fast quality; precompressed assets use the maximum
+BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 5))
+CACHE_ENTRIES = int(os.environ.get('COMPRESS_CACHE_ENTRIES', 64))
+ENABLED = os.environ.get('COMPRESS', 'on').lower() != 'off'
+
+# Server preference, best first
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+EXTENSIONS = {'br': '.br', 'gzip': '.gz'}
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml',
+                      'image/svg+xml', 'application/manifest+json')
+PRECOMPRESS_SUFFIXES = ('.js', '.mjs', '.css', '.html', '.svg', '.json', '.map', '.txt', '.xml', '.webmanifest')
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def compress(data, encoding, level=None):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY if level is None else level)
+    # mtime=0 so the same input always gives the same bytes
+    return gzip.compress(data, compresslevel=GZIP_LEVEL if level is None else level, mtime=0)
+
+
+def negotiate(request, encodings=ENCODINGS):
+    """The encoding to use for this request (None for identity)."""
+    if not encodings:
+        return None
+    accepted = request.accept_encodings
+    best = max(encodings, key=lambda encoding: accepted[encoding])
+    return best if accepted[best] > 0 else None
+
+
+def _compressible(mimetype):
+    return mimetype is not None and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressedCache:
+    """Compressed bodies of ETagged responses, per (ETag, encoding)."""
+
+    def __init__(self, max_entries=CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+cache = CompressedCache()
+
+
+def compress_response(request, response):
+    """Compress a text-like response if the client accepts it; returns the response."""
+    if not ENABLED or not _compressible(response.mimetype):
+        return response
+    if response.is_streamed or response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    if response.status_code < 200 or response.status_code in (204, 206) or 'Content-Range' in response.headers:
+        return response
+    body = response.get_data()
+    if len(body) < MIN_BYTES:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(request)
+    if encoding is None:
+        return response
+
+    start = time.perf_counter()
+    etag, weak = response.get_etag()
+    key = (etag, encoding, len(body)) if etag and not weak else None
+    compressed = cache.get(key) if key is not None else None
+    cached = compressed is not None
+    if compressed is None:
+        compressed = compress(body, encoding)
+        if key is not None:
+            cache.put(key, compressed)
+    if len(compressed) >= len(body):
+        return response
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    if key is not None:
+        response.set_etag(f"{etag}-{encoding}")
+    timing = (f'compress;dur={(time.perf_counter() - start) * 1000:.1f};'
+              f'desc="{encoding} {len(body)}->{len(compressed)}{" cached" if cached else ""}"')
+    existing = response.headers.get('Server-Timing')
+    response.headers['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+    return response
+
+
+def send_asset(directory, filename, immutable=False):
+    """send_from_directory, preferring a precompressed .br / .gz sibling the client accepts.
+
+    `immutable` adds a one-year Cache-Control; only pass it for content-hashed files.
+    """
+    path = safe_join(os.path.join(current_app.root_path, directory), filename)
+    if path is None or not os.path.isfile(path):
+        raise NotFound()
+    available = tuple(encoding for encoding in ENCODINGS if os.path.isfile(path + EXTENSIONS[encoding]))
+    encoding = negotiate(request, available)
+    if encoding is None:
+        response = send_from_directory(directory, filename)
+    else:
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_from_directory(directory, filename + EXTENSIONS[encoding], mimetype=mimetype)
+        response.headers['Content-Encoding'] = encoding
+    if available:
+        response.vary.add('Accept-Encoding')
+    if immutable:
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def precompress(directory, min_bytes=MIN_BYTES):
+    """Write .gz (and .br) siblings for every compressible file under `directory`.
+
+    A sibling is only kept if it is smaller than the original; up-to-date ones
+    are skipped. Returns (files written, original bytes, smallest compressed bytes).
+    """
+    written, original_total, compressed_total = 0, 0, 0
+    for dirpath, _, filenames in os.walk(directory):
+        for filename in filenames:
+            if not filename.endswith(PRECOMPRESS_SUFFIXES):
+                continue
+            path = os.path.join(dirpath, filename)
+            size = os.path.getsize(path)
+            if size < min_bytes:
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            smallest = size
+            for encoding in ENCODINGS:
+                target = path + EXTENSIONS[encoding]
+                if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+                    smallest = min(smallest, os.path.getsize(target))
+                    continue
+                compressed = compress(data, encoding, level=11 if encoding == 'br' else 9)
+                if len(compressed) >= size:
+                    if os.path.exists(target):
+                        os.remove(target)
+                    continue
+                with open(target, 'wb') as f:
+                    f.write(compressed)
+                written += 1
+                smallest = min(smallest, len(compressed))
+            original_total += size
+            compressed_total += smallest
+    return written, original_total, compressed_total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompress built frontend assets (.br / .gz siblings)")
+    parser.add_argument('directory', nargs='?',
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'build'))
+    parser.add_argument('--min-bytes', type=int, default=MIN_BYTES)
+    args = parser.parse_args()
+    if not os.path.isdir(args.directory):
+        print(f"error: {args.directory} is not a directory", file=sys.stderr)
+        return 1
+    if brotli is None:
+        print("brotli is not installed; writing .gz only", file=sys.stderr)
+    written, original, compressed = precompress(args.directory, args.min_bytes)
+    print(f"Wrote {written} file(s); {original} bytes of compressible assets, {compressed} bytes compressed")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
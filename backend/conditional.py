@@ -0,0 +1,75 @@
+# Conditional GET (ETag / If-None-Match) for the endpoints the frontend polls.
+#
+# ETags are derived from per-table generation counters kept in the
+# table_versions table (bumped by statement-level triggers, see migrations/),
+# so a handler can answer 304 Not Modified after one small primary-key range
+# read, before running its real query or formatting any rows. Each table's
+# counter is spread over several slot rows so writers do not queue on one row;
+# its version is the sum of the slots.
+
+import hashlib
+
+from flask import make_response, request
+
+import backend.schema as schema
+
+
+def table_versions(conn, tables):
+    """{table_name: (version, updated_at)} for the given tables."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT table_name, SUM(version)::bigint, MAX(updated_at)
+            FROM table_versions
+            WHERE table_name = ANY(%s)
+            GROUP BY table_name
+        """, (list(tables),))
+        return {name: (version, updated_at) for name, version, updated_at in cur.fetchall()}
+
+
+def etag_for(conn, tables, *parts):
+    """Strong ETag for a response built from `tables`, varied by request-specific `parts`.
+
+    Returns None when the database has no table_versions table, in which case
+    the endpoint just behaves unconditionally.
+    """
+    if not schema.table(conn, 'table_versions').exists:
+        return None
+    versions = table_versions(conn, tables)
+    key = [f"{name}:{versions.get(name)}" for name in tables]
+    key.extend(part.decode() if isinstance(part, bytes) else str(part) for part in parts)
+    return hashlib.sha1("|".join(key).encode()).hexdigest()[:24]
+
+
+# A compressed response carries its ETag with the encoding appended (see compression.py)
+ENCODING_SUFFIXES = ('', '-br', '-gzip')
+
+
+def matching_etag(etag):
+    """The variant of `etag` named in If-None-Match, or None."""
+    if etag is None:
+        return None
+    for suffix in ENCODING_SUFFIXES:
+        if request.if_none_match.contains(etag + suffix):
+            return etag + suffix
+    return None
+
+
+def not_modified(etag, vary=None):
+    """A 304 response if the client already holds `etag` (in any encoding), else None."""
+    matched = matching_etag(etag)
+    if matched is None:
+        return None
+    response = make_response('', 304)
+    if matched != etag:
+        response.vary.add('Accept-Encoding')
+    return tag(response, matched, vary)
+
+
+def tag(response, etag, vary=None):
+    """Attach the ETag and ask clients to revalidate on every use."""
+    if etag is not None:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        if vary:
+            response.vary.update(vary)
+    return response
@@ -1,8 +1,11 @@
 from flask import Flask
 from flask_cors import CORS
 from flask import send_from_directory
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 class Config:
     def __init__(self, app: Flask):
         # Configure CORS to allow requests from Render domains
@@ -41,7 +44,8 @@ class Config:
                         "Origin",
                         "X-CSRFToken",
                         "X-Session-Id",
-                        "X-Auth-Token"
+                        "X-Auth-Token",
+                        "X-Next-Cursor"
                     ],
                     "methods": ["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"],
                     "max_age": 3600
@@ -58,11 +62,9 @@ class Config:
         import dotenv
         dotenv.load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.env'))
         
-        # Debug print environment variables
-        print("Environment variables loaded:")
-        print(f"CLOUDINARY_CLOUD_NAME: {os.getenv('CLOUDINARY_CLOUD_NAME')}")
-        print(f"CLOUDINARY_API_KEY: {os.getenv('CLOUDINARY_API_KEY')}")
-        print(f"CLOUDINARY_API_SECRET: {'***' if os.getenv('CLOUDINARY_API_SECRET') else 'None'}")
+        logger.debug("Cloudinary settings: cloud name %s, API key %s, API secret %s",
+                     os.getenv('CLOUDINARY_CLOUD_NAME'), os.getenv('CLOUDINARY_API_KEY'),
+                     '***' if os.getenv('CLOUDINARY_API_SECRET') else 'None')
 
         # Initialize Cloudinary
         import cloudinary
@@ -0,0 +1,301 @@
+# PostgreSQL connection pooling for the Flask API.
+#
+# Every route checks a connection out with `db.connection()` instead of
+# opening a new psycopg2 connection per request. The pool lives per process:
+# gunicorn workers each build their own on first use, and a pool inherited
+# across fork() is discarded (never closed, since closing would terminate the
+# parent's server sessions over the shared sockets).
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+
+import backend.metrics as metrics
+
+
+class DatabaseUnavailable(Exception):
+    """Raised when no database connection can be obtained."""
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class ConnectionPool:
+    """Thread-safe pool of psycopg2 connections.
+
+    - minconn/maxconn bound the number of open connections
+    - connections older than max_lifetime seconds are recycled on checkout/return
+    - connections idle longer than health_check_idle seconds are pinged with
+      SELECT 1 before being handed out (0 pings on every checkout)
+    - checkout blocks up to timeout seconds when the pool is exhausted
+    - connection_factory is passed to psycopg2.connect (None for the default)
+    """
+
+    def __init__(self, dsn, minconn=1, maxconn=5, max_lifetime=1800.0,
+                 health_check_idle=10.0, timeout=10.0, connection_factory=None):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Invalid pool bounds: minconn=%s maxconn=%s" % (minconn, maxconn))
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.max_lifetime = max_lifetime
+        self.health_check_idle = health_check_idle
+        self.timeout = timeout
+        self.connection_factory = connection_factory
+        self._reset_state()
+
+    def _reset_state(self):
+        self._pid = os.getpid()
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = []          # stack of (conn, created_at, returned_at)
+        self._created = {}       # id(conn) -> created_at for checked-out connections
+        self._size = 0
+        self._closed = False
+        self._counters = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'connections_created': 0,
+            'connections_recycled': 0,
+            'health_check_failures': 0,
+            'discarded': 0,
+        }
+
+    def _check_fork(self):
+        # A pool copied into a forked child shares sockets with the parent.
+        # Drop every reference without closing and start over.
+        if self._pid != os.getpid():
+            self._reset_state()
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn, connection_factory=self.connection_factory)
+        with self._cond:
+            self._counters['connections_created'] += 1
+        return conn
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _fill_to_min(self):
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.minconn:
+                    return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                return
+            with self._cond:
+                now = time.monotonic()
+                self._idle.append((conn, now, now))
+                self._cond.notify()
+
+    def getconn(self):
+        """Check a connection out of the pool."""
+        self._check_fork()
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        while True:
+            conn = None
+            created_at = returned_at = None
+            with self._cond:
+                if self._closed:
+                    raise DatabaseUnavailable("Connection pool is closed")
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters['timeouts'] += 1
+                        raise DatabaseUnavailable(
+                            "Timed out after %.1fs waiting for a database connection" % self.timeout)
+                    if not waited:
+                        self._counters['waits'] += 1
+                        waited = True
+                    self._cond.wait(remaining)
+                if self._idle:
+                    conn, created_at, returned_at = self._idle.pop()
+                else:
+                    self._size += 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception as e:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise DatabaseUnavailable(str(e)) from e
+                created_at = time.monotonic()
+            else:
+                now = time.monotonic()
+                if conn.closed or (self.max_lifetime and now - created_at > self.max_lifetime):
+                    self._discard(conn, recycled=not conn.closed)
+                    continue
+                if now - returned_at >= self.health_check_idle and not self._is_healthy(conn):
+                    with self._cond:
+                        self._counters['health_check_failures'] += 1
+                    self._discard(conn)
+                    continue
+
+            with self._cond:
+                self._created[id(conn)] = created_at
+                self._counters['checkouts'] += 1
+            return conn
+
+    def _discard(self, conn, recycled=False):
+        self._close_quietly(conn)
+        with self._cond:
+            self._size -= 1
+            self._counters['connections_recycled' if recycled else 'discarded'] += 1
+            self._cond.notify()
+
+    def putconn(self, conn, discard=False):
+        """Return a connection to the pool, rolling back any open transaction."""
+        if self._pid != os.getpid():
+            # Checked out before a fork; it belongs to the parent process.
+            return
+        with self._cond:
+            created_at = self._created.pop(id(conn), None)
+        if created_at is None:
+            # Not ours (or already returned); just close it.
+            self._close_quietly(conn)
+            return
+
+        if not discard and not conn.closed:
+            try:
+                status = conn.info.transaction_status
+                if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        if discard or conn.closed or self._closed:
+            self._discard(conn)
+            return
+        if self.max_lifetime and time.monotonic() - created_at > self.max_lifetime:
+            self._discard(conn, recycled=True)
+            self._fill_to_min()
+            return
+
+        with self._cond:
+            self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        """Close every idle connection and refuse further checkouts."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            self._close_quietly(conn)
+
+    def stats(self):
+        """Snapshot of pool occupancy and lifetime counters."""
+        self._check_fork()
+        with self._cond:
+            stats = {
+                'pid': self._pid,
+                'min_size': self.minconn,
+                'max_size': self.maxconn,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._created),
+                'max_lifetime_seconds': self.max_lifetime,
+                'health_check_idle_seconds': self.health_check_idle,
+                'checkout_timeout_seconds': self.timeout,
+            }
+            stats.update(self._counters)
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return this process's pool, creating it from the environment on first use."""
+    global _pool
+    if _pool is None or _pool._pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool._pid != os.getpid():
+                _pool = ConnectionPool(
+                    os.environ.get("DATABASE_URL", ""),
+                    minconn=_env_int("DB_POOL_MIN", 1),
+                    maxconn=_env_int("DB_POOL_MAX", 5),
+                    max_lifetime=_env_float("DB_POOL_MAX_LIFETIME", 1800),
+                    health_check_idle=_env_float("DB_POOL_HEALTHCHECK_IDLE", 10),
+                    timeout=_env_float("DB_POOL_TIMEOUT", 10),
+                    # Times every statement for the per-request metrics
+                    connection_factory=metrics.InstrumentedConnection if metrics.ENABLED else None,
+                )
+                _pool._fill_to_min()
+    return _pool
+
+
+def _reset_after_fork():
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+@contextmanager
+def connection():
+    """Check out a pooled connection for the duration of a with-block.
+
+    Uncommitted work is rolled back when the block exits, and connections
+    that failed at the network level are discarded instead of reused.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    discard = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        discard = True
+        raise
+    finally:
+        pool.putconn(conn, discard=discard)
+
+
+def pool_stats():
+    """Stats for this worker's pool (empty if no connection was ever requested)."""
+    if _pool is None or _pool._pid != os.getpid():
+        return {'pid': os.getpid(), 'size': 0, 'idle': 0, 'in_use': 0}
+    return _pool.stats()
@@ -0,0 +1,198 @@
+# Listing availability events pushed to browsers over Server-Sent Events.
+#
+# Postgres triggers NOTIFY on the `listing_events` channel whenever a listing
+# or reservation request changes (see migrations/). Each worker process runs
+# a single listener thread on its own dedicated connection and fans every
+# notification out to the in-process subscriber queues, one per open
+# /api/listings/stream response.
+
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'listing_events'
+
+
+class ListingEventHub:
+    def __init__(self, dsn, channel=CHANNEL, max_queue=100, poll_interval=5.0):
+        self.dsn = dsn
+        self.channel = channel
+        self.max_queue = max_queue
+        self.poll_interval = poll_interval
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._thread = None
+        self._stop = threading.Event()
+        self.connected = False
+        self.delivered = 0
+        self.dropped = 0
+        self.reconnects = 0
+
+    def subscribe(self):
+        """Register a new client; returns the queue its events arrive on."""
+        q = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.add(q)
+            self._ensure_listener()
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def _ensure_listener(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='listing-event-listener', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def publish(self, event):
+        """Hand an event to every subscriber; slow clients lose their oldest event."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    q.put_nowait(event)
+                except queue.Full:
+                    pass
+                self.dropped += 1
+        self.delivered += len(subscribers)
+
+    def _listen(self):
+        conn = psycopg2.connect(self.dsn)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {self.channel};")
+        return conn
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+            conn = None
+            try:
+                conn = self._listen()
+                self.connected = True
+                backoff = 1.0
+                logger.info("[EVENTS] Listening on %s (pid %s)", self.channel, os.getpid())
+                while not self._stop.is_set():
+                    # Nobody left to deliver to: release the connection until the next subscriber
+                    with self._lock:
+                        if not self._subscribers:
+                            self._thread = None
+                            return
+                    if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            event = json.loads(notify.payload)
+                        except ValueError:
+                            event = {'payload': notify.payload}
+                        self.publish(event)
+            except Exception as e:
+                logger.warning("[EVENTS] Listener error: %s; reconnecting in %.0fs", e, backoff)
+                self.reconnects += 1
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                self.connected = False
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def stats(self):
+        return {
+            'pid': self._pid,
+            'subscribers': self.subscriber_count,
+            'listener_connected': self.connected,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'reconnects': self.reconnects,
+        }
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    """This worker's hub (threads do not survive fork, so each process builds its own)."""
+    global _hub
+    if _hub is None or _hub._pid != os.getpid():
+        with _hub_lock:
+            if _hub is None or _hub._pid != os.getpid():
+                _hub = ListingEventHub(os.environ.get("DATABASE_URL", ""))
+    return _hub
+
+
+def format_sse(data, event=None, event_id=None):
+    """One Server-Sent Events message."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    for line in json.dumps(data, separators=(',', ':')).splitlines() or ['']:
+        lines.append(f"data: {line}")
+    return "\n".join(lines) + "\n\n"
+
+
+def busy(retry_ms):
+    """SSE body for a refused stream: the client waits `retry_ms`, then reconnects.
+
+    A 503 would make EventSource give up for good; a `busy` event followed by the
+    end of the stream keeps it retrying, and tells the page to poll meanwhile.
+    """
+    return f"retry: {retry_ms}\n\n" + format_sse({'retry_ms': retry_ms}, event='busy')
+
+
+def stream(q, heartbeat=15.0, max_duration=300.0, retry_ms=3000):
+    """Generator of SSE text for one subscriber.
+
+    Sends a keep-alive comment when idle so proxies keep the connection open, and
+    ends after max_duration so a worker thread is never held indefinitely; the
+    browser's EventSource reconnects on its own after `retry_ms`.
+    """
+    yield f"retry: {retry_ms}\n\n"
+    deadline = time.monotonic() + max_duration
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        try:
+            event = q.get(timeout=min(heartbeat, remaining))
+        except queue.Empty:
+            yield ": keepalive\n\n"
+            continue
+        yield format_sse(event, event=event.get('type', 'listing'))
@@ -0,0 +1,119 @@
+# Streaming admin exports (GET /api/admin/export/<name>?format=csv|ndjson).
+#
+# Rows are read through a server-side (named) cursor, `itersize` at a time, and
+# written out by a generator, so an export of any size holds one batch in
+# memory and the first bytes go out before the query has finished. The
+# export runs in a single read-only REPEATABLE READ transaction, so the file
+# is a consistent snapshot even while the app keeps writing.
+#
+# The pooled connection is checked out when the generator starts and returned
+# when it finishes or the client disconnects (Flask closes the generator).
+#
+# The headers are gone by the time a failure can happen, so a failed export
+# can't become an error status. admin_export ends it with truncated_marker()
+# (a last line no complete export has) and re-raises, which aborts the chunked
+# response. A client that ignores the transfer encoding still sees the marker.
+#
+# CSV text cells starting with =, +, - or @ (or a tab / carriage return) are
+# prefixed with ' so spreadsheets show user-written titles and descriptions as
+# text instead of evaluating them as formulas.
+
+import csv
+import io
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+
+import backend.db as db
+
+ITERSIZE = int(os.environ.get('EXPORT_ITERSIZE', 2000))
+
+# Export name -> query. Ordered by primary key so exports are reproducible.
+EXPORTS = {
+    'listings': "SELECT * FROM storage_listings ORDER BY listing_id",
+    'reservations': "SELECT * FROM reservation_requests ORDER BY request_id",
+    'reports': """
+        SELECT r.report_id, r.listing_id, r.lender_id, r.renter_id, r.reason, r.status AS report_status,
+               r.created_at AS report_created_at, s.title, s.owner_id, s.address, s.hall_name
+        FROM reported_listings r
+        LEFT JOIN storage_listings s ON s.listing_id = r.listing_id
+        ORDER BY r.report_id
+    """,
+    'reviews': "SELECT * FROM lender_reviews ORDER BY review_id",
+}
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Leading characters spreadsheets treat as the start of a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+TRUNCATED_MESSAGE = 'export truncated: an error occurred while streaming; this file is incomplete'
+
+
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot export value of type {type(value).__name__}")
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def truncated_marker(fmt):
+    """Last line of an export that failed part way (chunks always end on a row boundary)."""
+    if fmt == 'csv':
+        return f'#ERROR,{TRUNCATED_MESSAGE}\r\n'
+    return json.dumps({'error': TRUNCATED_MESSAGE}) + '\n'
+
+
+def _csv_chunks(columns, batches):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    yield buf.getvalue()
+    for rows in batches:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+        yield buf.getvalue()
+
+
+def _ndjson_chunks(columns, batches):
+    for rows in batches:
+        yield ''.join(json.dumps(dict(zip(columns, row)), default=_json_value) + '\n' for row in rows)
+
+
+def stream(name, fmt, itersize=None):
+    """Generator of text chunks for export `name` in format `fmt` (both already validated)."""
+    itersize = itersize or ITERSIZE
+    with db.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        with conn.cursor(name=f'export_{name}') as cur:
+            cur.itersize = itersize
+            cur.execute(EXPORTS[name])
+            # A named cursor only has a description after the first fetch
+            first = cur.fetchmany(itersize)
+            columns = [desc[0] for desc in cur.description]
+
+            def batches():
+                rows = first
+                while rows:
+                    yield rows
+                    rows = cur.fetchmany(itersize)
+
+            chunks = _csv_chunks if fmt == 'csv' else _ndjson_chunks
+            yield from chunks(columns, batches())
+        conn.rollback()
@@ -0,0 +1,301 @@
+# Cache for the serialized public listing feed (GET /api/listings).
+#
+# The feed is the same for every renter, so workers keep the finished JSON
+# bytes instead of rebuilding them per request:
+#
+# - entries are fresh for `ttl` seconds and served without touching the DB
+# - a stale entry is revalidated with the cheap table_versions ETag; the main
+#   query only runs when the data actually changed
+# - concurrent misses for the same key are coalesced (single-flight), so a
+#   burst of requests triggers one rebuild per worker
+# - write handlers call invalidate(); with the file backend that reaches every
+#   worker on the host, with the memory backend other workers catch up within
+#   `ttl` (their stale entries fail ETag revalidation)
+# - a rebuild that was running when its key was invalidated is returned to its
+#   waiting requests but not stored, since it may predate the write
+#
+# Backends: "memory" (per-process LRU, default), "file" (directory shared by
+# all workers on the host) and "none".
+#
+# The same machinery caches the per-lender review summary (see
+# get_lender_reviews); there entries are invalidated one key at a time and,
+# with a TTL of 0, revalidated against the lender_reviews version on every read.
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class FeedEntry:
+    def __init__(self, etag, body, headers=None, stored_at=None):
+        self.etag = etag
+        self.body = body
+        self.headers = dict(headers or {})
+        self.stored_at = time.time() if stored_at is None else stored_at
+
+    def age(self):
+        return time.time() - self.stored_at
+
+
+class MemoryBackend:
+    """Per-process LRU."""
+
+    name = 'memory'
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._invalidations = 0
+
+    def token(self, key):
+        """Changes whenever `key` may have been invalidated (here: any delete or clear)."""
+        return self._invalidations
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, token=None):
+        """Store `entry`, unless `token` was given and is no longer current; returns whether it was stored."""
+        with self._lock:
+            if token is not None and token != self._invalidations:
+                return False
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._invalidations += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._invalidations += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FileBackend:
+    """Entries stored as files in a directory shared by every worker on the host.
+
+    A `generation` file is part of every entry's name; invalidation rewrites it,
+    so all workers stop seeing old entries at once. Deleting one key leaves a
+    `.deleted` marker next to its entry, so the key's token changes for every
+    worker too.
+    """
+
+    name = 'file'
+
+    def __init__(self, directory, max_entries=256):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+        self._generation_path = os.path.join(directory, 'generation')
+
+    def _generation(self):
+        try:
+            with open(self._generation_path) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return ''
+
+    def _path(self, key, suffix='.entry', generation=None):
+        generation = self._generation() if generation is None else generation
+        digest = hashlib.sha1((generation + '\0' + key).encode()).hexdigest()
+        return os.path.join(self.directory, digest + suffix)
+
+    def token(self, key):
+        """Changes whenever `key` is invalidated, by any worker on the host."""
+        generation = self._generation()
+        try:
+            with open(self._path(key, '.deleted', generation)) as f:
+                deleted = f.read()
+        except FileNotFoundError:
+            deleted = ''
+        return generation, deleted
+
+    def _write_atomic(self, path, data):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                header, body = f.read().split(b'\n', 1)
+        except (FileNotFoundError, ValueError):
+            return None
+        meta = json.loads(header)
+        return FeedEntry(meta['etag'], body, meta.get('headers'), meta['stored_at'])
+
+    def set(self, key, entry, token=None):
+        """Store `entry`, unless `token` was given and is no longer current; returns whether it was stored."""
+        if token is not None and token != self.token(key):
+            return False
+        header = json.dumps({'etag': entry.etag, 'headers': entry.headers, 'stored_at': entry.stored_at})
+        self._write_atomic(self._path(key), header.encode() + b'\n' + entry.body)
+        self._prune()
+        return True
+
+    def _entry_files(self, suffixes=('.entry',)):
+        return [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                if name.endswith(suffixes)]
+
+    def _prune(self):
+        files = self._entry_files()
+        if len(files) <= self.max_entries:
+            return
+        files.sort(key=lambda path: os.stat(path).st_mtime if os.path.exists(path) else 0)
+        for path in files[:len(files) - self.max_entries]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def delete(self, key):
+        generation = self._generation()
+        self._write_atomic(self._path(key, '.deleted', generation), uuid.uuid4().hex.encode())
+        try:
+            os.unlink(self._path(key, generation=generation))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        self._write_atomic(self._generation_path, uuid.uuid4().hex.encode())
+        # Markers belong to the old generation's names, so they can go too
+        for path in self._entry_files(('.entry', '.deleted')):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def __len__(self):
+        return len(self._entry_files())
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+        self.error = None
+
+
+class FeedCache:
+    def __init__(self, backend, ttl=5.0):
+        self.backend = backend
+        self.ttl = ttl
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.revalidations = 0
+        self.rebuilds = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        self.discarded = 0
+
+    def get_or_build(self, key, build):
+        """Return a FeedEntry for `key`.
+
+        `build(stale_entry)` must return a FeedEntry; it gets the previous (stale)
+        entry, or None, so it can revalidate instead of rebuilding. Returning the
+        stale entry object itself counts as a successful revalidation.
+        """
+        if self.backend is None:
+            return build(None)
+        entry = self.backend.get(key)
+        if entry is not None and entry.age() < self.ttl:
+            self.hits += 1
+            return entry
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            self.coalesced += 1
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.entry
+
+        try:
+            # Taken before building: an invalidate() during the build changes it
+            token = self.backend.token(key)
+            built = build(entry)
+            if built is entry:
+                self.revalidations += 1
+                built = FeedEntry(entry.etag, entry.body, entry.headers)
+            else:
+                self.rebuilds += 1
+            if not self.backend.set(key, built, token=token):
+                self.discarded += 1
+            flight.entry = built
+            return built
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything when no key is given."""
+        self.invalidations += 1
+        if self.backend is None:
+            return
+        if key is None:
+            self.backend.clear()
+        else:
+            self.backend.delete(key)
+
+    def stats(self):
+        return {
+            'backend': self.backend.name if self.backend is not None else 'none',
+            'ttl_seconds': self.ttl,
+            'entries': len(self.backend) if self.backend is not None else 0,
+            'hits': self.hits,
+            'revalidations': self.revalidations,
+            'rebuilds': self.rebuilds,
+            'coalesced': self.coalesced,
+            'invalidations': self.invalidations,
+            'discarded': self.discarded,
+        }
+
+
+def from_env(prefix='LISTING_FEED_CACHE', ttl=5, dirname='tigerstorage-feed-cache'):
+    """Build the cache selected by <prefix> (memory | file | none) and <prefix>_TTL / _MAX_ENTRIES / _DIR."""
+    kind = os.environ.get(prefix, 'memory').lower()
+    ttl = float(os.environ.get(f'{prefix}_TTL', ttl))
+    max_entries = int(os.environ.get(f'{prefix}_MAX_ENTRIES', 256))
+    if kind == 'none':
+        backend = None
+    elif kind == 'file':
+        directory = os.environ.get(f'{prefix}_DIR', os.path.join(tempfile.gettempdir(), dirname))
+        backend = FileBackend(directory, max_entries=max_entries)
+    else:
+        backend = MemoryBackend(max_entries=max_entries)
+    return FeedCache(backend, ttl=ttl)
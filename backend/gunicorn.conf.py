@@ -1,4 +1,21 @@
+import os
+
 bind = "0.0.0.0:$PORT"
 workers = 4
-threads = 2
+# Open /api/listings/stream responses each hold a thread (at most SSE_MAX_STREAMS_PER_WORKER per worker).
+# Capacity: workers * SSE_MAX_STREAMS_PER_WORKER live streams (4 * 4 = 16 by default), leaving
+# threads - 4 = 4 threads per worker for ordinary requests. Browsers past that get a `busy`
+# event and retry about every SSE_BUSY_RETRY_SECONDS; streams end after SSE_MAX_STREAM_SECONDS,
+# so the slots rotate. Meanwhile those pages poll the cheap /api/listings/changes delta feed.
+# Raise the stream cap only together with threads.
+threads = 8
 timeout = 120
+
+
+def on_starting(server):
+    # Bring the schema up to date once, before any worker serves a request
+    # (MIGRATE_ON_START=0 to run `python -m backend.migrate` separately)
+    if os.environ.get('MIGRATE_ON_START', '1') == '1' and os.environ.get('DATABASE_URL'):
+        import backend.migrate as migrate
+        ran = migrate.migrate_url(os.environ['DATABASE_URL'])
+        server.log.info("Applied %d migration(s)", len(ran))
@@ -0,0 +1,99 @@
+# Per-lender rating aggregates (the lender_rating_stats table).
+#
+# A trigger on lender_reviews keeps one row per lender, keyed by lowercased
+# username, in the same transaction as the review insert/update/delete (see
+# migrations/0001_baseline.sql). Listing queries LEFT JOIN it to get lender_avg_rating instead
+# of running AVG(rating) ... GROUP BY LOWER(lender_username) over every review.
+#
+# Rebuild after bulk edits or if the table ever drifts:
+#   DATABASE_URL=postgresql://... python -m backend.lender_ratings rebuild
+
+import argparse
+import os
+import sys
+
+import backend.schema as schema
+
+HISTOGRAM_SQL = ", ".join(f"COUNT(*) FILTER (WHERE rating = {n})" for n in range(1, 6))
+
+
+def rating_join(conn, listings_table='storage_listings'):
+    """(select column, join clause) that add lender_avg_rating to a storage_listings query.
+
+    Both are empty strings when the stats table does not exist yet, in which case
+    callers fall back to aggregating lender_reviews.
+    """
+    if not schema.table(conn, 'lender_rating_stats').exists:
+        return "", ""
+    return (", lender_rating_stats.avg_rating AS lender_avg_rating",
+            f"LEFT JOIN lender_rating_stats ON lender_rating_stats.lender_username = LOWER({listings_table}.owner_id)")
+
+
+def lender_stats(conn, lender_username):
+    """{review_count, avg_rating, histogram} for one lender.
+
+    One primary-key read from lender_rating_stats, or an aggregate over
+    lender_reviews when the stats table does not exist yet.
+    """
+    with conn.cursor() as cur:
+        if schema.table(conn, 'lender_rating_stats').exists:
+            cur.execute("""
+                SELECT review_count, avg_rating, histogram
+                FROM lender_rating_stats
+                WHERE lender_username = LOWER(%s)
+            """, (lender_username,))
+        else:
+            cur.execute(f"""
+                SELECT COUNT(*), AVG(rating)::float, ARRAY[{HISTOGRAM_SQL}]::int[]
+                FROM lender_reviews
+                WHERE LOWER(lender_username) = LOWER(%s)
+                HAVING COUNT(*) > 0
+            """, (lender_username,))
+        row = cur.fetchone()
+    if row is None:
+        return {'review_count': 0, 'avg_rating': None, 'histogram': {str(n): 0 for n in range(1, 6)}}
+    review_count, avg_rating, histogram = row
+    return {
+        'review_count': review_count,
+        'avg_rating': avg_rating,
+        'histogram': {str(n): count for n, count in zip(range(1, 6), histogram)},
+    }
+
+
+def rebuild(conn):
+    """Recompute every lender's row from lender_reviews; returns the number of lenders."""
+    with conn.cursor() as cur:
+        # Block review writes for the duration so nothing lands between the delete and the insert
+        cur.execute("LOCK TABLE lender_reviews IN SHARE MODE")
+        cur.execute("DELETE FROM lender_rating_stats")
+        cur.execute(f"""
+            INSERT INTO lender_rating_stats (lender_username, review_count, rating_sum, histogram)
+            SELECT LOWER(lender_username), COUNT(*), SUM(rating), ARRAY[{HISTOGRAM_SQL}]::int[]
+            FROM lender_reviews
+            GROUP BY LOWER(lender_username)
+        """)
+        count = cur.rowcount
+    conn.commit()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the lender_rating_stats table")
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'))
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("set DATABASE_URL or pass --database-url")
+
+    import psycopg2
+    conn = psycopg2.connect(args.database_url)
+    try:
+        count = rebuild(conn)
+    finally:
+        conn.close()
+    print(f"Rebuilt rating stats for {count} lenders")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,256 @@
+# Bulk listing import (POST /api/listings/import and the CLI below).
+#
+# Every row goes through validate_listing(), the same rules create_listing
+# applies to a single listing. It checks types and ranges as well as presence,
+# so every row it accepts fits the columns: one bad row must not fail the
+# whole INSERT. Rows that fail are reported by row number; the rest are
+# loaded in one transaction, with execute_values (returns the new ids)
+# for API-sized batches or COPY for large files. Per-row NOTIFYs are suppressed
+# during the load and replaced by a single summary event.
+#
+#   DATABASE_URL=postgresql://... python -m backend.listing_import listings.csv --owner netid
+#   DATABASE_URL=postgresql://... python -m backend.listing_import --generate 100000 --owner loadtest
+
+import argparse
+import csv
+import io
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from psycopg2.extras import execute_values
+
+# Column order used for both loaders
+IMPORT_COLUMNS = ['title', 'sq_ft', 'cost', 'start_date', 'end_date', 'latitude', 'longitude', 'description',
+                  'image_url', 'remaining_space', 'address', 'hall_name', 'owner_id']
+REQUIRED_FIELDS = ['title', 'cost', 'description', 'latitude', 'longitude', 'start_date', 'end_date']
+VARCHAR_LIMITS = {'title': 255, 'address': 255, 'image_url': 255, 'hall_name': 255, 'owner_id': 255}
+TEXT_FIELDS = ['description', 'image_url', 'address', 'hall_name']
+# sq_ft and remaining_space are INTEGER columns
+MAX_SQ_FT = 2147483647
+MAX_COST = 1000000000
+
+
+class ListingValidationError(ValueError):
+    pass
+
+
+def validate_listing(data, today=None):
+    """Column values for one listing, or ListingValidationError with the message create_listing uses."""
+    if not isinstance(data, dict):
+        raise ListingValidationError("Each listing must be an object")
+    for field in REQUIRED_FIELDS:
+        if field not in data:
+            raise ListingValidationError(f"Missing required field: {field}")
+    # Special check for square feet (handle both squareFeet and sq_ft)
+    if 'squareFeet' not in data and 'sq_ft' not in data:
+        raise ListingValidationError("Missing required field: square feet")
+
+    title = data['title']
+    if not isinstance(title, str) or not title.strip():
+        raise ListingValidationError("Title is required")
+    for field in TEXT_FIELDS:
+        if data.get(field) is not None and not isinstance(data[field], str):
+            raise ListingValidationError(f"{field} must be text")
+
+    try:
+        cost = float(data['cost']) if data['cost'] else 0
+    except (TypeError, ValueError):
+        raise ListingValidationError("Invalid cost")
+    if not math.isfinite(cost):
+        raise ListingValidationError("Invalid cost")
+    if cost < 0:
+        raise ListingValidationError("Storage cost cannot be negative.")
+    if cost > MAX_COST:
+        raise ListingValidationError(f"Storage cost cannot be more than {MAX_COST}.")
+    raw_sq_ft = data['squareFeet'] if 'squareFeet' in data else data['sq_ft']
+    try:
+        total_sq_ft = int(raw_sq_ft) if raw_sq_ft else 0
+    except (TypeError, ValueError):
+        raise ListingValidationError("Invalid square feet")
+    if total_sq_ft <= 0:
+        raise ListingValidationError("Storage space (square feet) must be greater than zero.")
+    if total_sq_ft > MAX_SQ_FT:
+        raise ListingValidationError(f"Storage space (square feet) cannot be more than {MAX_SQ_FT}.")
+    try:
+        latitude = float(data['latitude'])
+        longitude = float(data['longitude'])
+    except (TypeError, ValueError):
+        raise ListingValidationError("Invalid latitude or longitude")
+    # NaN fails both comparisons
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ListingValidationError("Latitude must be between -90 and 90 and longitude between -180 and 180")
+
+    today = today or date.today()
+    try:
+        start_dt = date.fromisoformat(data['start_date'])
+        end_dt = date.fromisoformat(data['end_date'])
+    except (TypeError, ValueError):
+        raise ListingValidationError("Invalid date format for start or end date.")
+    if start_dt < today:
+        raise ListingValidationError("Start date cannot be in the past.")
+    if end_dt < today:
+        raise ListingValidationError("End date cannot be in the past.")
+    if start_dt >= end_dt:
+        raise ListingValidationError("End date must be after start date.")
+
+    values = {
+        'title': title,
+        'sq_ft': total_sq_ft,
+        'cost': cost,
+        'start_date': data['start_date'],
+        'end_date': data['end_date'],
+        'latitude': latitude,
+        'longitude': longitude,
+        'description': data['description'],
+        'image_url': data.get('image_url', ''),
+        'remaining_space': total_sq_ft,  # Set remaining_space to sq_ft on creation
+    }
+    if 'address' in data:
+        values['address'] = data['address']
+    if 'hall_name' in data:
+        values['hall_name'] = data['hall_name']
+    for column, limit in VARCHAR_LIMITS.items():
+        value = values.get(column)
+        if isinstance(value, str) and len(value) > limit:
+            raise ListingValidationError(f"{column} is too long (max {limit} characters)")
+    return values
+
+
+def parse_csv(text):
+    """Rows of a CSV file with a header line, as dicts (empty cells become missing optional fields)."""
+    reader = csv.DictReader(io.StringIO(text))
+    return [{key: value for key, value in row.items() if key and (value != '' or key in REQUIRED_FIELDS)}
+            for row in reader]
+
+
+def validate_rows(rows, owner_id=None, allow_owner_override=False, today=None):
+    """(valid rows as IMPORT_COLUMNS tuples, their 1-based row numbers, [{row, error}])"""
+    valid, row_numbers, errors = [], [], []
+    today = today or date.today()
+    for number, data in enumerate(rows, start=1):
+        try:
+            values = validate_listing(data, today)
+            owner = data.get('owner_id') if allow_owner_override and data.get('owner_id') else owner_id
+            values['owner_id'] = owner.lower() if owner else None
+        except ListingValidationError as e:
+            errors.append({'row': number, 'error': str(e)})
+            continue
+        valid.append(tuple(values.get(column) for column in IMPORT_COLUMNS))
+        row_numbers.append(number)
+    return valid, row_numbers, errors
+
+
+def _begin_bulk(cur):
+    cur.execute("SET LOCAL tigerstorage.bulk_import = 'on'")
+
+
+def _announce(cur, count):
+    cur.execute("SET LOCAL tigerstorage.bulk_import = 'off'")
+    cur.execute("SELECT pg_notify('listing_events', json_build_object('type', 'listing', 'op', 'bulk_insert', 'count', %s)::text)",
+                (count,))
+
+
+def insert_values(conn, rows, page_size=1000):
+    """Multi-row INSERT of validated rows; returns the new listing ids in row order. Caller commits."""
+    with conn.cursor() as cur:
+        _begin_bulk(cur)
+        ids = execute_values(cur, f"INSERT INTO storage_listings ({', '.join(IMPORT_COLUMNS)}) VALUES %s RETURNING listing_id",
+                             rows, page_size=page_size, fetch=True)
+        _announce(cur, len(rows))
+    return [row[0] for row in ids]
+
+
+def _copy_field(value):
+    if value is None:
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_rows(conn, rows):
+    """COPY validated rows into storage_listings; returns the row count. Caller commits."""
+    buf = io.StringIO()
+    for row in rows:
+        buf.write('\t'.join(_copy_field(value) for value in row))
+        buf.write('\n')
+    buf.seek(0)
+    with conn.cursor() as cur:
+        _begin_bulk(cur)
+        cur.copy_expert(f"COPY storage_listings ({', '.join(IMPORT_COLUMNS)}) FROM STDIN", buf)
+        count = cur.rowcount
+        _announce(cur, count)
+    return count
+
+
+def generate_rows(count, seed=0):
+    """Synthetic listings around Princeton for load testing."""
+    rng = random.Random(seed)
+    today = date.today()
+    halls = ['Butler', 'Forbes', 'Mathey', 'Rockefeller', 'Whitman', 'Wilson', 'Yeh', 'New College West']
+    for n in range(count):
+        start = today + timedelta(days=rng.randint(1, 60))
+        yield {
+            'title': f"Storage space #{n + 1}",
+            'cost': rng.randint(20, 200),
+            'sq_ft': rng.randint(10, 300),
+            'description': "Generated listing",
+            'latitude': 40.3437 + rng.uniform(-0.02, 0.02),
+            'longitude': -74.6517 + rng.uniform(-0.02, 0.02),
+            'start_date': start.isoformat(),
+            'end_date': (start + timedelta(days=rng.randint(30, 120))).isoformat(),
+            'hall_name': rng.choice(halls),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import storage listings from JSON or CSV")
+    parser.add_argument('path', nargs='?', help="JSON (list or {\"listings\": [...]}) or CSV file; - for stdin")
+    parser.add_argument('--format', choices=['json', 'csv'], help="default: from the file extension")
+    parser.add_argument('--generate', type=int, metavar='N', help="import N synthetic listings instead of a file")
+    parser.add_argument('--owner', help="owner_id for rows that do not set one")
+    parser.add_argument('--atomic', action='store_true', help="import nothing if any row is invalid")
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'))
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("set DATABASE_URL or pass --database-url")
+    if bool(args.path) == bool(args.generate):
+        parser.error("give a file or --generate N")
+
+    started = time.perf_counter()
+    if args.generate:
+        rows = list(generate_rows(args.generate))
+    else:
+        text = sys.stdin.read() if args.path == '-' else open(args.path, encoding='utf-8-sig').read()
+        fmt = args.format or ('csv' if args.path.lower().endswith('.csv') else 'json')
+        if fmt == 'csv':
+            rows = parse_csv(text)
+        else:
+            rows = json.loads(text)
+            rows = rows.get('listings', []) if isinstance(rows, dict) else rows
+    valid, _, errors = validate_rows(rows, owner_id=args.owner, allow_owner_override=True)
+    for error in errors[:50]:
+        print(f"row {error['row']}: {error['error']}", file=sys.stderr)
+    if len(errors) > 50:
+        print(f"... and {len(errors) - 50} more invalid rows", file=sys.stderr)
+    if errors and args.atomic:
+        print(f"{len(errors)} invalid rows; nothing imported (--atomic)", file=sys.stderr)
+        return 1
+
+    import psycopg2
+    conn = psycopg2.connect(args.database_url)
+    try:
+        count = copy_rows(conn, valid) if valid else 0
+        conn.commit()
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - started
+    print(f"Imported {count} listings ({len(errors)} rejected) in {elapsed:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,266 @@
+# Query-string filtering, sorting and keyset pagination for GET /api/listings.
+#
+# Every filter becomes a parameterized SQL predicate so the database (and its
+# indexes) does the work. Pagination is keyset-based: the cursor carries the
+# sort key and listing_id of the last row served, so fetching page N costs the
+# same as page 1 no matter how many listings exist.
+
+import base64
+import json
+import math
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+# sort name -> (SQL key expression, direction, cast used when reading a cursor)
+# The key expressions match the indexes in migrations/0001_baseline.sql.
+SORTS = {
+    'newest': ('created_at', 'DESC', 'timestamp'),
+    'oldest': ('created_at', 'ASC', 'timestamp'),
+    'cost_asc': ('COALESCE(cost, 0)', 'ASC', 'numeric'),
+    'cost_desc': ('COALESCE(cost, 0)', 'DESC', 'numeric'),
+    'sq_ft_asc': ('COALESCE(sq_ft, 0)', 'ASC', 'integer'),
+    'sq_ft_desc': ('COALESCE(sq_ft, 0)', 'DESC', 'integer'),
+    'remaining_space_desc': ('COALESCE(remaining_space, 0)', 'DESC', 'integer'),
+    # Key expression depends on the search point; see ListingQuery.sort_key
+    'distance': (None, 'ASC', 'double precision'),
+}
+DEFAULT_SORT = 'newest'
+MAX_PAGE_SIZE = 200
+
+EARTH_RADIUS_MI = 3958.8
+# Sort key for listings without coordinates: farther than any point on Earth, so they come
+# last and still have a non-NULL key for the keyset comparison (like COALESCE(cost, 0))
+NO_DISTANCE_MI = 1e9
+MILES_PER_DEGREE_LAT = 69.0
+MAX_RADIUS_MI = 500
+
+# query param -> (SQL expression, operator, parser)
+RANGE_FILTERS = {
+    'min_cost': ('cost', '>=', Decimal),
+    'max_cost': ('cost', '<=', Decimal),
+    'min_sq_ft': ('sq_ft', '>=', int),
+    'max_sq_ft': ('sq_ft', '<=', int),
+    'min_remaining_space': ('remaining_space', '>=', int),
+    'max_remaining_space': ('remaining_space', '<=', int),
+}
+
+# Any of these switches the request into filtered/paginated mode
+QUERY_PARAMS = set(RANGE_FILTERS) | {
+    'limit', 'cursor', 'sort', 'available', 'available_from', 'available_to', 'min_rating',
+    'lat', 'lng', 'radius_mi', 'bbox',
+}
+
+
+class ListingQueryError(ValueError):
+    """A query parameter could not be parsed; reported to the client as a 400."""
+
+
+def _parse(args, name, parser):
+    raw = args.get(name)
+    if raw is None or raw == '':
+        return None
+    try:
+        return parser(raw)
+    except (ValueError, TypeError, InvalidOperation):
+        raise ListingQueryError(f"Invalid value for {name}: {raw}")
+
+
+def _parse_bool(raw):
+    value = raw.strip().lower()
+    if value in ('1', 'true', 'yes'):
+        return True
+    if value in ('0', 'false', 'no'):
+        return False
+    raise ValueError(raw)
+
+
+def _parse_bbox(raw):
+    # west,south,east,north (lng/lat order, as produced by Leaflet's toBBoxString())
+    west, south, east, north = (float(part) for part in raw.split(','))
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        raise ValueError(raw)
+    return west, south, east, north
+
+
+def distance_sql(lat, lng):
+    """Haversine distance in miles from (lat, lng) to each row's latitude/longitude.
+
+    lat/lng are validated floats, so they are inlined as literals; this keeps the
+    expression identical in SELECT, WHERE and ORDER BY without threading params.
+    """
+    return (
+        f"({EARTH_RADIUS_MI * 2!r} * ASIN(SQRT("
+        f"POWER(SIN(RADIANS(latitude - ({lat!r})) / 2), 2) + "
+        f"COS(RADIANS({lat!r})) * COS(RADIANS(latitude)) * "
+        f"POWER(SIN(RADIANS(longitude - ({lng!r})) / 2), 2))))"
+    )
+
+
+def radius_bbox(lat, lng, radius_mi):
+    """Bounding box (west, south, east, north) enclosing a circle, used to hit the lat/lng index."""
+    dlat = radius_mi / MILES_PER_DEGREE_LAT
+    cos_lat = max(math.cos(math.radians(lat)), 0.01)
+    dlng = radius_mi / (MILES_PER_DEGREE_LAT * cos_lat)
+    south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    if dlng >= 180.0:
+        return -180.0, south, 180.0, north
+    # Wrap into [-180, 180]; west > east then means the box crosses the antimeridian
+    west = (lng - dlng + 180.0) % 360.0 - 180.0
+    east = (lng + dlng + 180.0) % 360.0 - 180.0
+    return west, south, east, north
+
+
+def encode_cursor(sort, key, listing_id):
+    if hasattr(key, 'isoformat'):
+        key = key.isoformat()
+    elif isinstance(key, Decimal):
+        key = str(key)
+    payload = json.dumps([sort, key, listing_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort, key, listing_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        listing_id = int(listing_id)
+    except Exception:
+        raise ListingQueryError("Invalid cursor")
+    if cursor_sort != sort:
+        raise ListingQueryError("Cursor does not match the requested sort order")
+    return key, listing_id
+
+
+class ListingQuery:
+    """Parsed /api/listings query string."""
+
+    def __init__(self, args):
+        self.lat = _parse(args, 'lat', float)
+        self.lng = _parse(args, 'lng', float)
+        if (self.lat is None) != (self.lng is None):
+            raise ListingQueryError("lat and lng must be given together")
+        if self.lat is not None and not (-90 <= self.lat <= 90 and -180 <= self.lng <= 180):
+            raise ListingQueryError("lat/lng out of range")
+        self.radius_mi = _parse(args, 'radius_mi', float)
+        if self.radius_mi is not None:
+            if self.lat is None:
+                raise ListingQueryError("radius_mi requires lat and lng")
+            if not 0 < self.radius_mi <= MAX_RADIUS_MI:
+                raise ListingQueryError(f"radius_mi must be between 0 and {MAX_RADIUS_MI}")
+        self.bbox = _parse(args, 'bbox', _parse_bbox)
+
+        # Searches around a point come back nearest-first unless told otherwise
+        self.sort = args.get('sort') or ('distance' if self.lat is not None else DEFAULT_SORT)
+        if self.sort == 'distance' and self.lat is None:
+            raise ListingQueryError("sort=distance requires lat and lng")
+        if self.sort not in SORTS:
+            raise ListingQueryError(f"Invalid sort: {self.sort}. Expected one of: {', '.join(SORTS)}")
+        self.limit = _parse(args, 'limit', int)
+        if self.limit is not None:
+            if self.limit <= 0:
+                raise ListingQueryError("limit must be positive")
+            self.limit = min(self.limit, MAX_PAGE_SIZE)
+        self.cursor = None
+        if args.get('cursor'):
+            self.cursor = decode_cursor(args['cursor'], self.sort)
+            if self.limit is None:
+                self.limit = MAX_PAGE_SIZE
+        self.ranges = {name: _parse(args, name, parser) for name, (_, _, parser) in RANGE_FILTERS.items()}
+        self.available = _parse(args, 'available', _parse_bool)
+        self.available_from = _parse(args, 'available_from', date.fromisoformat)
+        self.available_to = _parse(args, 'available_to', date.fromisoformat)
+        if self.available_from and self.available_to and self.available_from > self.available_to:
+            raise ListingQueryError("available_from must not be after available_to")
+        self.min_rating = _parse(args, 'min_rating', float)
+
+    @staticmethod
+    def requested(args):
+        """True if the client used any of the server-side query params."""
+        return any(name in args for name in QUERY_PARAMS)
+
+    @property
+    def sort_key(self):
+        if self.sort == 'distance':
+            return f"COALESCE({self.distance_expr}, {NO_DISTANCE_MI!r})"
+        return SORTS[self.sort][0]
+
+    @property
+    def distance_expr(self):
+        """SQL for the distance from the search point, or None without lat/lng."""
+        if self.lat is None:
+            return None
+        return distance_sql(self.lat, self.lng)
+
+    def _bbox_clauses(self, bbox, params):
+        west, south, east, north = bbox
+        # latitude first so the (latitude, longitude) btree index can range-scan
+        clauses = ["latitude BETWEEN %s AND %s"]
+        params.extend([south, north])
+        if west <= east:
+            clauses.append("longitude BETWEEN %s AND %s")
+            params.extend([west, east])
+        else:
+            # Box crosses the antimeridian
+            clauses.append("(longitude >= %s OR longitude <= %s)")
+            params.extend([west, east])
+        return clauses
+
+    def where(self, table, rating_stats=False):
+        """(SQL predicate, params) for the filters; `table` is the storage_listings TableInfo.
+
+        With `rating_stats` the query LEFT JOINs lender_rating_stats (lender_ratings.rating_join)
+        and min_rating filters on it; otherwise the reviews are aggregated.
+        """
+        clauses = []
+        params = []
+        for name, value in self.ranges.items():
+            if value is None:
+                continue
+            column, op, _ = RANGE_FILTERS[name]
+            if table.has(column):
+                clauses.append(f"{column} {op} %s")
+                params.append(value)
+        if self.available is not None:
+            has_flag = table.has('is_available')
+            if self.available:
+                clauses.append("COALESCE(remaining_space, 0) > 0" + (" AND COALESCE(is_available, TRUE)" if has_flag else ""))
+            else:
+                clauses.append("(COALESCE(remaining_space, 0) <= 0" + (" OR NOT COALESCE(is_available, TRUE))" if has_flag else ")"))
+        # Listing window must overlap the requested window
+        if self.available_to is not None:
+            clauses.append("(start_date IS NULL OR start_date <= %s)")
+            params.append(self.available_to)
+        if self.available_from is not None:
+            clauses.append("(end_date IS NULL OR end_date >= %s)")
+            params.append(self.available_from)
+        if self.min_rating is not None and rating_stats:
+            # Lenders without reviews have no stats row, so the NULL fails the comparison
+            clauses.append("lender_rating_stats.avg_rating >= %s")
+            params.append(self.min_rating)
+        elif self.min_rating is not None:
+            clauses.append("""LOWER(owner_id) IN (
+                        SELECT LOWER(lender_username) FROM lender_reviews
+                        GROUP BY LOWER(lender_username)
+                        HAVING AVG(rating) >= %s)""")
+            params.append(self.min_rating)
+        if self.bbox is not None:
+            clauses.extend(self._bbox_clauses(self.bbox, params))
+        if self.radius_mi is not None:
+            # Cheap indexed box first, exact great-circle distance second
+            clauses.extend(self._bbox_clauses(radius_bbox(self.lat, self.lng, self.radius_mi), params))
+            clauses.append(f"{self.distance_expr} <= %s")
+            params.append(self.radius_mi)
+        if self.cursor is not None:
+            _, direction, cast = SORTS[self.sort]
+            op = '<' if direction == 'DESC' else '>'
+            clauses.append(f"({self.sort_key}, listing_id) {op} (%s::{cast}, %s)")
+            params.extend(self.cursor)
+        return (" AND ".join(clauses) if clauses else "TRUE"), params
+
+    def order_by(self):
+        _, direction, _ = SORTS[self.sort]
+        return f"{self.sort_key} {direction}, listing_id {direction}"
+
+    def limit_clause(self):
+        # One extra row tells us whether there is a next page
+        return f"LIMIT {self.limit + 1}" if self.limit is not None else ""
@@ -0,0 +1,189 @@
+# Structured, non-blocking logging for the API.
+#
+# configure() (called once from app.py) sends every logger through a
+# QueueHandler: the request thread only formats the message and puts the
+# record on a bounded queue, and one listener thread per process writes it to
+# stdout. If the queue is full the record is dropped and counted; a request
+# never waits on log I/O.
+#
+# Records are JSON lines by default (LOG_FORMAT=text for local development):
+#   {"ts": "...", "level": "INFO", "logger": "backend.app", "msg": "...", "pid": 12,
+#    "method": "POST", "path": "/api/listings", ...any extra= fields}
+#
+# Levels: LOG_LEVEL is the default (INFO) and LOG_LEVELS overrides it per
+# module, e.g. LOG_LEVELS=backend.app=DEBUG,backend.events=WARNING.
+#
+# Sampling: high-volume debug events are logged with extra={'sample': '<event>'}
+# and only one in N of them is kept, N from LOG_SAMPLE (e.g. query=1000) or
+# LOG_SAMPLE_DEFAULT (100). The sampled events in app.py are 'query' (each
+# statement's SQL), 'reserve' (reservation payloads) and 'uploads' (file
+# serving progress).
+
+import atexit
+import copy
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+
+# LogRecord attributes that are not user-supplied extra= fields
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'sample'}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'pid': record.process,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SampleFilter(logging.Filter):
+    """Keeps one in N records per `sample` event name; records without one always pass."""
+
+    def __init__(self, rates, default_rate=100):
+        super().__init__()
+        self.rates = dict(rates)
+        self.default_rate = default_rate
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        event = getattr(record, 'sample', None)
+        if event is None:
+            return True
+        rate = self.rates.get(event, self.default_rate)
+        if rate <= 1:
+            return True
+        counter = self._counters.get(event)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(event, itertools.count())
+        return next(counter) % rate == 0
+
+
+class RequestContextFilter(logging.Filter):
+    """Adds the method and path of the Flask request being handled, if any."""
+
+    def filter(self, record):
+        try:
+            from flask import has_request_context, request
+            if has_request_context():
+                record.method = request.method
+                record.path = request.path
+        except ImportError:
+            pass
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking (or erroring) when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve the message and traceback here, in the calling thread; the
+        # listener only serializes and writes
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _parse_pairs(value):
+    pairs = {}
+    for item in (value or '').split(','):
+        name, _, setting = item.partition('=')
+        if name.strip() and setting.strip():
+            pairs[name.strip()] = setting.strip()
+    return pairs
+
+
+_handler = None
+_listener = None
+_lock = threading.Lock()
+
+
+def _output_handler():
+    stream = logging.StreamHandler(sys.stdout)
+    if os.environ.get('LOG_FORMAT', 'json').lower() == 'text':
+        stream.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    else:
+        stream.setFormatter(JsonFormatter())
+    return stream
+
+
+def _start_listener():
+    global _listener
+    _handler.queue = queue.Queue(maxsize=int(os.environ.get('LOG_QUEUE_SIZE', 10000)))
+    _listener = logging.handlers.QueueListener(_handler.queue, _output_handler(), respect_handler_level=False)
+    _listener.start()
+
+
+def configure():
+    """Route all logging through the queue; safe to call more than once."""
+    global _handler
+    with _lock:
+        if _handler is not None:
+            return
+        _handler = DroppingQueueHandler(None)
+        _handler.addFilter(SampleFilter({name: int(rate) for name, rate in _parse_pairs(os.environ.get('LOG_SAMPLE')).items()},
+                                        default_rate=int(os.environ.get('LOG_SAMPLE_DEFAULT', 100))))
+        _handler.addFilter(RequestContextFilter())
+        _start_listener()
+
+        root = logging.getLogger()
+        root.handlers = [_handler]
+        root.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+        for name, level in _parse_pairs(os.environ.get('LOG_LEVELS')).items():
+            logging.getLogger(name).setLevel(level.upper())
+        atexit.register(shutdown)
+
+
+def shutdown():
+    """Write out whatever is still queued."""
+    if _listener is not None:
+        _listener.stop()
+
+
+def stats():
+    return {
+        'queued': _handler.queue.qsize() if _handler is not None else 0,
+        'dropped': _handler.dropped if _handler is not None else 0,
+    }
+
+
+def _after_fork():
+    # The listener thread does not survive fork(); give the child its own
+    if _handler is not None:
+        _start_listener()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
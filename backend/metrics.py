@@ -0,0 +1,329 @@
+# Per-request instrumentation: timing, SQL statements and Prometheus metrics.
+#
+# start_request()/finish_request() wrap every Flask request (see app.py). While
+# a request is active, cursors from the connection pool (which builds its
+# connections with InstrumentedConnection) add each statement's time and
+# returned rows to it. finish_request() then
+#
+# - sets a Server-Timing header (total, db time, statements, rows)
+# - records per-route histograms and counters in this process's registry
+#
+# and GET /api/admin/metrics renders them in the Prometheus text format.
+# Other modules can see every statement (request or not) through
+# add_statement_observer(); slow_queries.py uses that.
+#
+# Gunicorn runs several workers, and a scrape only reaches one of them, so each
+# worker also writes a snapshot of its registry to METRICS_DIR (at most once
+# per METRICS_FLUSH_INTERVAL seconds) and the endpoint merges the snapshots of
+# every live worker. METRICS_DIR=none keeps metrics per worker.
+
+import contextvars
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import psycopg2.extensions
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+logger = logging.getLogger(__name__)
+_current = contextvars.ContextVar('tigerstorage_request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('started', 'queries', 'db_seconds', 'rows')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+
+
+_statement_observers = []
+
+
+def add_statement_observer(observer):
+    """Call observer(cursor, query, vars, seconds, error) after every statement on a pooled connection."""
+    _statement_observers.append(observer)
+
+
+class _TimedCursorMixin:
+    """Adds statement time and returned rows to the active request, if any, and tells the observers."""
+
+    def _timed(self, method, query, vars, *args):
+        current = _current.get()
+        if current is None and not _statement_observers:
+            return method(query, vars, *args)
+        error = None
+        start = time.perf_counter()
+        try:
+            return method(query, vars, *args)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            if current is not None:
+                current.queries += 1
+                current.db_seconds += elapsed
+                # Rows a SELECT produced; named (server-side) cursors only know after fetching
+                if self.description is not None and self.name is None and self.rowcount > 0:
+                    current.rows += self.rowcount
+            for observer in _statement_observers:
+                observer(self, query, vars, elapsed, error)
+
+    def execute(self, query, vars=None):
+        return self._timed(super().execute, query, vars)
+
+    def executemany(self, query, vars_list):
+        return self._timed(super().executemany, query, vars_list)
+
+    def callproc(self, procname, parameters=None):
+        return self._timed(super().callproc, procname, parameters)
+
+    def copy_expert(self, sql, file, size=8192):
+        return self._timed(super().copy_expert, sql, file, size)
+
+
+_cursor_classes = {}
+_cursor_classes_lock = threading.Lock()
+
+
+def _instrumented(factory):
+    cls = _cursor_classes.get(factory)
+    if cls is None:
+        with _cursor_classes_lock:
+            cls = _cursor_classes.get(factory)
+            if cls is None:
+                cls = _cursor_classes[factory] = type(f'Instrumented{factory.__name__}', (_TimedCursorMixin, factory), {})
+    return cls
+
+
+class InstrumentedConnection(psycopg2.extensions.connection):
+    """psycopg2 connection whose cursors (whatever cursor_factory is asked for) are timed."""
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = _instrumented(factory)
+        return super().cursor(*args, **kwargs)
+
+
+class Registry:
+    """Counters and histograms keyed by metric name and label values."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}  # name -> {'type', 'help', 'labels', 'buckets', 'series': {label values: values}}
+
+    def counter(self, name, help_text, labels):
+        self._metrics[name] = {'type': 'counter', 'help': help_text, 'labels': list(labels), 'series': {}}
+
+    def histogram(self, name, help_text, labels, buckets):
+        self._metrics[name] = {'type': 'histogram', 'help': help_text, 'labels': list(labels),
+                               'buckets': list(buckets), 'series': {}}
+
+    def inc(self, name, label_values, amount=1):
+        with self._lock:
+            series = self._metrics[name]['series']
+            series[label_values] = series.get(label_values, 0) + amount
+
+    def observe(self, name, label_values, value):
+        metric = self._metrics[name]
+        with self._lock:
+            values = metric['series'].get(label_values)
+            if values is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                values = metric['series'][label_values] = [0] * len(metric['buckets']) + [0.0, 0]
+            for i, bound in enumerate(metric['buckets']):
+                if value <= bound:
+                    values[i] += 1
+                    break
+            values[-2] += value
+            values[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(metric, series=[[list(labels), values if metric['type'] == 'counter' else list(values)]
+                                               for labels, values in metric['series'].items()])
+                    for name, metric in self._metrics.items()}
+
+
+def merge(snapshots):
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, dict(metric, series={}))
+            for labels, values in metric['series']:
+                key = tuple(labels)
+                if metric['type'] == 'counter':
+                    target['series'][key] = target['series'].get(key, 0) + values
+                else:
+                    existing = target['series'].get(key)
+                    target['series'][key] = list(values) if existing is None else [a + b for a, b in zip(existing, values)]
+    return merged
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(merged):
+    """Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for name, metric in sorted(merged.items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for labels, values in sorted(metric['series'].items()):
+            if metric['type'] == 'counter':
+                lines.append(f"{name}{_labels(metric['labels'], labels)} {_number(values)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric['buckets'], values):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{name}_bucket{_labels(metric['labels'], labels, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{name}_bucket{_labels(metric['labels'], labels, le)} {values[-1]}")
+            lines.append(f"{name}_sum{_labels(metric['labels'], labels)} {_number(values[-2])}")
+            lines.append(f"{name}_count{_labels(metric['labels'], labels)} {values[-1]}")
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+ROUTE_LABELS = ('method', 'route')
+registry.counter('tigerstorage_http_requests_total', "Requests handled, by route and status", ROUTE_LABELS + ('status',))
+registry.histogram('tigerstorage_http_request_duration_seconds', "Wall time per request", ROUTE_LABELS, DURATION_BUCKETS)
+registry.histogram('tigerstorage_db_statements_per_request', "SQL statements executed per request", ROUTE_LABELS,
+                   QUERY_COUNT_BUCKETS)
+registry.histogram('tigerstorage_db_duration_seconds', "Time spent in SQL statements per request", ROUTE_LABELS,
+                   DURATION_BUCKETS)
+registry.counter('tigerstorage_db_rows_total', "Rows returned by SELECT statements", ROUTE_LABELS)
+registry.histogram('tigerstorage_http_response_bytes', "Response body size (buffered responses)", ROUTE_LABELS,
+                   BYTES_BUCKETS)
+
+
+class SnapshotDirectory:
+    """Each worker's registry snapshot as <dir>/<pid>.json, merged at scrape time."""
+
+    def __init__(self, directory, interval=1.0):
+        self.directory = directory
+        self.interval = interval
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def maybe_flush(self, registry, force=False):
+        """Write registry.snapshot() for this pid, at most once per interval unless forced."""
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.interval:
+            return
+        if not self._lock.acquire(blocking=not force):
+            return
+        try:
+            self._last_flush = now
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(registry.snapshot(), f)
+            os.replace(tmp, os.path.join(self.directory, f'{os.getpid()}.json'))
+        except OSError as e:
+            logger.warning("Could not write metrics snapshot: %s", e)
+        finally:
+            self._lock.release()
+
+    def other_workers(self):
+        """Snapshots of the other live workers; files left by dead ones are removed."""
+        snapshots = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                pid = int(filename[:-5])
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+                continue
+            except PermissionError:
+                pass
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+
+def _snapshot_directory_from_env():
+    directory = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'tigerstorage-metrics'))
+    if directory.lower() == 'none':
+        return None
+    return SnapshotDirectory(directory, float(os.environ.get('METRICS_FLUSH_INTERVAL', 1.0)))
+
+
+ENABLED = os.environ.get('METRICS', 'on').lower() != 'off'
+snapshots = _snapshot_directory_from_env() if ENABLED else None
+
+
+def start_request():
+    if ENABLED:
+        _current.set(RequestMetrics())
+
+
+def finish_request(request, response):
+    """Record the finished request and add its Server-Timing header; returns the response."""
+    current = _current.get()
+    if current is None:
+        return response
+    _current.set(None)
+    elapsed = time.perf_counter() - current.started
+    # The route template, not the path, so IDs do not create a series each
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    labels = (request.method, route)
+    registry.inc('tigerstorage_http_requests_total', labels + (str(response.status_code),))
+    registry.observe('tigerstorage_http_request_duration_seconds', labels, elapsed)
+    registry.observe('tigerstorage_db_statements_per_request', labels, current.queries)
+    registry.observe('tigerstorage_db_duration_seconds', labels, current.db_seconds)
+    if current.rows:
+        registry.inc('tigerstorage_db_rows_total', labels, current.rows)
+    if not response.is_streamed:
+        registry.observe('tigerstorage_http_response_bytes', labels, response.calculate_content_length() or 0)
+
+    timing = (f'total;dur={elapsed * 1000:.1f}, '
+              f'db;dur={current.db_seconds * 1000:.1f};desc="{current.queries} statements, {current.rows} rows"')
+    existing = response.headers.get('Server-Timing')
+    response.headers['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+    if snapshots is not None:
+        snapshots.maybe_flush(registry)
+    return response
+
+
+def exposition():
+    """Metrics for every live worker (or just this one) in the Prometheus text format."""
+    current = registry.snapshot()
+    others = snapshots.other_workers() if snapshots is not None else []
+    return render(merge([current] + others))
@@ -0,0 +1,163 @@
+# Versioned schema migrations.
+#
+# The schema is owned by the numbered files in backend/migrations/
+# (NNNN_description.sql), applied in order and recorded in schema_migrations
+# with a checksum. Request handlers never create or alter tables.
+#
+# Each migration runs in its own transaction under an advisory lock, so
+# several processes starting at once (gunicorn runs this in its master, see
+# gunicorn.conf.py) apply every migration exactly once. Changing a file after
+# it has been applied is an error; add a new migration instead.
+#
+#   DATABASE_URL=postgresql://... python -m backend.migrate            # apply pending migrations
+#   DATABASE_URL=postgresql://... python -m backend.migrate status
+
+import argparse
+import hashlib
+import logging
+import os
+import re
+import sys
+from collections import namedtuple
+
+import psycopg2
+
+import backend.schema as schema
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+# Arbitrary constant shared by every process that migrates this database
+LOCK_ID = 0x7469676572  # "tiger"
+
+logger = logging.getLogger(__name__)
+
+_FILENAME = re.compile(r'^(\d{4})_(\w+)\.sql$')
+
+Migration = namedtuple('Migration', ['version', 'name', 'path', 'checksum'])
+
+
+class MigrationError(Exception):
+    pass
+
+
+def discover(directory=MIGRATIONS_DIR):
+    """Every migration file in version order."""
+    migrations = {}
+    for filename in os.listdir(directory):
+        match = _FILENAME.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f"Two migrations numbered {version:04d}: {migrations[version].path} and {filename}")
+        path = os.path.join(directory, filename)
+        with open(path, 'rb') as f:
+            checksum = hashlib.sha256(f.read()).hexdigest()
+        migrations[version] = Migration(version, match.group(2), path, checksum)
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def _ensure_table(conn):
+    with conn.cursor() as cur:
+        # Concurrent CREATE TABLE IF NOT EXISTS can still collide; serialize it too
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (LOCK_ID,))
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                checksum CHAR(64) NOT NULL,
+                applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+    conn.commit()
+
+
+def applied(conn):
+    """{version: (name, checksum, applied_at)} of the migrations already run."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT version, name, checksum, applied_at FROM schema_migrations")
+        return {row[0]: row[1:] for row in cur.fetchall()}
+
+
+def _check(migrations, done):
+    known = {m.version: m for m in migrations}
+    for version, (name, checksum, _) in done.items():
+        migration = known.get(version)
+        if migration is None:
+            # Applied by a newer release; harmless as long as this one does not depend on it
+            logger.warning("Database has migration %04d_%s, which this release does not know", version, name)
+        elif migration.checksum != checksum:
+            raise MigrationError(f"{os.path.basename(migration.path)} was changed after it was applied; "
+                                 "add a new migration instead")
+
+
+def migrate(conn, target=None, directory=MIGRATIONS_DIR):
+    """Apply pending migrations (up to `target`, if given); returns the versions applied."""
+    migrations = discover(directory)
+    _ensure_table(conn)
+    ran = []
+    for migration in migrations:
+        if target is not None and migration.version > target:
+            break
+        with conn.cursor() as cur:
+            # Held until this migration commits; a concurrent migrator waits, then sees it applied
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (LOCK_ID,))
+            done = applied(conn)
+            _check(migrations, done)
+            if migration.version in done:
+                conn.rollback()
+                continue
+            logger.info("Applying migration %04d_%s", migration.version, migration.name)
+            with open(migration.path) as f:
+                cur.execute(f.read())
+            cur.execute("INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                        (migration.version, migration.name, migration.checksum))
+        conn.commit()
+        ran.append(migration.version)
+    if ran:
+        # This process's cached introspection predates the new tables/columns
+        schema.registry.set_version(schema.current_version(conn))
+        conn.commit()
+    return ran
+
+
+def migrate_url(url, target=None):
+    conn = psycopg2.connect(url)
+    try:
+        return migrate(conn, target)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply or list schema migrations")
+    parser.add_argument('command', nargs='?', choices=['up', 'status'], default='up')
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'))
+    parser.add_argument('--target', type=int, help="stop after this version")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("set DATABASE_URL or pass --database-url")
+
+    conn = psycopg2.connect(args.database_url)
+    try:
+        if args.command == 'status':
+            _ensure_table(conn)
+            done = applied(conn)
+            for migration in discover():
+                state = f"applied {done[migration.version][2]:%Y-%m-%d %H:%M}" if migration.version in done else "pending"
+                print(f"{migration.version:04d}_{migration.name:40} {state}")
+            return 0
+        ran = migrate(conn, args.target)
+    except MigrationError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+    print(f"Applied {len(ran)} migration(s)" + (f": {', '.join(f'{v:04d}' for v in ran)}" if ran else ""))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
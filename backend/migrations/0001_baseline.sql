@@ -0,0 +1,306 @@
+-- TigerStorage Database Schema (baseline)
+--
+-- The schema as it stood before versioned migrations (formerly backend/database.sql).
+-- Every statement is idempotent, so databases created from the old file can apply
+-- it safely. Do not edit: later changes go in new numbered files.
+
+-- Storage Listings Table
+CREATE TABLE IF NOT EXISTS storage_listings (
+    listing_id SERIAL PRIMARY KEY,
+    title VARCHAR(255) NOT NULL,
+    address VARCHAR(255),
+    cost NUMERIC,
+    sq_ft INTEGER,
+    description TEXT,
+    latitude FLOAT,
+    longitude FLOAT,
+    start_date DATE,
+    end_date DATE,
+    image_url VARCHAR(255),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    owner_id VARCHAR(255),
+    remaining_space INTEGER,
+    is_available BOOLEAN DEFAULT TRUE,
+    hall_name VARCHAR(255),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+-- Tables created by the old inline CREATE TABLE in get_listings stop at owner_id.
+-- A listing without remaining_space had its full sq_ft free, so backfill it from there.
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_schema = current_schema() AND table_name = 'storage_listings'
+                     AND column_name = 'remaining_space') THEN
+        ALTER TABLE storage_listings ADD COLUMN remaining_space INTEGER;
+        UPDATE storage_listings SET remaining_space = sq_ft;
+    END IF;
+END $$;
+ALTER TABLE storage_listings ADD COLUMN IF NOT EXISTS is_available BOOLEAN DEFAULT TRUE;
+ALTER TABLE storage_listings ADD COLUMN IF NOT EXISTS hall_name VARCHAR(255);
+ALTER TABLE storage_listings ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+-- Approvals take space with a conditional UPDATE; this is the backstop against overselling.
+-- Rows oversold before the constraint existed are clamped to 0 so it can be added.
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'storage_listings_remaining_space_check') THEN
+        UPDATE storage_listings SET remaining_space = 0 WHERE remaining_space < 0;
+        ALTER TABLE storage_listings
+            ADD CONSTRAINT storage_listings_remaining_space_check CHECK (remaining_space >= 0);
+    END IF;
+END $$;
+
+-- Reservation Requests Table
+CREATE TABLE IF NOT EXISTS reservation_requests (
+    request_id SERIAL PRIMARY KEY,
+    listing_id INTEGER REFERENCES storage_listings(listing_id) ON DELETE CASCADE,
+    renter_username VARCHAR(255) NOT NULL,
+    requested_space INTEGER NOT NULL,
+    approved_space INTEGER,
+    status VARCHAR(50) DEFAULT 'pending',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP
+);
+
+-- Reported Listings Table
+CREATE TABLE IF NOT EXISTS reported_listings (
+    report_id SERIAL PRIMARY KEY,
+    listing_id INTEGER REFERENCES storage_listings(listing_id) ON DELETE CASCADE,
+    lender_id VARCHAR(255),
+    renter_id VARCHAR(255),
+    reason TEXT NOT NULL,
+    status VARCHAR(50) DEFAULT 'pending',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Lender Reviews Table
+CREATE TABLE IF NOT EXISTS lender_reviews (
+    review_id SERIAL PRIMARY KEY,
+    lender_username VARCHAR(255) NOT NULL,
+    renter_username VARCHAR(255) NOT NULL,
+    request_id INTEGER REFERENCES reservation_requests(request_id) ON DELETE CASCADE,
+    rating INTEGER NOT NULL CHECK (rating >= 1 AND rating <= 5),
+    review_text TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Per-lender rating aggregates, kept in step with lender_reviews by trigger so the
+-- listing feed joins one row per lender instead of aggregating every review.
+-- Keyed by lowercased username; histogram[n] counts n-star reviews.
+-- Rebuild with: python -m backend.lender_ratings rebuild
+CREATE TABLE IF NOT EXISTS lender_rating_stats (
+    lender_username VARCHAR(255) PRIMARY KEY,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    avg_rating DOUBLE PRECISION GENERATED ALWAYS AS (rating_sum::double precision / NULLIF(review_count, 0)) STORED,
+    histogram INTEGER[] NOT NULL DEFAULT '{0,0,0,0,0}'
+);
+
+-- Listing change log (feeds GET /api/listings/changes)
+-- One row per insert/update/delete of a listing. txid is the writing transaction's
+-- id: a client cursor is the snapshot xmin at its last poll, and every transaction
+-- that had not committed by then has txid >= xmin, so nothing is skipped.
+CREATE TABLE IF NOT EXISTS listing_changes (
+    change_id BIGSERIAL PRIMARY KEY,
+    listing_id INTEGER NOT NULL,
+    op CHAR(1) NOT NULL CHECK (op IN ('I', 'U', 'D')),
+    txid BIGINT NOT NULL DEFAULT txid_current(),
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION storage_listings_touch() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        NEW.updated_at := CURRENT_TIMESTAMP;
+    ELSIF NEW IS DISTINCT FROM OLD THEN
+        NEW.updated_at := CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION storage_listings_log_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO listing_changes (listing_id, op) VALUES (OLD.listing_id, 'D');
+        RETURN OLD;
+    END IF;
+    IF TG_OP = 'UPDATE' AND NEW IS NOT DISTINCT FROM OLD THEN
+        RETURN NEW;
+    END IF;
+    INSERT INTO listing_changes (listing_id, op) VALUES (NEW.listing_id, LEFT(TG_OP, 1));
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS storage_listings_touch ON storage_listings;
+CREATE TRIGGER storage_listings_touch BEFORE INSERT OR UPDATE ON storage_listings
+    FOR EACH ROW EXECUTE FUNCTION storage_listings_touch();
+DROP TRIGGER IF EXISTS storage_listings_log_change ON storage_listings;
+CREATE TRIGGER storage_listings_log_change AFTER UPDATE OR DELETE ON storage_listings
+    FOR EACH ROW EXECUTE FUNCTION storage_listings_log_change();
+
+-- Inserts are logged once per statement from the transition table, so bulk imports
+-- write the change log in one INSERT ... SELECT instead of one trigger call per row
+CREATE OR REPLACE FUNCTION storage_listings_log_inserts() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO listing_changes (listing_id, op) SELECT listing_id, 'I' FROM inserted_rows;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS storage_listings_log_inserts ON storage_listings;
+CREATE TRIGGER storage_listings_log_inserts AFTER INSERT ON storage_listings
+    REFERENCING NEW TABLE AS inserted_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION storage_listings_log_inserts();
+
+-- Live availability events (LISTEN listing_events; streamed by GET /api/listings/stream)
+-- Payloads carry ids and availability only, never usernames, since every client sees them.
+CREATE OR REPLACE FUNCTION notify_listing_event() RETURNS trigger AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'storage_listings' THEN
+        -- Bulk imports send one summary event instead of one per row (see backend/listing_import.py)
+        IF current_setting('tigerstorage.bulk_import', true) = 'on' THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP = 'DELETE' THEN
+            PERFORM pg_notify('listing_events', json_build_object(
+                'type', 'listing', 'op', 'delete', 'listing_id', OLD.listing_id)::text);
+            RETURN OLD;
+        END IF;
+        IF TG_OP = 'UPDATE' AND NEW IS NOT DISTINCT FROM OLD THEN
+            RETURN NEW;
+        END IF;
+        PERFORM pg_notify('listing_events', json_build_object(
+            'type', 'listing', 'op', lower(TG_OP), 'listing_id', NEW.listing_id,
+            'remaining_space', NEW.remaining_space, 'is_available', NEW.is_available)::text);
+        RETURN NEW;
+    END IF;
+    -- reservation_requests
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('listing_events', json_build_object(
+            'type', 'reservation', 'op', 'delete', 'listing_id', OLD.listing_id,
+            'request_id', OLD.request_id)::text);
+        RETURN OLD;
+    END IF;
+    IF TG_OP = 'UPDATE' AND NEW.status IS NOT DISTINCT FROM OLD.status THEN
+        RETURN NEW;
+    END IF;
+    PERFORM pg_notify('listing_events', json_build_object(
+        'type', 'reservation', 'op', lower(TG_OP), 'listing_id', NEW.listing_id,
+        'request_id', NEW.request_id, 'status', NEW.status)::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS storage_listings_notify ON storage_listings;
+CREATE TRIGGER storage_listings_notify AFTER INSERT OR UPDATE OR DELETE ON storage_listings
+    FOR EACH ROW EXECUTE FUNCTION notify_listing_event();
+DROP TRIGGER IF EXISTS reservation_requests_notify ON reservation_requests;
+CREATE TRIGGER reservation_requests_notify AFTER INSERT OR UPDATE OR DELETE ON reservation_requests
+    FOR EACH ROW EXECUTE FUNCTION notify_listing_event();
+
+CREATE OR REPLACE FUNCTION lender_rating_stats_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE lender_rating_stats
+        SET review_count = review_count - 1,
+            rating_sum = rating_sum - OLD.rating,
+            histogram[OLD.rating] = histogram[OLD.rating] - 1
+        WHERE lender_username = LOWER(OLD.lender_username);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO lender_rating_stats AS s (lender_username, review_count, rating_sum, histogram)
+        VALUES (LOWER(NEW.lender_username), 1, NEW.rating,
+                ARRAY(SELECT (n = NEW.rating)::int FROM generate_series(1, 5) AS n))
+        ON CONFLICT (lender_username) DO UPDATE
+        SET review_count = s.review_count + 1,
+            rating_sum = s.rating_sum + NEW.rating,
+            histogram[NEW.rating] = s.histogram[NEW.rating] + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS lender_reviews_rating_stats ON lender_reviews;
+CREATE TRIGGER lender_reviews_rating_stats AFTER INSERT OR DELETE OR UPDATE OF lender_username, rating ON lender_reviews
+    FOR EACH ROW EXECUTE FUNCTION lender_rating_stats_apply();
+
+-- Backfill lenders reviewed before the stats table existed
+INSERT INTO lender_rating_stats (lender_username, review_count, rating_sum, histogram)
+SELECT LOWER(lender_username), COUNT(*), SUM(rating),
+       ARRAY[COUNT(*) FILTER (WHERE rating = 1), COUNT(*) FILTER (WHERE rating = 2), COUNT(*) FILTER (WHERE rating = 3),
+             COUNT(*) FILTER (WHERE rating = 4), COUNT(*) FILTER (WHERE rating = 5)]::int[]
+FROM lender_reviews
+GROUP BY LOWER(lender_username)
+ON CONFLICT (lender_username) DO NOTHING;
+
+-- Per-table generation counters (ETags for the polled GET endpoints)
+-- Bumped once per writing statement, so reading them is a single primary-key lookup.
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name VARCHAR(63) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO table_versions (table_name)
+VALUES ('storage_listings'), ('reservation_requests'), ('lender_reviews')
+ON CONFLICT (table_name) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE table_versions
+    SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE table_name = TG_TABLE_NAME;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS storage_listings_bump_version ON storage_listings;
+CREATE TRIGGER storage_listings_bump_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON storage_listings
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+DROP TRIGGER IF EXISTS reservation_requests_bump_version ON reservation_requests;
+CREATE TRIGGER reservation_requests_bump_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON reservation_requests
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+DROP TRIGGER IF EXISTS lender_reviews_bump_version ON lender_reviews;
+CREATE TRIGGER lender_reviews_bump_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON lender_reviews
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+
+-- Indexes for better query performance
+CREATE INDEX IF NOT EXISTS idx_storage_listings_owner ON storage_listings(owner_id);
+CREATE INDEX IF NOT EXISTS idx_reservation_requests_renter ON reservation_requests(renter_username);
+CREATE INDEX IF NOT EXISTS idx_reported_listings_status ON reported_listings(status);
+CREATE INDEX IF NOT EXISTS idx_lender_reviews_lender ON lender_reviews(lender_username);
+-- Keyset pagination of a lender's reviews, newest first
+CREATE INDEX IF NOT EXISTS idx_lender_reviews_lender_created ON lender_reviews(lender_username, created_at, review_id);
+
+-- One pending request per renter per listing (reserve_space relies on this instead of a
+-- check-then-insert). Older duplicate pending requests are expired so the index can be built.
+UPDATE reservation_requests r SET status = 'expired', updated_at = CURRENT_TIMESTAMP
+WHERE r.status = 'pending' AND EXISTS (
+    SELECT 1 FROM reservation_requests newer
+    WHERE newer.listing_id = r.listing_id AND newer.renter_username = r.renter_username
+      AND newer.status = 'pending' AND newer.request_id > r.request_id
+);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_reservation_requests_pending
+    ON reservation_requests(listing_id, renter_username) WHERE status = 'pending';
+
+-- Keyset pagination / sorting for GET /api/listings (expressions match backend/listing_query.py)
+CREATE INDEX IF NOT EXISTS idx_storage_listings_created ON storage_listings(created_at, listing_id);
+CREATE INDEX IF NOT EXISTS idx_storage_listings_cost ON storage_listings((COALESCE(cost, 0)), listing_id);
+CREATE INDEX IF NOT EXISTS idx_storage_listings_sq_ft ON storage_listings((COALESCE(sq_ft, 0)), listing_id);
+CREATE INDEX IF NOT EXISTS idx_storage_listings_remaining ON storage_listings((COALESCE(remaining_space, 0)), listing_id);
+-- Date-window overlap filter
+CREATE INDEX IF NOT EXISTS idx_storage_listings_dates ON storage_listings(start_date, end_date);
+-- Radius / bounding-box search: latitude range scan, longitude checked from the index
+CREATE INDEX IF NOT EXISTS idx_storage_listings_lat_lng ON storage_listings(latitude, longitude);
+-- Delta feed lookups and pruning
+CREATE INDEX IF NOT EXISTS idx_listing_changes_txid ON listing_changes(txid);
+CREATE INDEX IF NOT EXISTS idx_listing_changes_changed_at ON listing_changes(changed_at);
+
+-- Comments for documentation
+COMMENT ON TABLE storage_listings IS 'Stores all storage space listings';
+COMMENT ON TABLE reservation_requests IS 'Manages storage space reservation requests';
+COMMENT ON TABLE reported_listings IS 'Tracks reported problematic listings';
+COMMENT ON TABLE lender_reviews IS 'Stores reviews given by renters to lenders';
+COMMENT ON TABLE listing_changes IS 'Change log of storage_listings for incremental map polling';
+COMMENT ON TABLE lender_rating_stats IS 'Per-lender review count, sum, average and histogram maintained from lender_reviews';
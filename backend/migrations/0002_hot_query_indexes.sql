@@ -0,0 +1,26 @@
+-- Indexes for the per-user and per-listing lookups the request handlers run on
+-- every page load. Each one matches a predicate (and sort) in backend/app.py;
+-- python -m backend.benchmarks.explain_check verifies they are used at scale.
+
+-- get_my_listings: WHERE LOWER(owner_id) = %s ORDER BY created_at DESC
+CREATE INDEX IF NOT EXISTS idx_storage_listings_owner_lower_created
+    ON storage_listings (LOWER(owner_id), created_at DESC);
+
+-- get_my_reservation_requests: WHERE renter_username = %s ORDER BY created_at DESC.
+-- Replaces the single-column renter index, which this one covers.
+CREATE INDEX IF NOT EXISTS idx_reservation_requests_renter_created
+    ON reservation_requests (renter_username, created_at DESC);
+DROP INDEX IF EXISTS idx_reservation_requests_renter;
+
+-- Requests for one listing (interested renters, the lender's request list, recomputing
+-- remaining_space) and the per-renter status checks on a listing; also serves the
+-- ON DELETE CASCADE from storage_listings
+CREATE INDEX IF NOT EXISTS idx_reservation_requests_listing_renter_status
+    ON reservation_requests (listing_id, renter_username, status);
+
+-- submit_lender_review: one review per reservation (WHERE request_id = %s); also
+-- serves the ON DELETE CASCADE from reservation_requests
+CREATE INDEX IF NOT EXISTS idx_lender_reviews_request ON lender_reviews (request_id);
+
+-- report_listing: one report per renter per listing; also serves the ON DELETE CASCADE
+CREATE INDEX IF NOT EXISTS idx_reported_listings_listing_renter ON reported_listings (listing_id, renter_id);
@@ -0,0 +1,22 @@
+-- Image upload jobs (see backend/uploads.py). POST /api/upload records a job
+-- and returns its id; a background worker in the same gunicorn worker resizes
+-- the image and uploads the variants, and GET /api/upload/<job_id> (answered
+-- by any worker) reports the progress from this table.
+
+CREATE TABLE IF NOT EXISTS upload_jobs (
+    job_id UUID PRIMARY KEY,
+    owner_id VARCHAR(255),
+    filename VARCHAR(255),
+    content_type VARCHAR(50) NOT NULL,
+    -- queued -> processing -> done | failed
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    -- {variant: url}, set when done
+    variants JSONB,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Pruning finished jobs
+CREATE INDEX IF NOT EXISTS idx_upload_jobs_updated ON upload_jobs (updated_at);
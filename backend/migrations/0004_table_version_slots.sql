@@ -0,0 +1,69 @@
+-- table_versions without a single hot row per table.
+--
+-- Every writing statement used to UPDATE the one table_versions row of its
+-- table, so concurrent writers queued on that row's lock until commit, and
+-- statements that matched no rows (a conditional UPDATE that lost its race)
+-- still changed the ETags.
+--
+-- Each table now has SLOTS counter rows; a statement bumps the slot picked by
+-- its backend pid, so only writers on the same slot wait for each other. The
+-- version is the sum over the slots (backend/conditional.py), which grows with
+-- every committed bump. Insert/update/delete triggers see the statement's rows
+-- through a transition table and skip the bump when there are none.
+
+ALTER TABLE table_versions ADD COLUMN IF NOT EXISTS slot SMALLINT NOT NULL DEFAULT 0;
+ALTER TABLE table_versions DROP CONSTRAINT IF EXISTS table_versions_pkey;
+ALTER TABLE table_versions ADD PRIMARY KEY (table_name, slot);
+
+-- 16 slots per table
+INSERT INTO table_versions (table_name, slot)
+SELECT table_name, slot
+FROM (VALUES ('storage_listings'), ('reservation_requests'), ('lender_reviews')) AS t (table_name),
+     generate_series(0, 15) AS slot
+ON CONFLICT (table_name, slot) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'TRUNCATE' THEN
+        -- changed_rows is the transition table; nested so TRUNCATE never plans it
+        IF NOT EXISTS (SELECT 1 FROM changed_rows) THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+    UPDATE table_versions
+    SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE table_name = TG_TABLE_NAME AND slot = pg_backend_pid() % 16;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables need one trigger per event
+DROP TRIGGER IF EXISTS storage_listings_bump_version ON storage_listings;
+CREATE TRIGGER storage_listings_bump_version_insert AFTER INSERT ON storage_listings
+    REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+CREATE TRIGGER storage_listings_bump_version_update AFTER UPDATE ON storage_listings
+    REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+CREATE TRIGGER storage_listings_bump_version_delete AFTER DELETE ON storage_listings
+    REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+CREATE TRIGGER storage_listings_bump_version_truncate AFTER TRUNCATE ON storage_listings
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+
+DROP TRIGGER IF EXISTS reservation_requests_bump_version ON reservation_requests;
+CREATE TRIGGER reservation_requests_bump_version_insert AFTER INSERT ON reservation_requests
+    REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+CREATE TRIGGER reservation_requests_bump_version_update AFTER UPDATE ON reservation_requests
+    REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+CREATE TRIGGER reservation_requests_bump_version_delete AFTER DELETE ON reservation_requests
+    REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+CREATE TRIGGER reservation_requests_bump_version_truncate AFTER TRUNCATE ON reservation_requests
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+
+DROP TRIGGER IF EXISTS lender_reviews_bump_version ON lender_reviews;
+CREATE TRIGGER lender_reviews_bump_version_insert AFTER INSERT ON lender_reviews
+    REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+CREATE TRIGGER lender_reviews_bump_version_update AFTER UPDATE ON lender_reviews
+    REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+CREATE TRIGGER lender_reviews_bump_version_delete AFTER DELETE ON lender_reviews
+    REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+CREATE TRIGGER lender_reviews_bump_version_truncate AFTER TRUNCATE ON lender_reviews
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
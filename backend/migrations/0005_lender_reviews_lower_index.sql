@@ -0,0 +1,7 @@
+-- get_lender_reviews matches the lender case-insensitively, like the
+-- lender_rating_stats summary it is shown with (keyed by LOWER(lender_username)):
+-- WHERE LOWER(lr.lender_username) = LOWER(%s) ORDER BY lr.created_at DESC, lr.review_id DESC.
+-- Replaces the case-sensitive keyset index.
+CREATE INDEX IF NOT EXISTS idx_lender_reviews_lower_lender_created
+    ON lender_reviews (LOWER(lender_username), created_at, review_id);
+DROP INDEX IF EXISTS idx_lender_reviews_lender_created;
@@ -0,0 +1,159 @@
+# Cached information_schema introspection for the tables the API reads.
+#
+# Handlers used to run `SELECT EXISTS ... information_schema.tables` and
+# `SELECT column_name ... information_schema.columns` before every query.
+# The registry loads all tracked tables in one catalog query the first time
+# any of them is needed in this process, and keeps the result (plus the
+# SELECT column lists built from it) until invalidate() is called or the
+# schema version changes.
+#
+# The schema version is the highest migration recorded in schema_migrations
+# (see migrate.py). The registry re-reads it at most every
+# SCHEMA_CHECK_INTERVAL seconds, so a migration applied while the workers are
+# running is picked up without a restart; migrate() also updates it directly
+# in the process that ran the migrations.
+
+import os
+import threading
+import time
+
+TRACKED_TABLES = ('storage_listings', 'reservation_requests', 'lender_reviews', 'reported_listings',
+                  'listing_changes', 'table_versions', 'lender_rating_stats')
+
+
+class TableInfo:
+    def __init__(self, name, columns=None, data_types=None):
+        self.name = name
+        self.columns = list(columns or [])
+        self.data_types = dict(data_types or {})
+        self._column_set = frozenset(self.columns)
+
+    @property
+    def exists(self):
+        return bool(self.columns)
+
+    def has(self, column):
+        return column in self._column_set
+
+
+def current_version(conn):
+    """Highest applied migration, or None before any migration ran."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            return None
+        cur.execute("SELECT MAX(version) FROM schema_migrations")
+        return cur.fetchone()[0]
+
+
+class SchemaRegistry:
+    """`check_interval`: seconds between schema version checks (None never checks)."""
+
+    def __init__(self, tables=TRACKED_TABLES, version=None, check_interval=None):
+        self.tables = tuple(tables)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._info = None
+        self._select_lists = {}
+        self._version = version
+        self._checked_at = None
+        self.loads = 0
+
+    @property
+    def version(self):
+        return self._version
+
+    def invalidate(self):
+        """Forget everything; the next lookup re-introspects."""
+        with self._lock:
+            self._info = None
+            self._select_lists = {}
+
+    def set_version(self, version):
+        """Record the current schema version, invalidating if it changed."""
+        with self._lock:
+            if version == self._version:
+                return
+            self._version = version
+            self._info = None
+            self._select_lists = {}
+
+    def _check_version(self, conn):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        self.set_version(current_version(conn))
+
+    def _load(self, conn):
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT table_name, column_name, data_type
+                FROM information_schema.columns
+                WHERE table_schema = current_schema() AND table_name = ANY(%s)
+                ORDER BY table_name, ordinal_position;
+            """, (list(self.tables),))
+            rows = cur.fetchall()
+        columns = {name: [] for name in self.tables}
+        data_types = {name: {} for name in self.tables}
+        for table_name, column_name, data_type in rows:
+            columns[table_name].append(column_name)
+            data_types[table_name][column_name] = data_type
+        return {name: TableInfo(name, columns[name], data_types[name]) for name in self.tables}
+
+    def table(self, conn, name):
+        """TableInfo for a tracked table, introspecting on first use."""
+        if self.check_interval is not None:
+            self._check_version(conn)
+        info = self._info
+        if info is None:
+            with self._lock:
+                if self._info is None:
+                    self._info = self._load(conn)
+                    self._select_lists = {}
+                    self.loads += 1
+                info = self._info
+        return info.get(name) or TableInfo(name)
+
+    def select_list(self, conn, name, columns):
+        """Comma-separated subset of `columns` that exist on the table, in the given order."""
+        key = (name, tuple(columns))
+        cached = self._select_lists.get(key)
+        if cached is not None:
+            return cached
+        info = self.table(conn, name)
+        cached = ", ".join(col for col in columns if info.has(col))
+        with self._lock:
+            if self._info is not None:
+                self._select_lists[key] = cached
+        return cached
+
+    def stats(self):
+        info = self._info
+        return {
+            'version': self._version,
+            'loaded': info is not None,
+            'loads': self.loads,
+            'cached_select_lists': len(self._select_lists),
+            'tables': {name: (info[name].columns if info else None) for name in self.tables},
+        }
+
+
+def _check_interval():
+    interval = os.environ.get('SCHEMA_CHECK_INTERVAL', '30')
+    return None if interval.lower() == 'off' else float(interval)
+
+
+registry = SchemaRegistry(check_interval=_check_interval())
+
+
+def table(conn, name):
+    return registry.table(conn, name)
+
+
+def select_list(conn, name, columns):
+    return registry.select_list(conn, name, columns)
+
+
+def invalidate():
+    registry.invalidate()
@@ -0,0 +1,256 @@
+# Listing rows -> API dicts -> JSON bytes, in one pass per row.
+#
+# The feed (format_feed_listings), the delta feed and get_my_listings all turn
+# storage_listings rows into the same listing objects. Instead of building a
+# dict per row by column name and then a second dict with .get() calls and
+# type checks, listing_serializer(shape, columns) generates a function for
+# that exact column list: it reads each value by position, and columns the
+# query did not select are compiled in as their defaults. The function is
+# compiled once per (shape, columns) and reused for every row and request.
+#
+# dumps() encodes the result with orjson when it is installed (several times
+# faster than the json module on these lists), keeping the sorted keys and
+# compact separators Flask's jsonify produces.
+#
+# python -m backend.benchmarks.serialization compares this with the old
+# per-row formatting.
+#
+# listing_json_sql() builds the same objects in Postgres instead (the
+# FEED_JSON_MODE=postgres path in app.py): a json_build_object() expression
+# generated from the same field list, with the keys in sorted order and the
+# same conversions, so either mode returns the same JSON document.
+
+import json
+import logging
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the json module
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Listings without coordinates are placed near Princeton, at an offset derived
+# from the listing id so the same listing always lands in the same spot (and
+# responses stay cacheable). Plain integer arithmetic so listing_json_sql can
+# compute the identical float in SQL.
+PRINCETON_LAT = 40.3437
+PRINCETON_LNG = -74.6517
+_LAT_STEP, _LNG_STEP = 7919, 104729
+
+
+def default_location(listing_id):
+    listing_id = listing_id or 0
+    return (PRINCETON_LAT + (listing_id * _LAT_STEP % 1000) / 100000.0 - 0.005,
+            PRINCETON_LNG + (listing_id * _LNG_STEP % 1000) / 100000.0 - 0.005)
+
+
+# Output key -> (column, value when the column was not selected, conversion)
+# Conversions: None (as is), 'float0' (float, NULL -> 0), 'iso' (date/time -> ISO string)
+LISTING_FIELDS = [
+    ('id', 'listing_id', None, None),
+    ('title', 'title', '', None),
+    ('address', 'address', '', None),
+    ('cost', 'cost', 0, 'float0'),
+    ('sq_ft', 'sq_ft', 0, None),
+    ('description', 'description', '', None),
+    ('start_date', 'start_date', None, 'iso'),
+    ('end_date', 'end_date', None, 'iso'),
+    ('image_url', 'image_url', '/assets/placeholder.jpg', None),
+    ('created_at', 'created_at', None, 'iso'),
+    ('owner_id', 'owner_id', '', None),
+    ('hall_name', 'hall_name', '', None),
+]
+
+# Shape -> whether lender_avg_rating and distance_mi are part of the object
+SHAPES = {
+    'feed': {'rating': True, 'distance': True},
+    'my_listings': {'rating': False, 'distance': False},
+}
+
+
+class ListingSerializer:
+    """Serializes rows of one column list; see listing_serializer()."""
+
+    def __init__(self, shape, columns):
+        self.shape = shape
+        self.columns = tuple(columns)
+        self.source = _generate(SHAPES[shape], self.columns)
+        namespace = {'default_location': default_location}
+        exec(compile(self.source, f'<listing serializer {shape}>', 'exec'), namespace)
+        self._serialize = namespace['serialize']
+
+    def row(self, row, ratings=None):
+        return self._serialize(row, ratings)
+
+    def rows(self, rows, ratings=None):
+        """One dict per row; a row that cannot be serialized is logged and left out."""
+        serialize = self._serialize
+        result = []
+        append = result.append
+        for row in rows:
+            try:
+                append(serialize(row, ratings))
+            except Exception as e:
+                logger.warning("Error formatting listing %s: %s", row, e)
+        return result
+
+
+def _generate(shape, columns):
+    index = {name: i for i, name in enumerate(columns)}
+
+    def column(name, default):
+        return f'row[{index[name]}]' if name in index else repr(default)
+
+    lines = [
+        'def serialize(row, ratings):',
+        f'    lat = {column("latitude", None)}',
+        f'    lng = {column("longitude", None)}',
+        '    if not lat or not lng:',
+        f'        lat, lng = default_location({column("listing_id", None)})',
+        f'    remaining = {column("remaining_space", 0)}',
+    ]
+    items = []
+    for key, name, default, conversion in LISTING_FIELDS:
+        value = column(name, default)
+        if name in index and conversion == 'float0':
+            lines.append(f'    v{index[name]} = {value}')
+            value = f'(float(v{index[name]}) if v{index[name]} is not None else 0)'
+        elif name in index and conversion == 'iso':
+            lines.append(f'    v{index[name]} = {value}')
+            value = f'(v{index[name]}.isoformat() if v{index[name]} is not None else None)'
+        items.append(f'{key!r}: {value}')
+    items.append("'latitude': float(lat)")
+    items.append("'longitude': float(lng)")
+    items.append("'remaining_space': remaining")
+    # Fully booked listings are never shown as available
+    items.append(f"'is_available': bool({column('is_available', True)}) if remaining is not None and remaining > 0 else False")
+    if shape['rating']:
+        if 'lender_avg_rating' in index:
+            items.append(f"'lender_avg_rating': {column('lender_avg_rating', None)}")
+        else:
+            # Ratings aggregated by the caller, keyed by lowercased owner
+            owner = column('owner_id', '')
+            items.append(f"'lender_avg_rating': ratings.get(({owner} or '').lower()) if ratings else None")
+    lines.append('    listing = {' + ', '.join(items) + '}')
+    if shape['distance'] and 'distance_mi' in index:
+        lines += [
+            f'    distance = {column("distance_mi", None)}',
+            '    if distance is not None:',
+            "        listing['distance_mi'] = round(float(distance), 3)",
+        ]
+    lines.append('    return listing')
+    return '\n'.join(lines) + '\n'
+
+
+_serializers = {}
+_serializers_lock = threading.Lock()
+
+
+def listing_serializer(shape, columns):
+    """The compiled serializer for this shape and column list (cached per process)."""
+    key = (shape, tuple(columns))
+    serializer = _serializers.get(key)
+    if serializer is None:
+        with _serializers_lock:
+            serializer = _serializers.get(key)
+            if serializer is None:
+                serializer = _serializers[key] = ListingSerializer(shape, columns)
+    return serializer
+
+
+def sql_literal(value):
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'::text"
+
+
+def iso_sql(expr, data_type):
+    """SQL for a date/time column as the ISO string .isoformat() gives.
+
+    json_build_object() formats timestamps itself, but trims trailing zeros from
+    the fractional seconds where Python always writes six digits (or none).
+    """
+    if data_type == 'timestamp without time zone':
+        return f"""REPLACE(TO_CHAR({expr}, 'YYYY-MM-DD"T"HH24:MI:SS.US'), '.000000', '')"""
+    return expr
+
+
+def json_object_sql(pairs):
+    """json_build_object() over (key, SQL) pairs, keys in the order dumps() sorts them."""
+    args = ', '.join(f"{sql_literal(key)}, {value}" for key, value in sorted(pairs))
+    return f"json_build_object({args})"
+
+
+def listing_json_sql(shape, table, rating_expr=None, distance_expr=None):
+    """SQL building the object listing_serializer(shape, ...) returns, for one storage_listings row.
+
+    `table` is the storage_listings schema.TableInfo (columns it lacks get their
+    defaults), `rating_expr` the lender_avg_rating column from rating_join() and
+    `distance_expr` the distance from the search point, if any.
+    """
+    def column(name, default):
+        return name if table.has(name) else sql_literal(default)
+
+    pairs = []
+    for key, name, default, conversion in LISTING_FIELDS:
+        value = column(name, default)
+        if table.has(name) and conversion == 'float0':
+            value = f"COALESCE({name}::float8, 0)"
+        elif table.has(name) and conversion == 'iso':
+            value = iso_sql(name, table.data_types.get(name))
+        pairs.append((key, value))
+
+    # default_location(), evaluated left to right in float8 like the Python expression
+    # (MOD rather than %, which psycopg2 would read as a placeholder)
+    listing_id = f"{column('listing_id', 0)}::bigint"
+    default_lat = (f"({PRINCETON_LAT!r}::float8 + MOD({listing_id} * {_LAT_STEP}, 1000)::float8 / 100000.0::float8"
+                   f" - 0.005::float8)")
+    default_lng = (f"({PRINCETON_LNG!r}::float8 + MOD({listing_id} * {_LNG_STEP}, 1000)::float8 / 100000.0::float8"
+                   f" - 0.005::float8)")
+    if table.has('latitude') and table.has('longitude'):
+        missing = "(latitude IS NULL OR latitude = 0 OR longitude IS NULL OR longitude = 0)"
+        pairs.append(('latitude', f"CASE WHEN {missing} THEN {default_lat} ELSE latitude::float8 END"))
+        pairs.append(('longitude', f"CASE WHEN {missing} THEN {default_lng} ELSE longitude::float8 END"))
+    else:
+        pairs += [('latitude', default_lat), ('longitude', default_lng)]
+
+    pairs.append(('remaining_space', column('remaining_space', 0)))
+    if not table.has('remaining_space'):
+        available = 'FALSE'
+    elif table.has('is_available'):
+        available = "(COALESCE(remaining_space > 0, FALSE) AND COALESCE(is_available, FALSE))"
+    else:
+        available = "COALESCE(remaining_space > 0, FALSE)"
+    pairs.append(('is_available', available))
+    if SHAPES[shape]['rating']:
+        pairs.append(('lender_avg_rating', rating_expr or 'NULL'))
+
+    listing = json_object_sql(pairs)
+    if not (SHAPES[shape]['distance'] and distance_expr):
+        return listing
+    # As in the Python path, listings without coordinates have no distance_mi key at all
+    with_distance = json_object_sql(pairs + [('distance_mi', f"ROUND(({distance_expr})::numeric, 3)::float8")])
+    return f"CASE WHEN {distance_expr} IS NULL THEN {listing} ELSE {with_distance} END"
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (date, datetime)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """Compact JSON bytes with sorted keys, as jsonify writes them."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, sort_keys=True, separators=(',', ':')).encode()
@@ -0,0 +1,267 @@
+# Slow-query log and per-fingerprint SQL statistics.
+#
+# Every statement on a pooled connection is reported here (see
+# metrics.add_statement_observer) and aggregated by fingerprint: the statement
+# with literals, placeholders and IN / VALUES lists collapsed, so
+#   SELECT * FROM storage_listings WHERE owner_id = %s AND cost <= 40
+# and the same query for another lender and price count as one entry.
+#
+# Statements slower than SLOW_QUERY_MS are logged as a warning with the
+# normalized text and the parameter *types* only (values may be personal
+# data). Outside production, a sampled subset (SLOW_QUERY_EXPLAIN_RATE, at
+# most once per fingerprint per SLOW_QUERY_EXPLAIN_INTERVAL seconds) is run
+# again under EXPLAIN (ANALYZE, BUFFERS) and the plan is kept with the entry.
+# Only plain SELECTs are explained: ANALYZE executes the statement.
+#
+# GET /api/admin/slow-queries lists the top fingerprints of every live worker
+# (snapshots are shared like the Prometheus metrics, next to METRICS_DIR).
+
+import hashlib
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.sql
+
+import backend.metrics as metrics
+
+logger = logging.getLogger(__name__)
+
+_NORMALIZE = [
+    (re.compile(r'--[^\n]*'), ' '),
+    (re.compile(r'/\*.*?\*/', re.S), ' '),
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'%\(\w+\)s|%s'), '?'),
+    (re.compile(r'(?<![\w$])-?\d+(?:\.\d+)?\b'), '?'),
+    # IN (?, ?, ?) and ARRAY[?, ?]: the list length would split one query into many
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)'), '(...)'),
+    (re.compile(r'\[\s*\?(?:\s*,\s*\?)+\s*\]'), '[...]'),
+    # Multi-row VALUES from execute_values
+    (re.compile(r'(\((?:\.\.\.|\?)\))(?:\s*,\s*\((?:\.\.\.|\?)\))+'), r'\1'),
+    (re.compile(r'\s+'), ' '),
+]
+_EXPLAINABLE = re.compile(r'^\s*\(?\s*(select|with)\b', re.I)
+_WRITES = re.compile(r'\b(insert\s+into|delete\s+from|update\s+\S+\s+set)\b', re.I)
+
+SORT_KEYS = {
+    'total': lambda s: s['total_seconds'],
+    'mean': lambda s: s['total_seconds'] / max(s['calls'], 1),
+    'max': lambda s: s['max_seconds'],
+    'calls': lambda s: s['calls'],
+    'slow': lambda s: s['slow_calls'],
+}
+
+
+def normalize(query):
+    """Collapse a statement to its fingerprint text."""
+    for pattern, replacement in _NORMALIZE:
+        query = pattern.sub(replacement, query)
+    return query.strip().rstrip(';').strip()
+
+
+def redact(vars):
+    """Parameter types only, e.g. {'owner_id': 'str'} or ['int', 'str']."""
+    if vars is None:
+        return None
+    if isinstance(vars, dict):
+        return {key: type(value).__name__ for key, value in vars.items()}
+    if isinstance(vars, (list, tuple)):
+        return [type(value).__name__ for value in vars]
+    return type(vars).__name__
+
+
+def _is_production():
+    return os.environ.get('FLASK_ENV') == 'production' or os.environ.get('ENVIRONMENT') == 'production'
+
+
+class SlowQueryLog:
+    """Statement statistics by fingerprint for this process, plus the slow-query log itself."""
+
+    def __init__(self, threshold_ms=250.0, explain_rate=0.0, explain_interval=60.0, max_fingerprints=500,
+                 snapshots=None):
+        self.threshold = threshold_ms / 1000.0
+        self.explain_rate = explain_rate
+        self.explain_interval = explain_interval
+        self.max_fingerprints = max_fingerprints
+        self.snapshots = snapshots
+        self._lock = threading.Lock()
+        self._stats = {}
+        # Query text -> (fingerprint id, normalized text); the app only has a few hundred templates
+        self._fingerprints = OrderedDict()
+
+    def fingerprint(self, cursor, query):
+        if isinstance(query, psycopg2.sql.Composable):
+            query = query.as_string(cursor)
+        cached = self._fingerprints.get(query)
+        if cached is not None:
+            return cached
+        text = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+        normalized = normalize(text)
+        cached = (hashlib.md5(normalized.encode()).hexdigest()[:16], normalized)
+        with self._lock:
+            self._fingerprints[query] = cached
+            if len(self._fingerprints) > 4 * self.max_fingerprints:
+                self._fingerprints.popitem(last=False)
+        return cached
+
+    def observe(self, cursor, query, vars, seconds, error):
+        try:
+            self._observe(cursor, query, vars, seconds, error)
+        except Exception as e:
+            # Never let bookkeeping break the statement that was just run
+            logger.warning("Could not record statement statistics: %s", e)
+
+    def _observe(self, cursor, query, vars, seconds, error):
+        fingerprint, normalized = self.fingerprint(cursor, query)
+        slow = seconds >= self.threshold
+        rows = cursor.rowcount if cursor.description is not None and cursor.name is None and cursor.rowcount > 0 else 0
+        plan = None
+        if slow and error is None and self._should_explain(fingerprint, normalized, cursor):
+            plan = self._explain(cursor, query, vars)
+
+        with self._lock:
+            stats = self._stats.get(fingerprint)
+            if stats is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    # Forget the cheapest fingerprint; rare once the app's query set has been seen
+                    del self._stats[min(self._stats, key=lambda key: self._stats[key]['total_seconds'])]
+                stats = self._stats[fingerprint] = {
+                    'query': normalized[:2000], 'calls': 0, 'errors': 0, 'rows': 0, 'total_seconds': 0.0,
+                    'max_seconds': 0.0, 'slow_calls': 0, 'last_slow_at': None, 'plan': None, 'plan_at': None,
+                }
+            stats['calls'] += 1
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            stats['rows'] += rows
+            if error is not None:
+                stats['errors'] += 1
+            if slow:
+                stats['slow_calls'] += 1
+                stats['last_slow_at'] = time.time()
+            if plan is not None:
+                stats['plan'] = plan
+                stats['plan_at'] = time.time()
+
+        if slow:
+            logger.warning("Slow query %s: %.1f ms", fingerprint, seconds * 1000, extra={
+                'fingerprint': fingerprint, 'duration_ms': round(seconds * 1000, 1), 'query': normalized[:2000],
+                'params': redact(vars), 'rows': rows, 'error': type(error).__name__ if error is not None else None,
+                'plan': plan,
+            })
+        if self.snapshots is not None:
+            self.snapshots.maybe_flush(self)
+
+    def _should_explain(self, fingerprint, normalized, cursor):
+        if self.explain_rate <= 0 or cursor.name is not None:
+            return False
+        if not _EXPLAINABLE.match(normalized) or _WRITES.search(normalized):
+            return False
+        if random.random() >= self.explain_rate:
+            return False
+        stats = self._stats.get(fingerprint)
+        return stats is None or stats['plan_at'] is None or time.time() - stats['plan_at'] >= self.explain_interval
+
+    def _explain(self, cursor, query, vars):
+        conn = cursor.connection
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS) '
+        if isinstance(query, psycopg2.sql.Composable):
+            statement = psycopg2.sql.SQL(prefix) + query
+        elif isinstance(query, bytes):
+            statement = prefix.encode() + query
+        else:
+            statement = prefix + query
+        # A plain (uninstrumented) cursor, inside a savepoint so a failure cannot
+        # abort the caller's transaction
+        in_transaction = not conn.autocommit
+        explain_cursor = psycopg2.extensions.cursor(conn)
+        try:
+            if in_transaction:
+                explain_cursor.execute('SAVEPOINT slow_query_explain')
+            try:
+                explain_cursor.execute(statement, vars)
+                plan = '\n'.join(row[0] for row in explain_cursor.fetchall())
+            except Exception as e:
+                if in_transaction:
+                    explain_cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+                logger.info("Could not EXPLAIN slow query: %s", e)
+                plan = None
+            if in_transaction:
+                explain_cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+            return plan
+        finally:
+            explain_cursor.close()
+
+    def snapshot(self):
+        with self._lock:
+            return {fingerprint: dict(stats) for fingerprint, stats in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+        if self.snapshots is not None:
+            self.snapshots.maybe_flush(self, force=True)
+
+    def top(self, sort='total', limit=20):
+        """The top fingerprints of every live worker, most expensive first."""
+        snapshots = [self.snapshot()] + (self.snapshots.other_workers() if self.snapshots is not None else [])
+        merged = merge(snapshots)
+        entries = sorted(merged.values(), key=SORT_KEYS[sort], reverse=True)[:limit]
+        for entry in entries:
+            entry['mean_ms'] = round(entry['total_seconds'] / max(entry['calls'], 1) * 1000, 3)
+            entry['total_ms'] = round(entry.pop('total_seconds') * 1000, 1)
+            entry['max_ms'] = round(entry.pop('max_seconds') * 1000, 1)
+        return {
+            'threshold_ms': self.threshold * 1000,
+            'explain_rate': self.explain_rate,
+            'workers': len(snapshots),
+            'fingerprints': len(merged),
+            'sort': sort,
+            'queries': entries,
+        }
+
+
+def merge(snapshots):
+    merged = {}
+    for snapshot in snapshots:
+        for fingerprint, stats in snapshot.items():
+            target = merged.get(fingerprint)
+            if target is None:
+                merged[fingerprint] = dict(stats, fingerprint=fingerprint)
+                continue
+            for key in ('calls', 'errors', 'rows', 'total_seconds', 'slow_calls'):
+                target[key] += stats[key]
+            target['max_seconds'] = max(target['max_seconds'], stats['max_seconds'])
+            target['last_slow_at'] = max(filter(None, (target['last_slow_at'], stats['last_slow_at'])), default=None)
+            if stats['plan_at'] is not None and (target['plan_at'] is None or stats['plan_at'] > target['plan_at']):
+                target['plan'], target['plan_at'] = stats['plan'], stats['plan_at']
+    return merged
+
+
+def from_env():
+    """The log configured by SLOW_QUERY_* (None with SLOW_QUERY_LOG=off)."""
+    if os.environ.get('SLOW_QUERY_LOG', 'on').lower() == 'off':
+        return None
+    explain_rate = float(os.environ.get('SLOW_QUERY_EXPLAIN_RATE', 0))
+    if explain_rate and _is_production():
+        logger.warning("SLOW_QUERY_EXPLAIN_RATE is ignored in production")
+        explain_rate = 0.0
+    snapshots = None
+    if metrics.snapshots is not None:
+        snapshots = metrics.SnapshotDirectory(os.path.join(metrics.snapshots.directory, 'slow-queries'),
+                                              metrics.snapshots.interval)
+    return SlowQueryLog(threshold_ms=float(os.environ.get('SLOW_QUERY_MS', 250)),
+                        explain_rate=explain_rate,
+                        explain_interval=float(os.environ.get('SLOW_QUERY_EXPLAIN_INTERVAL', 60)),
+                        max_fingerprints=int(os.environ.get('SLOW_QUERY_MAX_FINGERPRINTS', 500)),
+                        snapshots=snapshots)
+
+
+log = from_env()
+if log is not None:
+    metrics.add_statement_observer(log.observe)
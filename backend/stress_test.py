@@ -1,148 +1,399 @@
+# HTTP load test for a local TigerStorage API.
+#
+# Drives the Flask API directly (no browser, no CAS) from a pool of virtual
+# users and reports throughput, p50/p95/p99 latency and error rates per
+# endpoint for each concurrency stage. Virtual users log in through the
+# test-auth bypass, so start the API with it enabled:
+#
+#   TEST_AUTH_ENABLED=1 gunicorn -c backend/gunicorn.conf.py backend.app:app
+#   python -m backend.stress_test --ramp 1,8,32 --duration 20
+#   python -m backend.stress_test --scenario map --scenario reserve=3 --json results.json
+#
+# Scenarios (pick with --scenario NAME[=WEIGHT], repeatable; default is a mix):
+#   map      renters poll GET /api/listings (with If-None-Match) and /api/listings/changes
+#   create   lenders create listings
+#   reserve  renters race to reserve space on a few shared listings while the lender approves
+#   review   renters review finished reservations; needs --database-url to seed them
+#
+# Everything it creates belongs to users named loadtest_*; --cleanup (with
+# --database-url) deletes it afterwards.
+
+import argparse
+import http.client
+import json
 import os
-import time
 import random
-from datetime import datetime, timedelta
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-
-username = os.getenv('CAS_USERNAME')
-password = os.getenv('CAS_PASSWORD')
-
-# Configuration
-url = "https://tigerstorage-backend.onrender.com/lender-dashboard"  # Replace with your actual lender dashboard URL
-num_listings = 10  # Number of listings to create in each request
-total_iterations = 5  # Total number of requests to send
-
-# Set up Chrome options
-chrome_options = Options()
-chrome_options.add_argument("--headless")  # Run in headless mode (no GUI)
-chrome_options.add_argument("--no-sandbox")
-chrome_options.add_argument("--disable-dev-shm-usage")
-
-# Create a new instance of the Chrome driver
-service = Service('/opt/homebrew/bin/chromedriver')  # Update with your path to chromedriver
-driver = webdriver.Chrome(service=service, options=chrome_options)
-
-# Function to create a listing
-def create_listing(index):
-    driver.get(url)
-    time.sleep(2)  # Wait for the page to load
-
-    # Debugging output
-    print("Current URL:", driver.current_url)
-    print("Page Source:", driver.page_source)
-
-    # Click on "I am a space lender" button
-    try:
-        lender_button = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'I am a space lender')]"))
-        )
-        lender_button.click()
-        print("Clicked on 'I am a space lender' button.")
-        time.sleep(2)  # Wait for the CAS login page to load
-    except Exception as e:
-        print(f"Error finding 'I am a space lender' button: {e}")
-        return  # Exit the function if the button is not found
-
-    # Now handle CAS login
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlparse
+
+USER_PREFIX = 'loadtest_'
+DEFAULT_WEIGHTS = {'map': 70, 'create': 10, 'reserve': 15, 'review': 5}
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1', '0.0.0.0')
+
+
+class Recorder:
+    """Latencies and status codes per (stage, endpoint)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage = None
+        self._samples = defaultdict(list)     # (stage, endpoint) -> [seconds]
+        self._statuses = defaultdict(Counter)  # (stage, endpoint) -> {status: count}
+        self._errors = Counter()               # (stage, endpoint) -> count
+
+    def record(self, endpoint, status, elapsed, error):
+        key = (self.stage, endpoint)
+        with self._lock:
+            self._samples[key].append(elapsed)
+            self._statuses[key][status] += 1
+            if error:
+                self._errors[key] += 1
+
+    def report(self, stage, duration):
+        rows = []
+        for (row_stage, endpoint), samples in sorted(self._samples.items(), key=lambda item: str(item[0])):
+            if row_stage != stage:
+                continue
+            samples = sorted(samples)
+            errors = self._errors[(row_stage, endpoint)]
+            rows.append({
+                'endpoint': endpoint,
+                'requests': len(samples),
+                'throughput_rps': round(len(samples) / duration, 1),
+                'p50_ms': round(percentile(samples, 50) * 1000, 1),
+                'p95_ms': round(percentile(samples, 95) * 1000, 1),
+                'p99_ms': round(percentile(samples, 99) * 1000, 1),
+                'errors': errors,
+                'error_rate': round(errors / len(samples), 4),
+                'statuses': {str(status): count for status, count in sorted(self._statuses[(row_stage, endpoint)].items(), key=str)},
+            })
+        return rows
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Client:
+    """One virtual user: a keep-alive connection, a session cookie and a CSRF token."""
+
+    def __init__(self, base_url, recorder, timeout=30):
+        parsed = urlparse(base_url)
+        self._connection_class = http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+        self._netloc = parsed.netloc
+        self._prefix = parsed.path.rstrip('/')
+        self._timeout = timeout
+        self._conn = None
+        self.recorder = recorder
+        self.cookies = {}
+        self.csrf_token = None
+        self.username = None
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = self._connection_class(self._netloc, timeout=self._timeout)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def request(self, method, path, body=None, endpoint=None, expect=(200,), headers=None):
+        """(status, parsed JSON body or None, response headers); status is None on a network error.
+
+        Statuses outside `expect` (and network errors) count as errors for `endpoint`.
+        """
+        all_headers = {'Accept': 'application/json'}
+        if body is not None:
+            all_headers['Content-Type'] = 'application/json'
+            body = json.dumps(body)
+        if self.cookies:
+            # The session cookie is Secure; a local run over plain HTTP still has to send it
+            all_headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        if self.csrf_token:
+            all_headers['X-CSRFToken'] = self.csrf_token
+        if self.username:
+            all_headers['X-Username'] = self.username
+        all_headers.update(headers or {})
+
+        for attempt in range(2):
+            reused = self._conn is not None
+            start = time.perf_counter()
+            try:
+                conn = self._connection()
+                conn.request(method, self._prefix + path, body=body, headers=all_headers)
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (OSError, http.client.HTTPException):
+                self.close()
+                # The server drops idle keep-alive connections; retry those once on a fresh one
+                if reused and attempt == 0:
+                    continue
+                if endpoint:
+                    self.recorder.record(endpoint, 'network_error', time.perf_counter() - start, True)
+                return None, None, {}
+        elapsed = time.perf_counter() - start
+
+        for header in response.headers.get_all('Set-Cookie') or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        if endpoint:
+            self.recorder.record(endpoint, response.status, elapsed, response.status not in expect)
+        parsed = None
+        if data and 'json' in (response.headers.get('Content-Type') or ''):
+            try:
+                parsed = json.loads(data)
+            except ValueError:
+                pass
+        return response.status, parsed, response.headers
+
+    def login(self, username, user_type):
+        status, body, _ = self.request('POST', '/api/test-auth/login', {'username': username, 'user_type': user_type})
+        if status != 200:
+            raise RuntimeError(f"test-auth login as {username} failed ({status}); "
+                               "is the API running with TEST_AUTH_ENABLED=1?")
+        self.username = username
+        self.csrf_token = body['csrf_token']
+        return self
+
+
+def listing_payload(rng, sq_ft=None):
+    start = date.today() + timedelta(days=rng.randint(1, 30))
+    return {
+        'title': f"Load test storage {rng.randint(1, 10 ** 6)}",
+        'cost': rng.randint(20, 200),
+        'sq_ft': sq_ft or rng.randint(10, 300),
+        'description': "Created by the load test",
+        'latitude': 40.3437 + rng.uniform(-0.02, 0.02),
+        'longitude': -74.6517 + rng.uniform(-0.02, 0.02),
+        'start_date': start.isoformat(),
+        'end_date': (start + timedelta(days=rng.randint(30, 120))).isoformat(),
+        'hall_name': rng.choice(['Butler', 'Forbes', 'Mathey', 'Rockefeller', 'Whitman', 'Wilson', 'Yeh']),
+    }
+
+
+class Worker:
+    """Per-thread state: a renter and a lender session plus map polling state."""
+
+    def __init__(self, index, options, recorder, shared):
+        self.index = index
+        self.shared = shared
+        self.rng = random.Random(options.seed * 1000 + index)
+        self.renter = Client(options.base_url, recorder).login(f'{USER_PREFIX}renter_{index}', 'renter')
+        self.lender = Client(options.base_url, recorder).login(f'{USER_PREFIX}lender_{index}', 'lender')
+        self.race_lender = Client(options.base_url, recorder).login(shared['race_lender'], 'lender')
+        self.etag = None
+        self.cursor = None
+
+    def close(self):
+        for client in (self.renter, self.lender, self.race_lender):
+            client.close()
+
+    def map(self):
+        headers = {'If-None-Match': self.etag} if self.etag else {}
+        status, _, response_headers = self.renter.request('GET', '/api/listings', endpoint='GET /api/listings',
+                                                          expect=(200, 304), headers=headers)
+        if status == 200:
+            self.etag = response_headers.get('ETag')
+        path = '/api/listings/changes' + (f"?{urlencode({'since': self.cursor})}" if self.cursor else '')
+        status, body, _ = self.renter.request('GET', path, endpoint='GET /api/listings/changes')
+        if status == 200 and body:
+            self.cursor = body.get('cursor')
+
+    def create(self):
+        self.lender.request('POST', '/api/listings', listing_payload(self.rng),
+                            endpoint='POST /api/listings', expect=(201,))
+
+    def reserve(self):
+        listing_id = self.rng.choice(self.shared['race_listings'])
+        # 400 is an expected outcome of the race (listing full, or already pending)
+        status, body, _ = self.renter.request('POST', f'/api/listings/{listing_id}/reserve',
+                                              {'requested_space': self.rng.randint(1, 5)},
+                                              endpoint='POST /api/listings/:id/reserve', expect=(201, 400))
+        if status == 201 and body:
+            self.race_lender.request('PATCH', f"/api/reservation-requests/{body['request_id']}",
+                                     {'status': 'approved_full'},
+                                     endpoint='PATCH /api/reservation-requests/:id', expect=(200, 400))
+
+    def review(self):
+        reviews = self.shared['reviews'].get(self.index)
+        if not reviews:
+            return
+        self.renter.request('POST', '/api/lender-reviews',
+                            {'request_id': reviews.pop(), 'rating': self.rng.randint(1, 5), 'review_text': "Load test review"},
+                            endpoint='POST /api/lender-reviews')
+
+
+def setup_race(options, recorder):
+    """Listings every worker's renters race to reserve."""
+    lender = Client(options.base_url, recorder).login(f'{USER_PREFIX}race_lender', 'lender')
+    rng = random.Random(options.seed)
+    listing_ids = []
+    for _ in range(options.race_listings):
+        status, body, _ = lender.request('POST', '/api/listings', listing_payload(rng, sq_ft=options.race_space))
+        if status != 201:
+            raise RuntimeError(f"could not create race listing ({status}: {body})")
+        listing_ids.append(body['listing_id'])
+    lender.close()
+    return lender.username, listing_ids
+
+
+def seed_reviews(database_url, renters, per_renter):
+    """Approved reservations on an already-finished listing, per renter index, ready to review."""
+    import psycopg2
+    conn = psycopg2.connect(database_url)
+    with conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO storage_listings (title, cost, sq_ft, remaining_space, is_available, owner_id, start_date, end_date)
+            VALUES ('Load test finished listing', 50, 100, 100, FALSE, %s, CURRENT_DATE - 60, CURRENT_DATE - 1)
+            RETURNING listing_id
+        """, (f'{USER_PREFIX}review_lender',))
+        listing_id = cur.fetchone()[0]
+        cur.execute("""
+            INSERT INTO reservation_requests (listing_id, renter_username, requested_space, approved_space, status)
+            SELECT %s, %s || (n %% %s), 1, 1, 'approved_full' FROM generate_series(0, %s - 1) AS n
+            RETURNING request_id, renter_username
+        """, (listing_id, f'{USER_PREFIX}renter_', renters, renters * per_renter))
+        reviews = defaultdict(list)
+        for request_id, renter in cur.fetchall():
+            reviews[int(renter.rsplit('_', 1)[1])].append(request_id)
+    conn.close()
+    return dict(reviews)
+
+
+def cleanup(database_url):
+    import psycopg2
+    conn = psycopg2.connect(database_url)
+    with conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM lender_reviews WHERE lender_username LIKE %s OR renter_username LIKE %s",
+                    (USER_PREFIX + '%', USER_PREFIX + '%'))
+        cur.execute("DELETE FROM reservation_requests WHERE renter_username LIKE %s", (USER_PREFIX + '%',))
+        cur.execute("DELETE FROM storage_listings WHERE owner_id LIKE %s", (USER_PREFIX + '%',))
+        deleted = cur.rowcount
+    conn.close()
+    return deleted
+
+
+def run_stage(options, recorder, shared, concurrency, weights):
+    names = list(weights)
+    scenario_weights = [weights[name] for name in names]
+    deadline = time.monotonic() + options.duration
+    failures = []
+
+    def loop(index):
+        try:
+            worker = Worker(index, options, recorder, shared)
+        except Exception as e:
+            failures.append(e)
+            return
+        try:
+            while time.monotonic() < deadline:
+                getattr(worker, worker.rng.choices(names, weights=scenario_weights)[0])()
+                if options.think_time:
+                    time.sleep(worker.rng.expovariate(1000.0 / options.think_time))
+        finally:
+            worker.close()
+
+    threads = [threading.Thread(target=loop, args=(index,), daemon=True) for index in range(concurrency)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if failures:
+        raise failures[0]
+    return time.monotonic() - start
+
+
+def parse_weights(values):
+    if not values:
+        return dict(DEFAULT_WEIGHTS)
+    weights = {}
+    for value in values:
+        name, _, weight = value.partition('=')
+        if name not in DEFAULT_WEIGHTS:
+            raise ValueError(f"unknown scenario '{name}' (choose from {', '.join(DEFAULT_WEIGHTS)})")
+        weights[name] = float(weight) if weight else 1.0
+    return weights
+
+
+def print_stage(stage, rows):
+    print(f"\n== {stage} ==")
+    print(f"{'endpoint':40} {'reqs':>7} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'err %':>7}")
+    for row in rows:
+        print(f"{row['endpoint']:40} {row['requests']:>7} {row['throughput_rps']:>8} {row['p50_ms']:>8} "
+              f"{row['p95_ms']:>8} {row['p99_ms']:>8} {row['error_rate'] * 100:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP load test for a local TigerStorage API")
+    parser.add_argument('--base-url', default=os.environ.get('STRESS_BASE_URL', 'http://localhost:8000'))
+    parser.add_argument('--scenario', action='append', metavar='NAME[=WEIGHT]',
+                        help=f"repeatable; default {' '.join(f'{k}={v}' for k, v in DEFAULT_WEIGHTS.items())}")
+    parser.add_argument('--ramp', default='1,4,16', help="comma-separated concurrency levels, one stage each")
+    parser.add_argument('--duration', type=float, default=15, help="seconds per stage")
+    parser.add_argument('--think-time', type=float, default=0, help="mean pause between iterations (ms)")
+    parser.add_argument('--race-listings', type=int, default=3, help="listings shared by the reserve scenario")
+    parser.add_argument('--race-space', type=int, default=500, help="sq ft per race listing")
+    parser.add_argument('--reviews-per-renter', type=int, default=200)
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'),
+                        help="used only to seed the review scenario and for --cleanup")
+    parser.add_argument('--cleanup', action='store_true', help="delete loadtest_* data afterwards (needs --database-url)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', metavar='PATH', help="also write the results as JSON")
+    parser.add_argument('--allow-remote', action='store_true', help="allow a non-local --base-url")
+    args = parser.parse_args()
+
+    if urlparse(args.base_url).hostname not in LOCAL_HOSTS and not args.allow_remote:
+        parser.error(f"{args.base_url} is not local; pass --allow-remote if you really mean to load test it")
     try:
-        # Wait for the CAS login page to load
-        WebDriverWait(driver, 10).until(
-            EC.visibility_of_element_located((By.NAME, 'username'))  # Adjust based on the actual input name
-        )
-
-        # Enter CAS credentials
-        username = os.getenv('CAS_USERNAME')  # Replace with your CAS username
-        password = os.getenv('CAS_PASSWORD')  # Replace with your CAS password
-        print(f"Logging in with username: {username}")
-        
-        driver.find_element(By.NAME, 'username').send_keys(username)
-        driver.find_element(By.NAME, 'password').send_keys(password)
-        driver.find_element(By.NAME, 'submit').click()  # Adjust the selector as needed
-
-        time.sleep(2)  # Wait for the lender dashboard to load after login
-        print("Logged in successfully.")
-    except Exception as e:
-        print(f"Error during CAS login: {e}")
-        return  # Exit the function if login fails
-
-    # Wait for the "Add Storage Space" button to be clickable
+        weights = parse_weights(args.scenario)
+        ramp = [int(level) for level in args.ramp.split(',') if level.strip()]
+    except ValueError as e:
+        parser.error(str(e))
+    if 'review' in weights and not args.database_url:
+        print("review scenario skipped: it needs --database-url to seed finished reservations", file=sys.stderr)
+        del weights['review']
+    if not weights or not ramp:
+        parser.error("nothing to run")
+    if args.cleanup and not args.database_url:
+        parser.error("--cleanup needs --database-url")
+
+    recorder = Recorder()
+    shared = {'race_lender': f'{USER_PREFIX}race_lender', 'race_listings': [], 'reviews': {}}
+    if 'reserve' in weights:
+        shared['race_lender'], shared['race_listings'] = setup_race(args, recorder)
+    if 'review' in weights:
+        shared['reviews'] = seed_reviews(args.database_url, max(ramp), args.reviews_per_renter)
+
+    results = {'base_url': args.base_url, 'scenarios': weights, 'duration_seconds': args.duration, 'stages': []}
     try:
-        add_storage_button = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Add Storage Space')]"))
-        )
-        add_storage_button.click()
-        print("Clicked on 'Add Storage Space' button.")
-    except Exception as e:
-        print(f"Error finding 'Add Storage Space' button: {e}")
-        print("Current URL:", driver.current_url)
-        print("Page Source:", driver.page_source)
-        return  # Exit the function if the button is not found
-
-    time.sleep(2)  # Wait for the modal to open
-
-    # Fill out the Create Listing form
-    title = f"Stress Test Storage {index + 1}"
-    cost = 10.00
-    sq_ft = 10
-    latitude = 40.3481639 + (index * 0.001)
-    longitude = -74.6621893 + (index * 0.001)
-    description = "A description of the listing."
-    image_url = "https://res.cloudinary.com/ddsxhjlvh/image/upload/v1746723021/lfjhm2tkubxofqnbu0d2.jpg"
-    owner_id = f"ct{index + 1:04d}"
-    address = "Hamilton Hall, University Place, Princeton, Mercer County, New Jersey, 08540, United States"
-    start_date = "2024-01-01"
-    end_date = "2024-12-31"
-
-    # Fill in the form fields
-    driver.find_element(By.NAME, "title").send_keys(title)
-    driver.find_element(By.NAME, "cost").send_keys(str(cost))
-    driver.find_element(By.NAME, "sq_ft").send_keys(str(sq_ft))
-    driver.find_element(By.NAME, "latitude").send_keys(str(latitude))
-    driver.find_element(By.NAME, "longitude").send_keys(str(longitude))
-    driver.find_element(By.NAME, "description").send_keys(description)
-    driver.find_element(By.NAME, "image_url").send_keys(image_url)
-    driver.find_element(By.NAME, "owner_id").send_keys(owner_id)
-    driver.find_element(By.NAME, "address").send_keys(address)
-    driver.find_element(By.NAME, "start_date").send_keys(start_date)
-    driver.find_element(By.NAME, "end_date").send_keys(end_date)
-
-    # Submit the form
-    driver.find_element(By.XPATH, "//button[contains(text(), 'Create Listing')]").click()
-    print("Submitted the Create Listing form.")
-    time.sleep(2)  # Wait for the submission to process
-
-# Main function to simulate multiple users
-def simulate_users(num_users):
-    for i in range(num_users):
-        create_listing(i)
-
-# Function to log in with CAS
-def login_with_cas(driver, username, password):
-    driver.get('https://fed.princeton.edu/cas/login')  # Replace with your CAS login URL
-    time.sleep(2)  # Wait for the page to load
-
-    # Fill in the username and passwords fields
-    driver.find_element(By.NAME, 'username').send_keys(username)
-    driver.find_element(By.NAME, 'password').send_keys(password)
-    driver.find_element(By.NAME, 'submit').click()  # Adjust the selector as needed
-
-    time.sleep(2)  # Wait for login to complete
-
-# Main execution
-if __name__ == "__main__":
-    username = os.getenv('CAS_USERNAME')  # Replace with your CAS username
-    password = os.getenv('CAS_PASSWORD')  # Replace with your CAS password
-
-    login_with_cas(driver, username, password)
-
-    # Loop to create multiple listings
-    for i in range(total_iterations * num_listings):
-        create_listing(i)
-
-    driver.quit()  # Close the browser
\ No newline at end of file
+        for concurrency in ramp:
+            recorder.stage = f'{concurrency} users'
+            elapsed = run_stage(args, recorder, shared, concurrency, weights)
+            rows = recorder.report(recorder.stage, elapsed)
+            print_stage(recorder.stage, rows)
+            results['stages'].append({'concurrency': concurrency, 'elapsed_seconds': round(elapsed, 2), 'endpoints': rows})
+    finally:
+        if args.cleanup:
+            print(f"\nCleanup: deleted {cleanup(args.database_url)} load test listings")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+    errors = sum(row['errors'] for stage in results['stages'] for row in stage['endpoints'])
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
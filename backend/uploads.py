@@ -0,0 +1,375 @@
+# Listing image uploads, processed in the background.
+#
+# POST /api/upload used to push the raw file to Cloudinary inside the request,
+# holding one of the worker's request threads for the whole remote upload. Now
+# the request only checks the file (size, magic bytes, a header parse by
+# Pillow), records a row in upload_jobs and answers 202 with the job id. A
+# small per-process thread pool then:
+#
+#   - decodes the image once, applies the EXIF orientation and keeps the
+#     first frame of an animation
+#   - writes a WebP variant per entry in VARIANTS (metadata is not copied, so
+#     EXIF / GPS data never reaches the storage backend)
+#   - stores the variants, retrying transient storage errors with exponential
+#     backoff, and marks the job done with their URLs (or failed)
+#
+# The client polls GET /api/upload/<job_id>. Job state lives in Postgres, so
+# any gunicorn worker can answer the poll, not only the one running the job.
+# A job whose worker died stops being updated and is reported failed after
+# UPLOAD_JOB_STALE_SECONDS.
+#
+# Where the variants go is a storage backend: CloudinaryStorage, or
+# LocalStorage (files in backend/uploads, served by /uploads/<filename>) for
+# development and tests. UPLOAD_STORAGE picks one; the default is cloudinary
+# when Cloudinary is configured (CLOUDINARY_CLOUD_NAME / _API_KEY / _API_SECRET,
+# applied by config.Config, or CLOUDINARY_URL).
+#
+# At most UPLOAD_QUEUE_SIZE uploads per worker are queued or running (each
+# holds its file in memory until it is processed); beyond that the endpoint
+# answers 503 with Retry-After.
+
+import io
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', 5 * 1024 * 1024))
+MAX_PIXELS = int(os.environ.get('UPLOAD_MAX_PIXELS', 40_000_000))
+WORKERS = int(os.environ.get('UPLOAD_WORKERS', 2))
+QUEUE_SIZE = int(os.environ.get('UPLOAD_QUEUE_SIZE', 8))
+MAX_ATTEMPTS = int(os.environ.get('UPLOAD_MAX_ATTEMPTS', 4))
+RETRY_BASE_SECONDS = float(os.environ.get('UPLOAD_RETRY_BASE_SECONDS', 1))
+WEBP_QUALITY = int(os.environ.get('UPLOAD_WEBP_QUALITY', 80))
+JOB_STALE_SECONDS = int(os.environ.get('UPLOAD_JOB_STALE_SECONDS', 600))
+JOB_RETENTION_DAYS = int(os.environ.get('UPLOAD_JOB_RETENTION_DAYS', 7))
+JOB_PRUNE_INTERVAL = 3600  # seconds, per worker
+
+# Pillow refuses (DecompressionBombError) anything twice this size while decoding
+Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+
+# Variant name -> longest side in pixels (images are never enlarged)
+VARIANTS = {
+    'display': 1600,
+    'thumb': 400,
+}
+# The variant whose URL is returned as the job's `url`
+PRIMARY_VARIANT = 'display'
+
+# Leading bytes -> (content type, Pillow format)
+SIGNATURES = [
+    (b'\xff\xd8\xff', ('image/jpeg', 'JPEG')),
+    (b'\x89PNG\r\n\x1a\n', ('image/png', 'PNG')),
+    (b'GIF87a', ('image/gif', 'GIF')),
+    (b'GIF89a', ('image/gif', 'GIF')),
+]
+
+
+class UploadValidationError(Exception):
+    """The file is not an image we accept; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class UploadQueueFull(Exception):
+    """This worker already has UPLOAD_QUEUE_SIZE uploads queued or running."""
+
+
+class StorageError(Exception):
+    """A storage backend failed to store a variant; retried unless `retryable` is False."""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def sniff(data):
+    """(content type, Pillow format) from the file's magic bytes, or None."""
+    for signature, kind in SIGNATURES:
+        if data.startswith(signature):
+            return kind
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return ('image/webp', 'WEBP')
+    return None
+
+
+def validate(data):
+    """Check an uploaded file without decoding it; returns (content type, width, height).
+
+    Raises UploadValidationError for empty, oversized, unrecognized or corrupt files.
+    """
+    if not data:
+        raise UploadValidationError("Empty file")
+    if len(data) > MAX_BYTES:
+        raise UploadValidationError(f"File is larger than {MAX_BYTES // (1024 * 1024)} MB", status=413)
+    kind = sniff(data)
+    if kind is None:
+        raise UploadValidationError("Invalid file type (allowed: JPEG, PNG, GIF, WebP)")
+    content_type, image_format = kind
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            if img.format != image_format:
+                raise UploadValidationError("Invalid file type (allowed: JPEG, PNG, GIF, WebP)")
+            width, height = img.size
+            if width * height > MAX_PIXELS:
+                raise UploadValidationError(f"Image is larger than {MAX_PIXELS} pixels", status=413)
+            img.verify()
+    except UploadValidationError:
+        raise
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError, ValueError) as e:
+        raise UploadValidationError(f"Corrupt or unsupported image: {e}")
+    return content_type, width, height
+
+
+def make_variants(data, variants=VARIANTS, quality=WEBP_QUALITY):
+    """Decode once and encode a WebP per variant; returns {name: (bytes, width, height)}."""
+    result = {}
+    with Image.open(io.BytesIO(data)) as img:
+        # JPEGs can be decoded at a reduced scale when every variant is much smaller
+        img.draft('RGB', (max(variants.values()),) * 2)
+        img.seek(0)
+        frame = ImageOps.exif_transpose(img)
+        if frame.mode in ('RGBA', 'LA') or (frame.mode == 'P' and 'transparency' in frame.info):
+            frame = frame.convert('RGBA')
+        else:
+            frame = frame.convert('RGB')
+        # Largest first, each resized from the previous one
+        for name, size in sorted(variants.items(), key=lambda item: -item[1]):
+            frame = frame.copy()
+            frame.thumbnail((size, size), Image.LANCZOS)
+            out = io.BytesIO()
+            frame.save(out, 'WEBP', quality=quality, method=4)
+            result[name] = (out.getvalue(), frame.width, frame.height)
+    return result
+
+
+class LocalStorage:
+    """Variants as files in a directory, served from base_url (the /uploads/ route)."""
+
+    def __init__(self, directory, base_url='/uploads/'):
+        self.directory = directory
+        self.base_url = base_url
+        os.makedirs(directory, exist_ok=True)
+
+    def put(self, key, data, content_type):
+        path = os.path.join(self.directory, key)
+        tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise StorageError(str(e))
+        return self.base_url + key
+
+
+class CloudinaryStorage:
+    """Variants uploaded to Cloudinary, using the global cloudinary.config() that config.Config sets up."""
+
+    def __init__(self, folder='tigerstorage'):
+        import cloudinary.exceptions
+        import cloudinary.uploader
+        self.folder = folder
+        self._uploader = cloudinary.uploader
+        # Retrying these cannot help
+        self._permanent = (cloudinary.exceptions.BadRequest, cloudinary.exceptions.AuthorizationRequired,
+                           cloudinary.exceptions.NotAllowed, cloudinary.exceptions.NotFound)
+
+    def put(self, key, data, content_type):
+        public_id = os.path.splitext(key)[0]
+        try:
+            result = self._uploader.upload(io.BytesIO(data), public_id=public_id, folder=self.folder,
+                                           overwrite=True, resource_type='image')
+        except self._permanent as e:
+            raise StorageError(str(e), retryable=False)
+        except Exception as e:
+            raise StorageError(str(e))
+        return result['secure_url']
+
+
+def cloudinary_configured():
+    import cloudinary
+    return bool(cloudinary.config().cloud_name or os.environ.get('CLOUDINARY_CLOUD_NAME'))
+
+
+def storage_from_env(upload_folder):
+    backend = os.environ.get('UPLOAD_STORAGE') or ('cloudinary' if cloudinary_configured() else 'local')
+    if backend == 'cloudinary':
+        return CloudinaryStorage()
+    if backend == 'local':
+        return LocalStorage(upload_folder)
+    raise ValueError(f"Unknown UPLOAD_STORAGE {backend!r} (expected cloudinary or local)")
+
+
+class UploadPipeline:
+    """Accepts validated uploads and processes them on a per-process thread pool.
+
+    `connect` is a context manager factory yielding a psycopg2 connection
+    (db.connection in the app).
+    """
+
+    def __init__(self, storage, connect, workers=WORKERS, queue_size=QUEUE_SIZE,
+                 max_attempts=MAX_ATTEMPTS, retry_base_seconds=RETRY_BASE_SECONDS):
+        self.storage = storage
+        self.connect = connect
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self._lock = threading.Lock()
+        self._reset_state()
+
+    def _reset_state(self):
+        self._pid = os.getpid()
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.queue_size)
+        self._last_prune = 0.0
+
+    def _get_executor(self):
+        # Threads do not survive fork(); each gunicorn worker starts its own pool
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset_state()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='upload')
+            return self._executor
+
+    def submit(self, data, filename, owner_id=None):
+        """Validate and queue an upload; returns the new job's id.
+
+        Raises UploadValidationError or UploadQueueFull.
+        """
+        content_type, width, height = validate(data)
+        executor = self._get_executor()
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise UploadQueueFull()
+        job_id = str(uuid.uuid4())
+        try:
+            with self.connect() as conn:
+                self._prune(conn)
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        INSERT INTO upload_jobs (job_id, owner_id, filename, content_type)
+                        VALUES (%s, %s, %s, %s)
+                    """, (job_id, owner_id, (filename or '')[:255], content_type))
+                conn.commit()
+            executor.submit(self._run, slots, job_id, data)
+        except Exception:
+            slots.release()
+            raise
+        logger.info("Queued upload %s (%s, %dx%d, %d bytes)", job_id, content_type, width, height, len(data))
+        return job_id
+
+    def _prune(self, conn):
+        now = time.monotonic()
+        if now - self._last_prune < JOB_PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        with conn.cursor() as cur:
+            cur.execute("""
+                DELETE FROM upload_jobs
+                WHERE updated_at < NOW() - make_interval(days => %s)
+            """, (JOB_RETENTION_DAYS,))
+            logger.info("Pruned %s upload_jobs rows", cur.rowcount)
+        conn.commit()
+
+    def _update(self, job_id, **fields):
+        if 'variants' in fields:
+            fields['variants'] = json.dumps(fields['variants'])
+        assignments = ', '.join(f"{name} = %s" for name in fields)
+        with self.connect() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"UPDATE upload_jobs SET {assignments}, updated_at = NOW() WHERE job_id = %s",
+                            list(fields.values()) + [job_id])
+            conn.commit()
+
+    def _run(self, slots, job_id, data):
+        try:
+            self._process(job_id, data)
+        except Exception as e:
+            logger.exception("Upload %s failed", job_id)
+            try:
+                self._update(job_id, status='failed', error=str(e)[:500])
+            except Exception:
+                logger.exception("Could not record the failure of upload %s", job_id)
+        finally:
+            slots.release()
+
+    def _process(self, job_id, data):
+        start = time.perf_counter()
+        self._update(job_id, status='processing')
+        try:
+            variants = make_variants(data)
+        except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+            self._update(job_id, status='failed', error=f"Could not decode image: {e}"[:500])
+            return
+        resized = time.perf_counter()
+
+        urls = {}
+        for attempt in range(1, self.max_attempts + 1):
+            self._update(job_id, attempts=attempt)
+            try:
+                # Variants stored by an earlier attempt are not sent again
+                for name, (body, _, _) in variants.items():
+                    if name not in urls:
+                        urls[name] = self.storage.put(f'{job_id}_{name}.webp', body, 'image/webp')
+                break
+            except StorageError as e:
+                if not e.retryable or attempt == self.max_attempts:
+                    logger.warning("Upload %s: storage failed after %d attempt(s): %s", job_id, attempt, e)
+                    self._update(job_id, status='failed', error=str(e)[:500])
+                    return
+                delay = self.retry_base_seconds * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                logger.info("Upload %s: storage attempt %d failed (%s); retrying in %.1fs", job_id, attempt, e, delay)
+                self._update(job_id, error=str(e)[:500])
+                time.sleep(delay)
+
+        self._update(job_id, status='done', error=None, variants=urls)
+        logger.info("Upload %s done: resized in %.0f ms, stored in %.0f ms", job_id,
+                    (resized - start) * 1000, (time.perf_counter() - resized) * 1000)
+
+
+def get_job(conn, job_id):
+    """(poll response, owner_id) for a job; (None, None) if there is no such job."""
+    try:
+        job_id = str(uuid.UUID(job_id))
+    except ValueError:
+        return None, None
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT status, attempts, error, variants, owner_id,
+                   updated_at < NOW() - make_interval(secs => %s) AS stale
+            FROM upload_jobs WHERE job_id = %s
+        """, (JOB_STALE_SECONDS, job_id))
+        row = cur.fetchone()
+    if row is None:
+        return None, None
+    status, attempts, error, variants, owner_id, stale = row
+    if status in ('queued', 'processing') and stale:
+        # The worker running it went away (restart, deploy); the client should upload again
+        status, error = 'failed', 'Upload was interrupted; please try again'
+    variants = variants or {}
+    job = {
+        'job_id': job_id,
+        'status': status,
+        'attempts': attempts,
+        'url': variants.get(PRIMARY_VARIANT),
+        'variants': variants,
+        'error': error,
+    }
+    return job, owner_id
@@ -7,6 +7,7 @@ import DialogContent from '@mui/material/DialogContent';
 import DialogActions from '@mui/material/DialogActions';
 import Button from '@mui/material/Button';
 import { axiosInstance } from '../utils/auth';
+import { uploadImage } from '../utils/upload';
 
 // Add Princeton Halls array
 const PRINCETON_HALLS = [
@@ -316,24 +317,7 @@ const CreateListing = ({ onClose, onSuccess, modalMode = false }) => {
       const csrfResponse = await axiosInstance.get('/api/csrf-token');
       const csrfToken = csrfResponse.data.csrf_token;
 
-      const form = new FormData();
-      form.append('file', file);
-      
-      // Use fetch with the CSRF token in headers
-      const res = await fetch(`${import.meta.env.VITE_API_URL}/api/upload`, {
-        method: 'POST',
-        body: form,
-        credentials: 'include',
-        headers: {
-          'X-CSRFToken': csrfToken
-        }
-      });
-      
-      if (!res.ok) {
-        const errText = await res.text();
-        throw new Error(`Upload failed: ${res.status} ${errText}`);
-      }
-      const result = await res.json();
+      const result = await uploadImage(file, { headers: { 'X-CSRFToken': csrfToken } });
       setFormData(prev => ({ ...prev, image_url: result.url }));
     } catch (err) {
       setError('Failed to upload image: ' + (err.response?.data?.error || err.message));
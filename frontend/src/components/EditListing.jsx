@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import Header from './Header';
 import { getCSRFToken } from '../utils/csrf';
+import { uploadImage } from '../utils/upload';
 
 const EditListing = () => {
   const navigate = useNavigate();
@@ -113,20 +114,7 @@ const EditListing = () => {
 
     setUploading(true);
     try {
-      const formData = new FormData();
-      formData.append('file', file);
-
-      const response = await fetch(`${import.meta.env.VITE_API_URL}/api/upload`, {
-        method: 'POST',
-        body: formData,
-        credentials: 'include'
-      });
-
-      if (!response.ok) {
-        throw new Error('Failed to upload image');
-      }
-
-      const data = await response.json();
+      const data = await uploadImage(file, { headers: { 'X-CSRFToken': getCSRFToken() } });
       setFormData(prev => ({
         ...prev,
         image_url: data.url
@@ -1,6 +1,8 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { Dialog, DialogTitle, DialogContent, DialogActions, Button } from '@mui/material';
 import { axiosInstance } from '../utils/auth';
+import { getCSRFToken } from '../utils/csrf';
+import { uploadImage } from '../utils/upload';
 
 const PRINCETON_HALLS = [
   '1901 Hall', '1903 Hall', 'Addy Hall',
@@ -240,10 +242,7 @@ const EditListingForm = ({ listingId, onClose, onSuccess }) => {
     }
     setUploading(true);
     try {
-      const formDataUpload = new FormData();
-      formDataUpload.append('file', file);
-      const response = await axiosInstance.post(`${import.meta.env.VITE_API_URL}/api/upload`, formDataUpload);
-      const data = response.data;
+      const data = await uploadImage(file, { headers: { 'X-CSRFToken': getCSRFToken() } });
       setFormData(prev => ({ ...prev, image_url: data.url }));
     } catch (err) {
       setError('Failed to upload image: ' + err.message);
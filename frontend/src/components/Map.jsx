@@ -336,107 +336,119 @@ const Map = () => {
     }
   };
 
+  // Cursor into the /api/listings/changes delta feed (null until the first full load)
+  const changesCursorRef = useRef(null);
+  // Listing ids with one of this user's pending reservation requests
+  const interestedIdsRef = useRef(new Set());
+
+  const authHeaders = () => {
+    const userType = sessionStorage.getItem('userType') || localStorage.getItem('userType') || 'renter';
+    const username = sessionStorage.getItem('username') || localStorage.getItem('username') || '';
+    return {
+      'Accept': 'application/json',
+      'Cache-Control': 'no-cache',
+      'X-User-Type': userType,
+      'X-Username': username
+    };
+  };
+
+  // Listings with 0 remaining space (or marked unavailable) are not shown
+  const isShown = (listing) =>
+    (listing.is_available === undefined || listing.is_available === true) &&
+    Number(listing.remaining_space) > 0;
+
+  const decorateListing = (listing, previous) => {
+    const distance = listing.latitude && listing.longitude
+      ? calculateDistance(
+          PRINCETON_COORDS.lat, PRINCETON_COORDS.lng,
+          listing.latitude, listing.longitude
+        )
+      : Number.MAX_VALUE;
+    const id = String(listing.id || listing.listing_id);
+    return {
+      ...listing,
+      distance,
+      // Filter match will be applied later
+      matchesFilters: true,
+      // Keep interest toggled on this page; otherwise from the pending requests
+      isInterested: previous ? previous.isInterested : interestedIdsRef.current.has(id)
+    };
+  };
+
+  const fetchInterest = async () => {
+    const apiUrl = import.meta.env.VITE_API_URL || 'http://localhost:5000';
+    try {
+      const requestsResponse = await axiosInstance.get(`${apiUrl}/api/my-reservation-requests`, {
+        headers: authHeaders()
+      });
+      if (requestsResponse.data && Array.isArray(requestsResponse.data)) {
+        interestedIdsRef.current = new Set(
+          requestsResponse.data
+            .filter(r => r.status === 'pending')
+            .map(r => String(r.listing_id))
+        );
+        setListings(current => current.map(listing => ({
+          ...listing,
+          isInterested: interestedIdsRef.current.has(String(listing.id || listing.listing_id))
+        })));
+      }
+    } catch (error) {
+      // console.error('Error fetching reservation requests:', error);
+      // Continue with listings even if we can't fetch reservation status
+    }
+  };
+
+  // One poll of the delta feed: the whole feed the first time (or when the server
+  // resets the cursor), afterwards only the listings that changed since the last poll
   const fetchListings = async () => {
+    const apiUrl = import.meta.env.VITE_API_URL || 'http://localhost:5000';
+    const since = changesCursorRef.current;
     try {
-      setLoading(true);
+      if (since === null) {
+        setLoading(true);
+      }
       setError(null);
-      
-      // Get the API URL from environment variable
-      const apiUrl = import.meta.env.VITE_API_URL || 'http://localhost:5000';
-      
-      // Get user information for headers
-      const userType = sessionStorage.getItem('userType') || localStorage.getItem('userType') || 'renter';
-      const username = sessionStorage.getItem('username') || localStorage.getItem('username') || '';
-      // console.log(`Using auth headers - User type: ${userType} Username: ${username}`);
-      
-      // Fetch listings from API
-      const response = await axiosInstance.get(`${apiUrl}/api/listings`, {
-        headers: {
-          'Accept': 'application/json',
-          'Cache-Control': 'no-cache',
-          'X-User-Type': userType,
-          'X-Username': username
-        }
+
+      const response = await axiosInstance.get(`${apiUrl}/api/listings/changes`, {
+        headers: authHeaders(),
+        params: since !== null ? { since } : {}
       });
-      
-      // console.log(`Listings response status: ${response.status}`);
       const data = response.data;
-      
-      // Clear any old data
-      setListings([]);
-      
+
       // Data validation
-      if (!Array.isArray(data)) {
+      if (!data || !Array.isArray(data.listings) || !Array.isArray(data.deleted)) {
         throw new Error('Invalid response format');
       }
-      
-      // Add distance calculations
-      const dataWithDistance = data.map(listing => {
-        const distance = listing.latitude && listing.longitude
-          ? calculateDistance(
-              PRINCETON_COORDS.lat, PRINCETON_COORDS.lng,
-              listing.latitude, listing.longitude
-            )
-          : Number.MAX_VALUE;
-          
-        return {
-          ...listing,
-          distance,
-          // Filter match will be applied later
-          matchesFilters: true,
-          // Initially set interest to false, will be updated below
-          isInterested: false
-        };
-      });
-      
-      // Filter out unavailable listings (with 0 remaining space)
-      const availableListings = dataWithDistance.filter(
-        listing => 
-          (listing.is_available === undefined || listing.is_available === true) &&
-          Number(listing.remaining_space) > 0
-      );
-      
-      // console.log(`${availableListings.length} listings have valid coordinates`);
-      
-      // Sort by distance
-      availableListings.sort((a, b) => a.distance - b.distance);
-      
-      // Set available listings
-      setListings(availableListings);
-      
-      // Fetch the user's reservation requests to mark interest
-      try {
-        const requestsResponse = await axiosInstance.get(`${apiUrl}/api/my-reservation-requests`, {
-          headers: {
-            'Accept': 'application/json',
-            'Cache-Control': 'no-cache',
-            'X-User-Type': userType,
-            'X-Username': username
-          }
+      changesCursorRef.current = data.cursor;
+
+      if (data.reset) {
+        const availableListings = data.listings.map(listing => decorateListing(listing)).filter(isShown);
+        // Sort by distance
+        availableListings.sort((a, b) => a.distance - b.distance);
+        setListings(availableListings);
+        await fetchInterest();
+      } else if (data.listings.length > 0 || data.deleted.length > 0) {
+        // Merge: changed listings replace their old version, deleted ones disappear
+        setListings(current => {
+          const byId = new Map(current.map(listing => [String(listing.id || listing.listing_id), listing]));
+          data.deleted.forEach(id => byId.delete(String(id)));
+          data.listings.forEach(listing => {
+            const id = String(listing.id || listing.listing_id);
+            const updated = decorateListing(listing, byId.get(id));
+            if (isShown(updated)) {
+              byId.set(id, updated);
+            } else {
+              byId.delete(id);
+            }
+          });
+          return Array.from(byId.values()).sort((a, b) => a.distance - b.distance);
         });
-        
-        if (requestsResponse.data && Array.isArray(requestsResponse.data)) {
-          const requests = requestsResponse.data;
-          const pendingRequestIds = requests
-            .filter(r => r.status === 'pending')
-            .map(r => String(r.listing_id));
-          
-          // Mark listings as interested based on pending reservation requests
-          const listingsWithInterest = availableListings.map(listing => ({
-            ...listing,
-            isInterested: pendingRequestIds.includes(String(listing.id) || String(listing.listing_id))
-          }));
-          
-          // Update the available listings with interest information
-          setListings(listingsWithInterest);
-        }
-      } catch (error) {
-        // console.error('Error fetching reservation requests:', error);
-        // Continue with listings even if we can't fetch reservation status
       }
     } catch (error) {
       // console.error('Error fetching listings:', error);
-      setError('Unable to load listings. Please try again later.');
+      if (since === null) {
+        setError('Unable to load listings. Please try again later.');
+      }
     } finally {
       setLoading(false);
     }
@@ -444,8 +456,59 @@ const Map = () => {
 
   useEffect(() => {
     fetchListings();
-    const interval = setInterval(fetchListings, 10000); // Poll every 10 seconds
-    return () => clearInterval(interval);
+    let interval = setInterval(fetchListings, 10000); // Poll every 10 seconds
+    let source = null;
+    let refreshTimer = null;
+    let interestTimer = null;
+    let reconnectTimer = null;
+
+    const pollEvery = (ms) => {
+      clearInterval(interval);
+      interval = setInterval(fetchListings, ms);
+    };
+
+    // Live updates: while the event stream is open, refresh as soon as a listing or
+    // reservation changes and only poll occasionally as a safety net
+    const connect = () => {
+      const apiUrl = import.meta.env.VITE_API_URL || 'http://localhost:5000';
+      source = new EventSource(`${apiUrl}/api/listings/stream`, { withCredentials: true });
+      const scheduleRefresh = () => {
+        // Coalesce bursts (e.g. an approval updates both tables) into one fetch
+        clearTimeout(refreshTimer);
+        refreshTimer = setTimeout(fetchListings, 250);
+      };
+      source.addEventListener('listing', scheduleRefresh);
+      source.addEventListener('reservation', () => {
+        scheduleRefresh();
+        clearTimeout(interestTimer);
+        interestTimer = setTimeout(fetchInterest, 250);
+      });
+      // The server has no free stream slot: it ends the stream and the browser
+      // reconnects after the retry delay it sent; poll until then
+      source.addEventListener('busy', () => pollEvery(10000));
+      source.onopen = () => pollEvery(60000);
+      source.onerror = () => {
+        // Stream dropped: back to regular polling until it reconnects
+        pollEvery(10000);
+        if (source.readyState === EventSource.CLOSED) {
+          // The browser gave up (e.g. an error status); try again later ourselves
+          source.close();
+          clearTimeout(reconnectTimer);
+          reconnectTimer = setTimeout(connect, 60000);
+        }
+      };
+    };
+    if (typeof EventSource !== 'undefined') {
+      connect();
+    }
+
+    return () => {
+      clearInterval(interval);
+      clearTimeout(refreshTimer);
+      clearTimeout(interestTimer);
+      clearTimeout(reconnectTimer);
+      if (source) source.close();
+    };
   }, []);
 
   useEffect(() => {
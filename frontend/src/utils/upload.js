@@ -0,0 +1,53 @@
+// Image uploads: POST /api/upload queues the file and answers with a job id;
+// the resized image's URL is available once the job is done.
+
+const POLL_INTERVAL_MS = 1000;
+const TIMEOUT_MS = 120000;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+async function errorMessage(response) {
+  try {
+    const data = await response.json();
+    return data.error || `${response.status}`;
+  } catch {
+    return `${response.status}`;
+  }
+}
+
+// Uploads `file` and resolves with the finished job ({ url, variants, ... }).
+// `headers` is sent with the POST (e.g. the CSRF token); unset values are skipped.
+export async function uploadImage(file, { headers = {} } = {}) {
+  const postHeaders = Object.fromEntries(Object.entries(headers).filter(([, value]) => value != null));
+  const form = new FormData();
+  form.append('file', file);
+  const response = await fetch(`${import.meta.env.VITE_API_URL}/api/upload`, {
+    method: 'POST',
+    body: form,
+    credentials: 'include',
+    headers: postHeaders,
+  });
+  if (!response.ok) {
+    throw new Error(await errorMessage(response));
+  }
+  const { job_id: jobId } = await response.json();
+
+  const deadline = Date.now() + TIMEOUT_MS;
+  while (Date.now() < deadline) {
+    await sleep(POLL_INTERVAL_MS);
+    const poll = await fetch(`${import.meta.env.VITE_API_URL}/api/upload/${jobId}`, {
+      credentials: 'include',
+    });
+    if (!poll.ok) {
+      throw new Error(await errorMessage(poll));
+    }
+    const job = await poll.json();
+    if (job.status === 'done') {
+      return job;
+    }
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'Upload failed');
+    }
+  }
+  throw new Error('Upload timed out');
+}